@@ -0,0 +1,311 @@
+import hashlib
+from collections import defaultdict
+from datetime import datetime
+from functools import wraps
+from flask import Blueprint, request, jsonify, abort, make_response, url_for, current_app
+from sqlalchemy import select
+from werkzeug.exceptions import HTTPException
+from database import db
+from models import Chef, Receita, Ingrediente, Categoria, ReceitaIngrediente, receita_categorias, EstatisticaChef
+from paginacao import paginar, ORDENACOES
+from cache_respostas import cache
+
+# --- API JSON (/api/v1) ---
+# Receitas, chefs, categorias e ingredientes para o aplicativo, sem raspar o HTML.
+#
+#   GET /api/v1/receitas?chef=3&categoria=2&fields=id,titulo&include=chef,categorias
+#   GET /api/v1/receitas/7?include=ingredientes
+#   GET /api/v1/chefs[/<id>]?include=estatisticas
+#   GET /api/v1/categorias[/<id>]    GET /api/v1/ingredientes[/<id>]
+#
+# - Paginação por cursor (a mesma das páginas HTML, ver paginacao.py):
+#   ?depois=/?antes= com os cursores devolvidos em "paginacao", ?por_pagina=, ?ordem=.
+# - fields=: só as colunas pedidas saem do banco e da resposta ("id" vem sempre).
+# - include=: dados relacionados de todos os itens da página, com uma
+#   consulta "IN (...)" por relacionamento (nunca uma por item).
+# - ETag: o carimbo de versão é calculado a partir das versões das tags do
+#   cache de respostas (ver cache_respostas.py), que já mudam a cada alteração
+#   de receita. Se o If-None-Match do cliente bater, a resposta é 304 sem
+#   nenhuma consulta ao banco. Isso só vale com um cache compartilhado entre
+#   os workers (CACHE_TIPO=arquivos): no cache 'memoria' cada processo só vê
+#   as próprias invalidações e responderia 304 para dados que outro worker já
+#   mudou. Nesse caso, e com o cache desligado, a ETag é o hash do corpo:
+#   economiza a transferência, mas não a consulta.
+#
+# Categorias e ingredientes só são criados junto com receitas (formulário e
+# importação), por isso as listas deles dependem da tag 'receitas'.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+VERSAO_API = 1
+
+# recurso: (modelo, colunas que podem ser pedidas em fields=)
+CAMPOS = {
+    'receitas': (Receita, ('id', 'titulo', 'instrucoes', 'criado_em', 'versao', 'chef_id')),
+    'chefs': (Chef, ('id', 'nome', 'especialidade')),
+    'categorias': (Categoria, ('id', 'nome')),
+    'ingredientes': (Ingrediente, ('id', 'nome')),
+}
+
+
+@api.errorhandler(HTTPException)
+def _erro(erro):
+    return jsonify({'erro': erro.description, 'status': erro.code}), erro.code
+
+
+# --- ETag a partir das versões das tags ---
+def _etag(tags):
+    versoes = sorted((tag, cache.versao(tag)) for tag in set(tags))
+    argumentos = sorted(request.args.items(multi=True))
+    carimbo = repr((VERSAO_API, request.path, argumentos, versoes)).encode('utf-8')
+    return hashlib.sha1(carimbo).hexdigest()
+
+
+def versionado(tags):
+    """Decorador de rota: ETag pelas `tags(**argumentos_da_rota)` e 304 sem consultar o banco."""
+    def decorador(view):
+        @wraps(view)
+        def envolvida(**kwargs):
+            if not cache.compartilhado:
+                resposta = make_response(view(**kwargs))
+                resposta.add_etag()
+                return resposta.make_conditional(request)
+            # As versões são lidas antes da consulta: se algo mudar no meio, a
+            # ETag já nasce antiga e o cliente buscará de novo na próxima vez
+            etag = _etag(tags(**kwargs))
+            if request.if_none_match.contains_weak(etag):
+                resposta = current_app.response_class(status=304)
+            else:
+                resposta = make_response(view(**kwargs))
+            if resposta.status_code in (200, 304):
+                resposta.set_etag(etag, weak=True)
+                resposta.cache_control.no_cache = True
+            return resposta
+        return envolvida
+    return decorador
+
+
+def _tags_dos_chefs(**kwargs):
+    # O total de receitas de cada chef (include=estatisticas) muda com as receitas
+    return ['chefs', 'receitas'] if 'estatisticas' in request.args.get('include', '') else ['chefs']
+
+
+def _tags_das_receitas(**kwargs):
+    if request.args.get('chef', type=int) is not None:
+        return [f"chef:{request.args.get('chef', type=int)}"]
+    if request.args.get('categoria', type=int) is not None:
+        return [f"categoria:{request.args.get('categoria', type=int)}"]
+    return ['receitas']
+
+
+# --- fields= e include= ---
+def _lista_do_parametro(nome, permitidos):
+    pedidos = [item.strip() for item in request.args.get(nome, '').split(',') if item.strip()]
+    desconhecidos = [item for item in pedidos if item not in permitidos]
+    if desconhecidos:
+        abort(400, f"Valores inválidos em {nome}=: {', '.join(desconhecidos)}. "
+                   f"Permitidos: {', '.join(permitidos)}.")
+    return list(dict.fromkeys(pedidos))
+
+
+def _campos(recurso):
+    permitidos = CAMPOS[recurso][1]
+    pedidos = _lista_do_parametro('fields', permitidos)
+    if not pedidos:
+        return list(permitidos)
+    return [campo for campo in permitidos if campo == 'id' or campo in pedidos]
+
+
+def _serializar(linha, campos):
+    item = {}
+    for campo in campos:
+        valor = getattr(linha, campo)
+        item[campo] = valor.isoformat() if isinstance(valor, datetime) else valor
+    return item
+
+
+def _consulta(recurso, campos, extras=()):
+    # Além dos campos pedidos, as colunas da chave do cursor e as usadas pelos include=
+    modelo = CAMPOS[recurso][0]
+    nomes = list(dict.fromkeys(list(campos) + [c for c in extras if c not in campos]))
+    return db.session.query(*[getattr(modelo, nome) for nome in nomes])
+
+
+def _pagina(recurso, consulta, ordem=None, colunas=None):
+    modelo = CAMPOS[recurso][0]
+    pagina = paginar(consulta, modelo, ordem=ordem, colunas=colunas, depois=request.args.get('depois'),
+                     antes=request.args.get('antes'), por_pagina=request.args.get('por_pagina', type=int))
+    argumentos = {chave: valor for chave, valor in request.args.items() if chave not in ('depois', 'antes')}
+    return pagina, {
+        'ordem': pagina.ordem,
+        'por_pagina': pagina.por_pagina,
+        'proximo': pagina.proximo,
+        'anterior': pagina.anterior,
+        'url_proxima': url_for(request.endpoint, **argumentos, depois=pagina.proximo) if pagina.proximo else None,
+        'url_anterior': url_for(request.endpoint, **argumentos, antes=pagina.anterior) if pagina.anterior else None,
+    }
+
+
+def _ordem_de_receitas():
+    ordem = request.args.get('ordem')
+    return ordem if ordem in ORDENACOES else current_app.config['PAGINACAO_ORDEM_PADRAO']
+
+
+# --- Relacionamentos (include=), uma consulta por relacionamento ---
+def _chefs_por_id(ids):
+    linhas = db.session.execute(
+        select(Chef.id, Chef.nome, Chef.especialidade).where(Chef.id.in_(set(ids))))
+    return {linha.id: _serializar(linha, CAMPOS['chefs'][1]) for linha in linhas}
+
+
+def _categorias_por_receita(ids):
+    categorias = defaultdict(list)
+    for receita_id, categoria_id, nome in db.session.execute(
+        select(receita_categorias.c.receita_id, Categoria.id, Categoria.nome)
+        .join(Categoria, receita_categorias.c.categoria_id == Categoria.id)
+        .where(receita_categorias.c.receita_id.in_(ids))
+        .order_by(Categoria.nome)
+    ):
+        categorias[receita_id].append({'id': categoria_id, 'nome': nome})
+    return categorias
+
+
+def _ingredientes_por_receita(ids):
+    ingredientes = defaultdict(list)
+    for receita_id, ingrediente_id, nome, quantidade in db.session.execute(
+        select(ReceitaIngrediente.receita_id, Ingrediente.id, Ingrediente.nome, ReceitaIngrediente.quantidade)
+        .join(Ingrediente, ReceitaIngrediente.ingrediente_id == Ingrediente.id)
+        .where(ReceitaIngrediente.receita_id.in_(ids))
+    ):
+        ingredientes[receita_id].append({'id': ingrediente_id, 'nome': nome, 'quantidade': quantidade})
+    return ingredientes
+
+
+def _estatisticas_por_chef(ids):
+    linhas = db.session.execute(
+        select(EstatisticaChef.chef_id, EstatisticaChef.total_receitas).where(EstatisticaChef.chef_id.in_(ids)))
+    return {chef_id: {'total_receitas': total} for chef_id, total in linhas}
+
+
+INCLUSOES_RECEITA = ('chef', 'categorias', 'ingredientes')
+INCLUSOES_CHEF = ('estatisticas',)
+
+
+def _receitas_json(linhas, campos, inclusoes):
+    itens = [_serializar(linha, campos) for linha in linhas]
+    ids = [linha.id for linha in linhas]
+    if ids and 'chef' in inclusoes:
+        chefs = _chefs_por_id([linha.chef_id for linha in linhas])
+        for item, linha in zip(itens, linhas):
+            item['chef'] = chefs.get(linha.chef_id)
+    if ids and 'categorias' in inclusoes:
+        categorias = _categorias_por_receita(ids)
+        for item in itens:
+            item['categorias'] = categorias.get(item['id'], [])
+    if ids and 'ingredientes' in inclusoes:
+        ingredientes = _ingredientes_por_receita(ids)
+        for item in itens:
+            item['ingredientes'] = ingredientes.get(item['id'], [])
+    return itens
+
+
+def _chefs_json(linhas, campos, inclusoes):
+    itens = [_serializar(linha, campos) for linha in linhas]
+    if itens and 'estatisticas' in inclusoes:
+        estatisticas = _estatisticas_por_chef([item['id'] for item in itens])
+        for item in itens:
+            item['estatisticas'] = estatisticas.get(item['id'], {'total_receitas': 0})
+    return itens
+
+
+# --- Rotas ---
+@api.route('/receitas')
+@versionado(_tags_das_receitas)
+def listar_receitas():
+    campos = _campos('receitas')
+    inclusoes = _lista_do_parametro('include', INCLUSOES_RECEITA)
+    ordem = _ordem_de_receitas()
+    chef_id = request.args.get('chef', type=int)
+    categoria_id = request.args.get('categoria', type=int)
+    colunas = None
+    if chef_id is None and categoria_id is not None:
+        # Como em receitas_por_categoria: a chave é o receita_id do índice da associação
+        ordem = 'id' if ordem == 'id' else 'novas'
+        colunas = {'id': receita_categorias.c.receita_id}
+    consulta = _consulta('receitas', campos, ORDENACOES[ordem]['colunas'] + ('chef_id',))
+    if chef_id is not None:
+        consulta = consulta.filter(Receita.chef_id == chef_id)
+    elif categoria_id is not None:
+        consulta = consulta.join(receita_categorias).filter(receita_categorias.c.categoria_id == categoria_id)
+    pagina, paginacao = _pagina('receitas', consulta, ordem, colunas)
+    return jsonify({'dados': _receitas_json(pagina.itens, campos, inclusoes), 'paginacao': paginacao})
+
+
+@api.route('/receitas/<int:receita_id>')
+@versionado(lambda receita_id: [f'receita:{receita_id}'])
+def obter_receita(receita_id):
+    campos = _campos('receitas')
+    inclusoes = _lista_do_parametro('include', INCLUSOES_RECEITA)
+    linha = _consulta('receitas', campos, ('chef_id',)).filter(Receita.id == receita_id).first()
+    if linha is None:
+        abort(404, 'Receita não encontrada.')
+    return jsonify({'dados': _receitas_json([linha], campos, inclusoes)[0]})
+
+
+@api.route('/chefs')
+@versionado(_tags_dos_chefs)
+def listar_chefs():
+    campos = _campos('chefs')
+    inclusoes = _lista_do_parametro('include', INCLUSOES_CHEF)
+    pagina, paginacao = _pagina('chefs', _consulta('chefs', campos), 'id')
+    return jsonify({'dados': _chefs_json(pagina.itens, campos, inclusoes), 'paginacao': paginacao})
+
+
+@api.route('/chefs/<int:chef_id>')
+@versionado(lambda chef_id: [f'chef:{chef_id}'])
+def obter_chef(chef_id):
+    campos = _campos('chefs')
+    inclusoes = _lista_do_parametro('include', INCLUSOES_CHEF)
+    linha = _consulta('chefs', campos).filter(Chef.id == chef_id).first()
+    if linha is None:
+        abort(404, 'Chef não encontrado.')
+    return jsonify({'dados': _chefs_json([linha], campos, inclusoes)[0]})
+
+
+def _listar_nomes(recurso):
+    campos = _campos(recurso)
+    pagina, paginacao = _pagina(recurso, _consulta(recurso, campos), 'id')
+    return jsonify({'dados': [_serializar(linha, campos) for linha in pagina.itens], 'paginacao': paginacao})
+
+
+def _obter_nome(recurso, item_id, mensagem):
+    campos = _campos(recurso)
+    modelo = CAMPOS[recurso][0]
+    linha = _consulta(recurso, campos).filter(modelo.id == item_id).first()
+    if linha is None:
+        abort(404, mensagem)
+    return jsonify({'dados': _serializar(linha, campos)})
+
+
+@api.route('/categorias')
+@versionado(lambda: ['receitas'])
+def listar_categorias():
+    return _listar_nomes('categorias')
+
+
+@api.route('/categorias/<int:categoria_id>')
+@versionado(lambda categoria_id: ['receitas'])
+def obter_categoria(categoria_id):
+    return _obter_nome('categorias', categoria_id, 'Categoria não encontrada.')
+
+
+@api.route('/ingredientes')
+@versionado(lambda: ['receitas'])
+def listar_ingredientes():
+    return _listar_nomes('ingredientes')
+
+
+@api.route('/ingredientes/<int:ingrediente_id>')
+@versionado(lambda ingrediente_id: ['receitas'])
+def obter_ingrediente(ingrediente_id):
+    return _obter_nome('ingredientes', ingrediente_id, 'Ingrediente não encontrado.')
@@ -1,14 +1,15 @@
+import hmac
 import os
+from functools import wraps
+import click
 import pyotp
-import qrcode
-import base64
-from io import BytesIO
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, \
+    abort, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_bcrypt import Bcrypt
-from flask_mail import Mail, Message
+from flask_mail import Mail
 from database import db
-from sqlalchemy import or_
+import armazenamento
+from senhas import hasher
 
 # Cria a instância da aplicação Flask
 app = Flask(__name__)
@@ -16,16 +17,105 @@ app = Flask(__name__)
 # --- Configurações da Aplicação ---
 basedir = os.path.abspath(os.path.dirname(__file__))
 app.config['SECRET_KEY'] = 'uma-chave-secreta-muito-dificil-de-adivinhar'
-app.config['SQLALCHEMY_DATABASE_URI'] = \
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or \
     'sqlite:///' + os.path.join(basedir, 'instance', 'receitas.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Perfil do SQLite aplicado em cada conexão (ver armazenamento.py): 'concorrente' (WAL) ou 'padrao'
+app.config['SQLITE_PERFIL'] = os.environ.get('SQLITE_PERFIL', 'concorrente')
+app.config['SQLITE_PRAGMAS'] = {} # Sobrescreve pragmas do perfil, ex.: {'synchronous': 'FULL'}
+# Pool de conexões por processo: ajuste conforme as threads de cada worker
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': int(os.environ.get('DB_POOL_TAMANHO', 5)),
+    'max_overflow': int(os.environ.get('DB_POOL_EXTRA', 10)),
+    'pool_timeout': int(os.environ.get('DB_POOL_ESPERA', 30)), # Segundos esperando uma conexão livre
+    # Testa a conexão antes de usá-la e descarta as que caíram: só para servidores de
+    # banco (o arquivo do SQLite não "cai", e o teste custaria um comando a cada checkout)
+    'pool_pre_ping': not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'),
+}
+
+# Paginação das listagens de receitas (por cursor)
+app.config['RECEITAS_POR_PAGINA'] = 20
+app.config['RECEITAS_POR_PAGINA_MAX'] = 100
+app.config['PAGINACAO_ORDEM_PADRAO'] = 'recentes' # 'recentes' (data de criação) ou 'id'
+app.config['BUSCA_LIMITE'] = 50 # Máximo de resultados exibidos na busca
+app.config['COZINHAR_MAX_FALTANTES'] = 2 # "O que posso cozinhar?": até quantos ingredientes podem faltar
+app.config['COZINHAR_LIMITE'] = 50
+app.config['AUTOCOMPLETAR_LIMITE'] = 8 # Sugestões por consulta, se o cliente não pedir outro número (máx. 20)
+app.config['IMPORTACAO_LOTE'] = 1000 # Receitas gravadas por transação no "flask import-receitas"
+app.config['EXPORTACAO_BLOCO'] = 1000 # Receitas lidas do banco por vez na exportação
+app.config['DASHBOARD_TOP_CHEFS'] = 20 # Chefs exibidos no gráfico do dashboard
+
+# Cache das páginas de leitura: 'memoria' (LRU por processo), 'arquivos'
+# (compartilhado entre os workers) ou None para desligar
+app.config['CACHE_TIPO'] = os.environ.get('CACHE_TIPO', 'memoria') or None
+app.config['CACHE_TAMANHO'] = 1000 # Máximo de respostas no cache em memória
+app.config['CACHE_DIRETORIO'] = os.path.join(basedir, 'instance', 'cache')
+app.config['CACHE_TTL'] = 300 # Segundos
+app.config['FRAGMENTOS_TAMANHO'] = 5000 # Cartões de receita pré-renderizados mantidos em memória
+app.config['IDENTIDADE_TTL'] = 300 # Segundos que o usuário logado fica em memória (ver identidade.py)
+app.config['IDENTIDADE_TAMANHO'] = 10000
+app.config['DIARIO_INTERVALO'] = 1 # Segundos entre as leituras do diário de alterações por cada índice em memória (ver eventos.py)
+app.config['DIARIO_LINHAS'] = 100000 # Alterações mantidas no diário
+# Rotas /_debug/*: abertas só com app.debug ou para os e-mails abaixo (separados por vírgula)
+app.config['DIAGNOSTICO_ADMINS'] = {email.strip().lower() for email in
+                                    os.environ.get('DIAGNOSTICO_ADMINS', '').split(',') if email.strip()}
+app.config['SQL_INSTRUMENTACAO'] = True # Mede o SQL de cada requisição (ver instrumentacao.py)
+app.config['SQL_N_MAIS_1_LIMITE'] = 5 # Repetições do mesmo comando que geram o aviso de N+1
+app.config['SQL_HISTORICO'] = 100 # Requisições mostradas em /_debug/requests
+app.config['METRICAS_DIRETORIO'] = os.environ.get('METRICAS_DIRETORIO') # Com vários processos (ver metricas.py)
+app.config['METRICAS_INTERVALO'] = 5 # Segundos entre as gravações dos totais de cada processo
+# Quem coleta /metrics sem login: o token (cabeçalho "Authorization: Bearer <token>") ou um destes IPs
+app.config['METRICAS_TOKEN'] = os.environ.get('METRICAS_TOKEN')
+app.config['METRICAS_IPS'] = {ip.strip() for ip in os.environ.get('METRICAS_IPS', '').split(',') if ip.strip()}
 
 # Configurações do Flask-Mail (use variáveis de ambiente em produção!)
-app.config['MAIL_SERVER'] = 'smtp.googlemail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = 'bendlin@gmail.com' # Coloque seu e-mail
-app.config['MAIL_PASSWORD'] = 'udvgcbsxnefuliqe' # Use uma "Senha de App" do Google
+app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.googlemail.com')
+app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', '1') == '1'
+app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', 'bendlin@gmail.com') # Coloque seu e-mail
+app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', 'udvgcbsxnefuliqe') # Use uma "Senha de App" do Google
+
+
+# Caixa de saída (ver caixa_saida.py)
+app.config['EMAIL_ASSINCRONO'] = True # Inicia as threads de envio dentro do próprio servidor web
+app.config['EMAIL_TRABALHADORES'] = 2 # Threads de envio (cada uma com a sua conexão SMTP)
+app.config['EMAIL_LOTE'] = 20 # Mensagens reservadas por vez
+app.config['EMAIL_INTERVALO'] = 5 # Segundos entre verificações da fila quando ela está vazia
+app.config['EMAIL_MAX_TENTATIVAS'] = 5
+app.config['EMAIL_ESPERA_INICIAL'] = 30 # Segundos antes da 2ª tentativa (dobra a cada falha)
+
+# Hash de senhas com bcrypt em processos separados (ver senhas.py)
+app.config['SENHAS_PROCESSOS'] = min(os.cpu_count() or 1, 4) # 0 = calcula na própria thread
+# Custo fixo (recomendado em produção); sem ele, o custo é calibrado pelo SENHAS_TEMPO_ALVO_MS
+# uma vez só, na primeira inicialização, e guardado em SENHAS_CALIBRAGEM para todos os workers
+app.config['SENHAS_CUSTO'] = int(os.environ['SENHAS_CUSTO']) if os.environ.get('SENHAS_CUSTO') else None
+app.config['SENHAS_CALIBRAGEM'] = os.path.join(basedir, 'instance', 'senhas_custo.txt') # Apague para recalibrar
+app.config['SENHAS_REBAIXAR'] = False # True = refaz também hashes com custo MAIOR que o atual (baixar o custo de propósito)
+app.config['SENHAS_TEMPO_ALVO_MS'] = 250
+app.config['SENHAS_CUSTO_MINIMO'] = 10
+app.config['SENHAS_CUSTO_MAXIMO'] = 15
+
+# Resumo semanal (ver resumo_semanal.py)
+app.config['RESUMO_MAX_RECEITAS'] = 10 # Receitas listadas no e-mail
+app.config['RESUMO_TRABALHADORES'] = 4 # Threads de envio, cada uma com a sua conexão SMTP
+app.config['RESUMO_TAXA'] = 10 # Máximo de e-mails por segundo (0 = sem limite)
+app.config['RESUMO_LOTE'] = 200 # Destinatários lidos do banco por vez
+app.config['URL_BASE'] = os.environ.get('URL_BASE', 'http://localhost:5000') # Para os links dos e-mails
+
+# Receitas similares (ver similares.py)
+app.config['SIMILARES_K'] = 10 # Similares guardadas por receita
+app.config['SIMILARES_EXIBIDAS'] = 5 # Exibidas na página da receita
+app.config['SIMILARES_METRICA'] = 'cosseno' # 'cosseno' ou 'jaccard'
+app.config['SIMILARES_PESO_CATEGORIAS'] = 0.5 # Peso de uma categoria em comum, em relação a um ingrediente
+app.config['SIMILARES_PROCESSOS'] = min(os.cpu_count() or 1, 4) # Processos do "flask similares" (0 = no próprio processo)
+app.config['SIMILARES_BLOCO'] = 256 # Receitas por bloco (a memória cresce com os pares que têm algo em comum)
+app.config['SIMILARES_AUTOMATICO'] = True # Atualiza as listas afetadas depois de cada edição feita pelo site
+app.config['SIMILARES_LIMITE_INCREMENTAL'] = 100 # Acima disso, só o "flask similares" recalcula
+
+# Receitas quase iguais (ver duplicatas.py)
+app.config['DUPLICATAS_MODO'] = 'sinalizar' # 'sinalizar', 'bloquear' ou None (desligado)
+app.config['DUPLICATAS_LIMIAR'] = 0.8 # Semelhança mínima (Jaccard estimado) para considerar duplicata
+app.config['DUPLICATAS_PROCESSOS'] = min(os.cpu_count() or 1, 4) # Processos do "flask deduplicar" (0 = no próprio processo)
 
 mail = Mail(app)
 
@@ -35,26 +125,65 @@ if not os.path.exists(instance_path):
 
 # --- Inicialização das Extensões ---
 db.init_app(app)
-bcrypt = Bcrypt(app)
+armazenamento.init_app(app)
+hasher.init_app(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 login_manager.login_message = "Por favor, faça login para acessar esta página."
 login_manager.login_message_category = "info"
 
 # --- Importações Pós-Inicialização ---
-from models import Usuario, Chef, Receita, Ingrediente, ReceitaIngrediente, Categoria, receita_categorias
+from models import (Usuario, Chef, Receita, Ingrediente, ReceitaIngrediente, Categoria, receita_categorias,
+                    DuplicataSuspeita)
 from forms import RegistrationForm, LoginForm
+from paginacao import paginar_da_requisicao
+from carregamento import com_perfil
+import busca_fts
+import eventos
+from correcao_busca import obter_corretor
+import migracoes
+from indice_ingredientes import obter_indice
+import autocompletar
+from catalogo import ler_categorias, ler_ingredientes, resolver_categorias, resolver_ingredientes
+import importacao
+import dados_sinteticos
+import exportacao
+import estatisticas
+from cache_respostas import cache, em_cache, tags_da_receita
+import fragmentos
+import caixa_saida
+import resumo_semanal
+import codigo_qr
+import identidade
+from identidade import usuario_atual
+from instrumentacao import instrumentacao
+from metricas import metricas
+from api import api
+import similares
+import duplicatas
+
+eventos.init_app(app)
+cache.init_app(app)
+fragmentos.init_app(app)
+identidade.init_app(app)
+instrumentacao.init_app(app)
+metricas.init_app(app)
+app.register_blueprint(api)
+similares.atualizador.init_app(app)
+duplicatas.init_app(app)
 
 # --- Configuração do Flask-Login ---
+# O current_user é uma Identidade guardada em memória (ver identidade.py)
 @login_manager.user_loader
 def load_user(user_id):
-    return Usuario.query.get(int(user_id))
+    return identidade.carregar(int(user_id))
 
 # --- Rotas ---
 
 @app.route('/')
+@em_cache(lambda: ['receitas'])
 def index():
-    receitas = Receita.query.all()
+    receitas = paginar_da_requisicao(com_perfil(Receita.query, 'cartao'), Receita)
     return render_template('index.html', receitas=receitas)
 
 @app.route("/cadastro", methods=['GET', 'POST'])
@@ -64,7 +193,7 @@ def cadastro():
         return redirect(url_for('index'))
     form = RegistrationForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = hasher.gerar_hash(form.password.data)
         novo_usuario = Usuario(email=form.email.data, password_hash=hashed_password)
         novo_chef = Chef(
             nome=form.nome.data, 
@@ -74,6 +203,7 @@ def cadastro():
         db.session.add(novo_usuario)
         db.session.add(novo_chef)
         db.session.commit()
+        cache.invalidar('chefs') # Lista de chefs da API
         return redirect(url_for('login'))
     return render_template('cadastro.html', title='Cadastro', form=form)
 
@@ -85,7 +215,12 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = Usuario.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(user.password_hash, form.password.data):
+        # Usuários criados por importação não têm senha e não podem entrar
+        if user and user.password_hash and hasher.verificar(user.password_hash, form.password.data):
+            # Hash feito com um custo menor que o atual: refaz agora que temos a senha
+            if hasher.precisa_rehash(user.password_hash):
+                user.password_hash = hasher.rehash(form.password.data)
+                db.session.commit()
             login_user(user)
             # A GRANDE MUDANÇA: Verifica se o 2FA está ativo
             if user.has_2fa_enabled:
@@ -112,49 +247,62 @@ def criar_receita():
     if current_user.has_2fa_enabled and not session.get('2fa_authenticated'):
         return redirect(url_for('verify_2fa'))
     
-    if not current_user.chef:
+    if not current_user.chef_id:
         return "Apenas usuários com perfil de chef podem criar receitas.", 403
 
     if request.method == 'POST':
         # ... (código existente sem alterações)
         titulo = request.form['titulo']
         instrucoes = request.form['instrucoes']
-        nova_receita = Receita(titulo=titulo, instrucoes=instrucoes, chef_id=current_user.chef.id)
 
-        categorias_str = request.form['categorias_str']
-        nomes_categorias = [nome.strip().capitalize() for nome in categorias_str.split(',') if nome.strip()]
-        
-        for nome_cat in nomes_categorias:
-            categoria = Categoria.query.filter_by(nome=nome_cat).first()
-            if not categoria:
-                categoria = Categoria(nome=nome_cat)
-                db.session.add(categoria)
-            nova_receita.categorias.append(categoria)
-        
+        # Resolve todas as categorias e todos os ingredientes de uma vez (ver catalogo.py)
+        categorias = resolver_categorias(ler_categorias(request.form['categorias_str']))
+        quantidades = ler_ingredientes(request.form['ingredientes'])
+        ingredientes = resolver_ingredientes(list(quantidades))
+
+        # Receita quase igual a uma já cadastrada? (ver duplicatas.py)
+        modo_duplicatas = app.config['DUPLICATAS_MODO']
+        achado = None
+        if modo_duplicatas:
+            registro = {'instrucoes': instrucoes, 'ingredientes': list(quantidades)}
+            assinatura, achado = duplicatas.verificar(db.session.connection(), [registro],
+                                                      app.config['DUPLICATAS_LIMIAR'])[0]
+            duplicatas.memorizar(db.session, registro, assinatura)
+        if achado and modo_duplicatas == 'bloquear':
+            db.session.rollback()
+            original = db.session.get(Receita, achado[1])
+            flash(f'Esta receita é quase igual a "{original.titulo}" ({achado[0]:.0%} parecida) '
+                  'e não foi salva.', 'danger')
+            return render_template('criar_receita.html'), 409
+
+        nova_receita = Receita(titulo=titulo, instrucoes=instrucoes, chef_id=current_user.chef_id,
+                               categorias=categorias)
+        for nome, quantidade in quantidades.items():
+            nova_receita.ingredientes_associados.append(
+                ReceitaIngrediente(ingrediente=ingredientes[nome], quantidade=quantidade)
+            )
         db.session.add(nova_receita)
-        ingredientes_str = request.form['ingredientes']
-        pares_ingredientes = [par.strip() for par in ingredientes_str.split(',') if par.strip()]
-        for par in pares_ingredientes:
-            if ':' in par:
-                nome, qtd = par.split(':', 1)
-                nome_ingrediente = nome.strip().lower()
-                quantidade = qtd.strip()
-                ingrediente = Ingrediente.query.filter_by(nome=nome_ingrediente).first()
-                if not ingrediente:
-                    ingrediente = Ingrediente(nome=nome_ingrediente)
-                    db.session.add(ingrediente)
-                associacao = ReceitaIngrediente(receita=nova_receita, ingrediente=ingrediente, quantidade=quantidade)
-                db.session.add(associacao)
+        tags = ['receitas', f'chef:{nova_receita.chef_id}'] + [f'categoria:{c.id}' for c in categorias]
+        if achado:
+            db.session.flush()
+            duplicatas.registrar_suspeitas(db.session.connection(), [(nova_receita.id, achado[1], achado[0])])
         db.session.commit()
+        cache.invalidar(*tags)
+        if achado:
+            flash('Receita salva, mas ela é muito parecida com outra já cadastrada e foi marcada para revisão.',
+                  'warning')
         return redirect(url_for('index'))
     
     return render_template('criar_receita.html')
 
 @app.route('/chef/<int:chef_id>')
+@em_cache(lambda chef_id: [f'chef:{chef_id}'])
 def detalhes_chef(chef_id):
     # ... (código existente sem alterações)
     chef = Chef.query.get_or_404(chef_id)
-    return render_template('detalhes_chef.html', chef=chef)
+    consulta = com_perfil(Receita.query.filter_by(chef_id=chef.id), 'titulo')
+    receitas = paginar_da_requisicao(consulta, Receita)
+    return render_template('detalhes_chef.html', chef=chef, receitas=receitas)
 
 # --- NOVAS ROTAS PARA 2FA ---
 
@@ -169,21 +317,34 @@ def conta():
 @app.route('/2fa/setup')
 @login_required
 def setup_2fa():
-    if not current_user.otp_secret:
-        current_user.otp_secret = pyotp.random_base32()
+    usuario = usuario_atual()
+    if not usuario.otp_secret:
+        usuario.otp_secret = pyotp.random_base32()
         db.session.commit()
 
-    uri = pyotp.totp.TOTP(current_user.otp_secret).provisioning_uri(
-        name=current_user.email,
+    # A imagem do QR Code é servida (e guardada pelo navegador) em uma rota própria
+    versao = codigo_qr.versao_do_segredo(usuario.otp_secret)
+    return render_template('setup_2fa.html', secret=usuario.otp_secret, versao_qr=versao)
+
+@app.route('/2fa/qr/<versao>.<formato>')
+@login_required
+def qr_2fa(versao, formato):
+    usuario = usuario_atual()
+    if not usuario.otp_secret or formato not in codigo_qr.FORMATOS \
+            or versao != codigo_qr.versao_do_segredo(usuario.otp_secret):
+        abort(404)
+    uri = pyotp.totp.TOTP(usuario.otp_secret).provisioning_uri(
+        name=usuario.email,
         issuer_name="Plataforma de Receitas"
     )
-    
-    img = qrcode.make(uri)
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
-    qr_code_data = base64.b64encode(buffered.getvalue()).decode()
-
-    return render_template('setup_2fa.html', secret=current_user.otp_secret, qr_code_data=qr_code_data)
+    resposta = Response(codigo_qr.gerar(uri, formato), mimetype=codigo_qr.FORMATOS[formato])
+    # A URL muda junto com o segredo, então a imagem nunca fica desatualizada no navegador.
+    # "private": contém o segredo do 2FA, não pode ser guardada por proxies.
+    resposta.set_etag(f'{versao}-{formato}')
+    resposta.cache_control.private = True
+    resposta.cache_control.max_age = 31536000
+    resposta.cache_control.immutable = True
+    return resposta.make_conditional(request)
 
 # ROTA MODIFICADA: verify_2fa com feedback
 @app.route('/2fa/verify', methods=['GET', 'POST'])
@@ -191,11 +352,12 @@ def setup_2fa():
 def verify_2fa():
     if request.method == 'POST':
         token = request.form.get('token')
-        totp = pyotp.TOTP(current_user.otp_secret)
+        usuario = usuario_atual()
+        totp = pyotp.TOTP(usuario.otp_secret)
         if totp.verify(token):
             # Se o token for válido e o 2FA não estiver habilitado, habilita-o agora
-            if not current_user.has_2fa_enabled:
-                current_user.has_2fa_enabled = True
+            if not usuario.has_2fa_enabled:
+                usuario.has_2fa_enabled = True
                 db.session.commit()
             
             # Marca na sessão que o 2FA foi verificado
@@ -209,8 +371,9 @@ def verify_2fa():
 @app.route('/2fa/disable', methods=['POST'])
 @login_required
 def disable_2fa():
-    current_user.has_2fa_enabled = False
-    current_user.otp_secret = None
+    usuario = usuario_atual()
+    usuario.has_2fa_enabled = False
+    usuario.otp_secret = None
     session.pop('2fa_authenticated', None)
     db.session.commit()
     return redirect(url_for('conta'))
@@ -223,15 +386,11 @@ def dashboard():
     if current_user.has_2fa_enabled and not session.get('2fa_authenticated'):
         return redirect(url_for('verify_2fa'))
 
-    # Consultas para estatísticas simples
-    total_receitas = Receita.query.count()
-    total_chefs = Chef.query.count()
+    # Totais pré-calculados (ver estatisticas.py), sem COUNT(*) nas tabelas grandes
+    total_receitas, total_chefs = estatisticas.totais()
 
-    # Consulta para os dados do gráfico (Receitas por Chef)
-    chefs_com_receitas = db.session.query(
-        Chef.nome, 
-        db.func.count(Receita.id).label('total')
-    ).join(Receita).group_by(Chef.nome).order_by(db.desc('total')).all()
+    # Dados do gráfico (Receitas por Chef), também pré-calculados
+    chefs_com_receitas = estatisticas.chefs_com_mais_receitas(app.config['DASHBOARD_TOP_CHEFS'])
     
     # Prepara os dados para o JavaScript
     labels_grafico = [item[0] for item in chefs_com_receitas]
@@ -246,58 +405,129 @@ def dashboard():
     )
 
 @app.route('/receita/<int:receita_id>')
+@em_cache(lambda receita_id: [f'receita:{receita_id}'])
 def detalhes_receita(receita_id):
-    receita = Receita.query.get_or_404(receita_id)
-    return render_template('detalhes_receita.html', receita=receita)
+    receita = com_perfil(Receita.query, 'detalhe').get_or_404(receita_id)
+    parecidas = similares.da_receita(receita.id, app.config['SIMILARES_EXIBIDAS'])
+    return render_template('detalhes_receita.html', receita=receita, similares=parecidas)
 
 @app.route('/receita/<int:receita_id>/enviar', methods=['POST'])
 @login_required
 def enviar_receita(receita_id):
-    receita = Receita.query.get_or_404(receita_id)
+    receita = com_perfil(Receita.query, 'detalhe').get_or_404(receita_id)
     destinatario = request.form['email_destinatario']
 
     if destinatario:
-        try:
-            msg = Message(
-                subject=f"Receita: {receita.titulo}",
-                sender=app.config['MAIL_USERNAME'],
-                recipients=[destinatario]
-            )
-            msg.html = render_template('email_receita.html', receita=receita)
-            mail.send(msg)
-            flash('Receita enviada com sucesso!', 'info')
-        except Exception as e:
-            flash(f'Ocorreu um erro ao enviar o e-mail: {e}', 'danger')
+        # O e-mail vai para a caixa de saída e é enviado em segundo plano
+        remetente = current_user.chef_nome or current_user.email
+        html = caixa_saida.renderizar_email_receita(receita, remetente)
+        caixa_saida.enfileirar(destinatario, f"Receita: {receita.titulo}", html)
+        db.session.commit()
+        if app.config['EMAIL_ASSINCRONO']:
+            caixa_saida.enviador.iniciar(app)
+        flash('Receita enviada com sucesso! O e-mail chegará em instantes.', 'info')
 
     return redirect(url_for('detalhes_receita', receita_id=receita_id))
 
 @app.route('/categoria/<int:categoria_id>')
+@em_cache(lambda categoria_id: [f'categoria:{categoria_id}'])
 def receitas_por_categoria(categoria_id):
     categoria = Categoria.query.get_or_404(categoria_id)
-    # Acessamos as receitas através do backref que definimos no modelo
-    receitas = categoria.receitas.all()
+    # Filtramos pela tabela de associação e paginamos pelo receita_id dela: o
+    # índice (categoria_id, receita_id) já entrega a página na ordem, sem o banco
+    # ordenar todas as receitas da categoria a cada página
+    consulta = Receita.query.join(receita_categorias).filter(
+        receita_categorias.c.categoria_id == categoria.id
+    )
+    ordem = 'id' if request.args.get('ordem') == 'id' else 'novas'
+    receitas = paginar_da_requisicao(com_perfil(consulta, 'cartao'), Receita, ordem=ordem,
+                                     colunas={'id': receita_categorias.c.receita_id})
     return render_template('receitas_por_categoria.html', categoria=categoria, receitas=receitas)
 
 @app.route('/busca')
 def busca():
     query = request.args.get('q')
     resultados = []
+    sugestao = None
     
     if query:
-        # Prepara o termo de busca para usar com o operador LIKE
-        search_term = f"%{query}%"
-        
-        # Busca por título da receita OU por nome do ingrediente
-        resultados = Receita.query.filter(
-            or_(
-                Receita.titulo.ilike(search_term),
-                Receita.ingredientes_associados.any(
-                    ReceitaIngrediente.ingrediente.has(Ingrediente.nome.ilike(search_term))
-                )
-            )
-        ).distinct().all()
-
-    return render_template('busca.html', query=query, resultados=resultados)
+        # O índice FTS5 devolve os ids já ordenados por relevância (bm25)
+        conexao = db.session.connection()
+        ids = busca_fts.buscar(conexao, query, app.config['BUSCA_LIMITE'])
+        if ids:
+            receitas = com_perfil(Receita.query, 'cartao').filter(Receita.id.in_(ids)).all()
+            por_id = {receita.id: receita for receita in receitas}
+            resultados = [por_id[i] for i in ids if i in por_id]
+        else:
+            # "Você quis dizer": só sugere a correção se ela encontrar alguma receita
+            corrigida = obter_corretor(conexao).corrigir(query)
+            if corrigida and busca_fts.buscar(conexao, corrigida, 1):
+                sugestao = corrigida
+
+    return render_template('busca.html', query=query, resultados=resultados, sugestao=sugestao)
+
+# --- "O que posso cozinhar?" ---
+def _ingredientes_informados():
+    texto = request.args.get('ingredientes', '')
+    return [nome.strip().lower() for nome in texto.split(',') if nome.strip()]
+
+def _o_que_cozinhar(nomes, consulta):
+    # O índice invertido em memória resolve a consulta; o banco só traz as receitas escolhidas
+    indice = obter_indice(db.session.connection())
+    achados = indice.consultar(nomes, app.config['COZINHAR_MAX_FALTANTES'], app.config['COZINHAR_LIMITE'])
+    if not achados:
+        return []
+    receitas = {r.id: r for r in consulta.filter(Receita.id.in_([rid for rid, _ in achados]))}
+    return [(receitas[rid], faltam) for rid, faltam in achados if rid in receitas]
+
+@app.route('/o-que-cozinhar')
+def o_que_cozinhar():
+    nomes = _ingredientes_informados()
+    resultados = _o_que_cozinhar(nomes, com_perfil(Receita.query, 'titulo_chef')) if nomes else []
+    return render_template('o_que_cozinhar.html', ingredientes=', '.join(nomes), resultados=resultados)
+
+@app.route('/api/o-que-cozinhar')
+def api_o_que_cozinhar():
+    nomes = _ingredientes_informados()
+    resultados = _o_que_cozinhar(nomes, db.session.query(Receita.id, Receita.titulo)) if nomes else []
+    return jsonify({
+        'ingredientes': nomes,
+        'receitas': [
+            {
+                'id': receita.id,
+                'titulo': receita.titulo,
+                'url': url_for('detalhes_receita', receita_id=receita.id),
+                'ingredientes_faltantes': faltam,
+            }
+            for receita, faltam in resultados
+        ],
+    })
+
+# --- Autocompletar do formulário de receita ---
+@app.route('/api/autocomplete/<any(ingrediente, categoria):tipo>')
+def api_autocompletar(tipo):
+    # Vocabulário em memória (ver autocompletar.py): nenhuma consulta SQL depois do primeiro uso
+    texto = request.args.get('q', '')
+    limite = request.args.get('limite', app.config['AUTOCOMPLETAR_LIMITE'], type=int)
+    vocabulario = autocompletar.obter(tipo, db.session.connection())
+    return jsonify({
+        'q': texto,
+        'sugestoes': [{'nome': nome, 'usos': usos} for nome, usos in vocabulario.sugerir(texto, max(limite, 1))],
+    })
+
+# --- Exportação do catálogo ---
+@app.route('/export/receitas.<formato>')
+@login_required
+def exportar_receitas(formato):
+    if formato not in exportacao.FORMATOS:
+        abort(404)
+    # stream_with_context mantém a requisição (e a sessão do banco) viva enquanto o gerador envia os dados
+    conteudo = stream_with_context(exportacao.gerar(formato, app.config['EXPORTACAO_BLOCO']))
+    return Response(
+        conteudo,
+        mimetype=exportacao.FORMATOS[formato],
+        headers={'Content-Disposition': f'attachment; filename=receitas.{formato}'},
+    )
 
 @app.route('/receita/<int:receita_id>/editar', methods=['GET', 'POST'])
 @login_required
@@ -305,30 +535,27 @@ def editar_receita(receita_id):
     receita = Receita.query.get_or_404(receita_id)
 
     # --- LÓGICA DE AUTORIZAÇÃO ---
-    if receita.chef != current_user.chef:
+    if receita.chef_id != current_user.chef_id:
         flash('Você não tem permissão para editar esta receita.', 'danger')
         return redirect(url_for('detalhes_receita', receita_id=receita.id))
 
     if request.method == 'POST':
+        # Páginas que exibem a receita antes da alteração (inclui as categorias antigas)
+        tags = tags_da_receita(receita)
+
         # Atualiza os campos básicos
         receita.titulo = request.form['titulo']
         receita.instrucoes = request.form['instrucoes']
 
         # Lógica para atualizar categorias (apaga as antigas e adiciona as novas)
-        receita.categorias.clear()
-        categorias_str = request.form['categorias_str']
-        nomes_categorias = [nome.strip().capitalize() for nome in categorias_str.split(',') if nome.strip()]
-        for nome_cat in nomes_categorias:
-            categoria = Categoria.query.filter_by(nome=nome_cat).first()
-            if not categoria:
-                categoria = Categoria(nome=nome_cat)
-                db.session.add(categoria)
-            receita.categorias.append(categoria)
+        receita.categorias = resolver_categorias(ler_categorias(request.form['categorias_str']))
         
         # (Opcional) A edição de ingredientes pode ser complexa. Aqui, mantemos os originais.
         # Uma implementação completa poderia apagar e recriar as associações.
         
+        tags += tags_da_receita(receita)
         db.session.commit()
+        cache.invalidar(*tags)
         flash('Receita atualizada com sucesso!', 'success')
         return redirect(url_for('detalhes_receita', receita_id=receita.id))
 
@@ -342,23 +569,243 @@ def excluir_receita(receita_id):
     receita = Receita.query.get_or_404(receita_id)
     
     # A mesma lógica de autorização
-    if receita.chef != current_user.chef:
+    if receita.chef_id != current_user.chef_id:
         flash('Você não tem permissão para excluir esta receita.', 'danger')
         return redirect(url_for('detalhes_receita', receita_id=receita.id))
     
+    tags = tags_da_receita(receita)
     db.session.delete(receita)
     db.session.commit()
+    cache.invalidar(*tags)
     flash('Receita excluída com sucesso!', 'success')
     return redirect(url_for('index'))
 
 
 # --- Comandos CLI ---
 @app.cli.command('init-db')
-def init_db_command():
+@click.option('--reset', is_flag=True, help='APAGA todos os dados e recria o banco do zero.')
+def init_db_command(reset):
+    """Cria o banco ou atualiza o esquema aplicando as migrações pendentes (sem perder dados)."""
     with app.app_context():
-        db.drop_all()
-        db.create_all()
-        print('Banco de dados (vazio) inicializado!')
+        if reset:
+            db.drop_all()
+            with db.engine.begin() as conexao:
+                busca_fts.remover_tabela(conexao)
+        aplicadas = migracoes.migrar(db.engine)
+        with db.engine.connect() as conexao:
+            versao = migracoes.versao_atual(conexao)
+        if aplicadas:
+            print(f'Banco de dados atualizado para a versão {versao} do esquema.')
+        else:
+            print(f'Banco de dados já está na versão {versao} do esquema.')
+
+@app.cli.command('verificar-indices')
+def verificar_indices_command():
+    """Mostra o plano (EXPLAIN QUERY PLAN) das consultas das rotas e acusa leituras completas de tabela."""
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            print('Disponível apenas para SQLite.')
+            return
+        with db.engine.connect() as conexao:
+            resultados = migracoes.verificar_indices(conexao)
+    for nome, plano, usa_indice in resultados:
+        print(f"[{'OK' if usa_indice else 'SEM ÍNDICE'}] {nome}")
+        for linha in plano:
+            print(f'    {linha}')
+    if not all(usa_indice for _, _, usa_indice in resultados):
+        raise SystemExit(1)
+
+@app.cli.command('reindex')
+def reindex_command():
+    """Reconstrói o índice de busca textual (FTS5) de todas as receitas."""
+    with app.app_context():
+        with db.engine.begin() as conexao:
+            total = busca_fts.reindexar(conexao)
+        print(f'Índice de busca reconstruído: {total} receitas.')
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recalcula os contadores do dashboard a partir das tabelas de receitas e chefs."""
+    with app.app_context():
+        total_receitas, total_chefs = estatisticas.reconstruir()
+        print(f'Estatísticas reconstruídas: {total_receitas} receitas, {total_chefs} chefs.')
+
+@app.cli.command('benchmark-sqlite')
+@click.option('--escritores', default=4, help='Processos gravando ao mesmo tempo.')
+@click.option('--leitores', default=4, help='Processos lendo ao mesmo tempo.')
+@click.option('--segundos', default=5, help='Duração de cada medição.')
+def benchmark_sqlite_command(escritores, leitores, segundos):
+    """Compara os perfis do SQLite com vários processos lendo e gravando (banco temporário)."""
+    print(f'{escritores} escritores e {leitores} leitores por {segundos}s em cada perfil:')
+    armazenamento.benchmark(instance_path, escritores, leitores, segundos)
+
+@app.cli.command('enviar-emails')
+@click.option('--uma-vez', is_flag=True, help='Esvazia a fila e termina, em vez de ficar aguardando.')
+def enviar_emails_command(uma_vez):
+    """Envia os e-mails da caixa de saída (útil para rodar o envio fora do servidor web)."""
+    caixa_saida.enviador.trabalhar(app, uma_vez=uma_vez)
+    with app.app_context():
+        print(f'E-mails ainda na fila: {caixa_saida.profundidade_fila()}')
+
+@app.cli.command('send-digest')
+@click.option('--semana', help='Semana ISO, ex.: 2025-W07 (padrão: a última semana completa).')
+@click.option('--trabalhadores', type=int, help='Threads de envio (padrão: RESUMO_TRABALHADORES).')
+@click.option('--taxa', type=float, help='Máximo de e-mails por segundo (padrão: RESUMO_TAXA).')
+def send_digest_command(semana, trabalhadores, taxa):
+    """Envia por e-mail o resumo semanal de receitas a todos os usuários (com retomada)."""
+    semana = semana or resumo_semanal.semana_anterior()
+    try:
+        resumo_semanal.periodo_da_semana(semana)
+    except ValueError as erro:
+        raise click.BadParameter(str(erro), param_hint='--semana')
+    with app.app_context():
+        resumo_semanal.enviar_resumo(
+            app, semana,
+            trabalhadores=trabalhadores or app.config['RESUMO_TRABALHADORES'],
+            taxa=app.config['RESUMO_TAXA'] if taxa is None else taxa,
+            lote=app.config['RESUMO_LOTE'],
+            max_receitas=app.config['RESUMO_MAX_RECEITAS'],
+        )
+
+@app.cli.command('seed')
+@click.option('--usuarios', default=1000, help='Usuários a criar.')
+@click.option('--chefs', type=int, help='Quantos desses usuários têm perfil de chef (padrão: todos).')
+@click.option('--receitas', default=10000, help='Receitas a criar.')
+@click.option('--semente', default=42, help='Semente do gerador aleatório (mesma semente, mesmos dados).')
+@click.option('--lote', default=10000, help='Receitas por transação.')
+@click.option('--senha', default='senha123', help='Senha de todos os usuários criados.')
+@click.option('--ate', type=click.DateTime(['%Y-%m-%d']), default=dados_sinteticos.DATA_FINAL.strftime('%Y-%m-%d'),
+              help='Data da receita mais recente (as demais vêm antes dela).')
+def seed_command(usuarios, chefs, receitas, semente, lote, senha, ate):
+    """Gera um catálogo sintético (usuários, chefs e receitas) para testes de carga."""
+    with app.app_context():
+        # O bcrypt é caro: um único hash, compartilhado por todos os usuários gerados
+        resumo = dados_sinteticos.gerar(usuarios, chefs, receitas, semente, lote,
+                                        hash_senha=hasher.gerar_hash(senha), ate=ate)
+        cache.limpar()
+        print(f"Catálogo gerado: {resumo['usuarios']} usuários, {resumo['chefs']} chefs e "
+              f"{resumo['receitas']} receitas em {resumo['segundos']:.1f}s.")
+
+@app.cli.command('similares')
+@click.option('--processos', type=int, help='Processos de cálculo (padrão: SIMILARES_PROCESSOS).')
+def similares_command(processos):
+    """Calcula as receitas similares de todo o catálogo."""
+    with app.app_context():
+        resumo = similares.calcular_todas(
+            db.engine,
+            k=app.config['SIMILARES_K'],
+            metrica=app.config['SIMILARES_METRICA'],
+            peso_categorias=app.config['SIMILARES_PESO_CATEGORIAS'],
+            processos=app.config['SIMILARES_PROCESSOS'] if processos is None else processos,
+            bloco=app.config['SIMILARES_BLOCO'],
+        )
+        cache.limpar()
+        print(f"Receitas similares calculadas para {resumo['receitas']} receitas em {resumo['segundos']:.1f}s.")
+
+@app.cli.command('import-receitas')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['jsonl', 'csv']), help='Padrão: pela extensão do arquivo.')
+@click.option('--lote', type=int, help='Receitas por transação (padrão: IMPORTACAO_LOTE).')
+@click.option('--checkpoint', 'chave', help='Nome do checkpoint (padrão: nome do arquivo).')
+@click.option('--recomecar', is_flag=True, help='Ignora o checkpoint e importa desde o início.')
+def import_receitas_command(arquivo, formato, lote, chave, recomecar):
+    """Importa receitas de um arquivo JSONL ou CSV, em lotes e com retomada."""
+    formato = formato or ('csv' if arquivo.lower().endswith('.csv') else 'jsonl')
+    with app.app_context():
+        resumo = importacao.importar(
+            arquivo, formato,
+            chave=chave or os.path.basename(arquivo),
+            lote=lote or app.config['IMPORTACAO_LOTE'],
+            recomecar=recomecar,
+            modo_duplicatas=app.config['DUPLICATAS_MODO'],
+            limiar_duplicatas=app.config['DUPLICATAS_LIMIAR'],
+        )
+        print(f"Importação concluída: {resumo['importados']} receitas importadas, "
+              f"{resumo['ignorados']} registros ignorados.")
+        if resumo['duplicatas']:
+            acao = 'recusadas' if app.config['DUPLICATAS_MODO'] == 'bloquear' else 'marcadas para revisão'
+            print(f"{resumo['duplicatas']} receitas quase iguais a outras foram {acao}.")
+
+@app.cli.command('deduplicar')
+@click.option('--processos', type=int, help='Processos de cálculo (padrão: DUPLICATAS_PROCESSOS).')
+def deduplicar_command(processos):
+    """Reindexa todas as receitas e refaz a lista de duplicatas suspeitas."""
+    with app.app_context():
+        resumo = duplicatas.deduplicar(
+            db.engine,
+            limiar=app.config['DUPLICATAS_LIMIAR'],
+            processos=app.config['DUPLICATAS_PROCESSOS'] if processos is None else processos,
+        )
+        print(f"{resumo['receitas']} receitas verificadas em {resumo['segundos']:.1f}s: "
+              f"{resumo['candidatos']} comparações de pares candidatos, {resumo['suspeitas']} duplicatas suspeitas.")
+
+@app.cli.command('export-receitas')
+@click.option('--formato', type=click.Choice(list(exportacao.FORMATOS)), default='ndjson')
+@click.option('--saida', default='-', help='Arquivo de saída (padrão: saída padrão).')
+def export_receitas_command(formato, saida):
+    """Exporta o catálogo completo (inclui o e-mail dos chefs, para reimportação)."""
+    with app.app_context():
+        with click.open_file(saida, 'w', encoding='utf-8') as arquivo:
+            for pedaco in exportacao.gerar(formato, app.config['EXPORTACAO_BLOCO'], incluir_email=True):
+                arquivo.write(pedaco)
+
+# --- Rotas de diagnóstico ---
+# Mostram números internos, SQL e títulos de receitas: fora do servidor de
+# desenvolvimento (app.debug), só um usuário logado cujo e-mail esteja em
+# DIAGNOSTICO_ADMINS pode vê-las. Para os outros elas não existem (404).
+def _pode_diagnosticar():
+    return app.debug or (current_user.is_authenticated and
+                         current_user.email.lower() in app.config['DIAGNOSTICO_ADMINS'])
+
+def diagnostico(rota):
+    @wraps(rota)
+    def protegida(*args, **kwargs):
+        if not _pode_diagnosticar():
+            abort(404)
+        return rota(*args, **kwargs)
+    return protegida
+
+@app.route('/_debug/cache')
+@diagnostico
+def debug_cache():
+    return jsonify(cache.estatisticas())
+
+@app.route('/_debug/requests')
+@diagnostico
+def debug_requisicoes():
+    return render_template('debug_requisicoes.html', requisicoes=instrumentacao.ultimas(),
+                           limite=instrumentacao.limite_repeticoes)
+
+@app.route('/_debug/duplicatas')
+@diagnostico
+def debug_duplicatas():
+    suspeita, original = db.aliased(Receita), db.aliased(Receita)
+    pares = db.session.execute(
+        db.select(suspeita.id, suspeita.titulo, original.id, original.titulo, DuplicataSuspeita.similaridade)
+        .join(suspeita, DuplicataSuspeita.receita_id == suspeita.id)
+        .join(original, DuplicataSuspeita.original_id == original.id)
+        .order_by(DuplicataSuspeita.detectada_em.desc(), DuplicataSuspeita.receita_id.desc()).limit(100)
+    )
+    return jsonify([{'receita': {'id': r_id, 'titulo': r_titulo}, 'original': {'id': o_id, 'titulo': o_titulo},
+                     'similaridade': round(valor, 3)} for r_id, r_titulo, o_id, o_titulo, valor in pares])
+
+@app.route('/_debug/senhas')
+@diagnostico
+def debug_senhas():
+    return jsonify(hasher.estatisticas())
+
+def _coletor_autorizado():
+    token = app.config['METRICAS_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return request.remote_addr in app.config['METRICAS_IPS']
+
+@app.route('/metrics')
+def metricas_prometheus():
+    # O Prometheus não faz login: entra pelo token ou por um endereço liberado
+    if not (_coletor_autorizado() or _pode_diagnosticar()):
+        abort(404)
+    return Response(metricas.exposicao(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,139 @@
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from database import db
+
+# --- Perfil de armazenamento do SQLite ---
+# Com as configurações padrão, o SQLite usa o "rollback journal": enquanto um
+# processo escreve, ninguém lê, e quem encontra o banco ocupado desiste com
+# "database is locked". Com vários workers do gunicorn isso aparece logo.
+# O perfil escolhido em SQLITE_PERFIL é aplicado em cada conexão nova:
+#   - journal_mode=WAL: leitores não bloqueiam o escritor nem são bloqueados
+#     por ele (continua havendo um escritor por vez);
+#   - synchronous=NORMAL: em WAL, só perde as últimas transações numa queda de
+#     energia, nunca corrompe o banco; fsync bem menos frequente;
+#   - busy_timeout: espera o outro escritor terminar em vez de falhar na hora;
+#   - cache_size / mmap_size: mais páginas do banco em memória por conexão.
+# Em todos os perfis, foreign_keys=ON: sem ele o SQLite não confere as chaves
+# estrangeiras nem aplica o ON DELETE CASCADE dos modelos.
+# SQLITE_PRAGMAS permite sobrescrever pragmas individuais do perfil.
+# O tamanho do pool de conexões fica em SQLALCHEMY_ENGINE_OPTIONS (app.py).
+#
+# "flask benchmark-sqlite" compara os perfis com N processos escrevendo e
+# lendo ao mesmo tempo em um banco temporário.
+
+PERFIS_SQLITE = {
+    # Comportamento original do SQLite (para comparação)
+    'padrao': {},
+    # Vários workers lendo e escrevendo no mesmo arquivo
+    'concorrente': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000, # ms
+        'cache_size': -20000, # Negativo = em KiB (20 MB)
+        'mmap_size': 268435456, # 256 MB
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def pragmas_do_perfil(perfil, extras=None):
+    if perfil not in PERFIS_SQLITE:
+        raise ValueError(f'SQLITE_PERFIL desconhecido: {perfil}')
+    return {'foreign_keys': 'ON', **PERFIS_SQLITE[perfil], **(extras or {})}
+
+
+def aplicar_pragmas(conexao_dbapi, pragmas):
+    cursor = conexao_dbapi.cursor()
+    for nome, valor in pragmas.items():
+        cursor.execute(f'PRAGMA {nome} = {valor}')
+    cursor.close()
+
+
+def configurar_engine(engine, pragmas):
+    """Aplica os pragmas em toda conexão que o engine abrir (só para SQLite)."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    event.listen(engine, 'connect', lambda conexao, registro: aplicar_pragmas(conexao, pragmas))
+
+
+def init_app(app):
+    pragmas = pragmas_do_perfil(app.config.get('SQLITE_PERFIL', 'padrao'), app.config.get('SQLITE_PRAGMAS'))
+    with app.app_context():
+        configurar_engine(db.engine, pragmas)
+
+
+# --- Benchmark ---
+def _processo_benchmark(url, pragmas, papel, segundos, semente):
+    # Roda em um processo separado, como um worker do gunicorn
+    engine = create_engine(url)
+    configurar_engine(engine, pragmas)
+    sorteio = random.Random(semente)
+    operacoes = travamentos = 0
+    fim = time.monotonic() + segundos
+    while time.monotonic() < fim:
+        try:
+            with engine.begin() as conexao:
+                if papel == 'escrita':
+                    conexao.execute(text('INSERT INTO bench (titulo, instrucoes) VALUES (:t, :i)'),
+                                    {'t': f'Receita {sorteio.random()}', 'i': 'Misture tudo. ' * 20})
+                else:
+                    inicio = sorteio.randint(1, 5000)
+                    conexao.execute(text('SELECT id, titulo FROM bench WHERE id >= :i ORDER BY id LIMIT 20'),
+                                    {'i': inicio}).all()
+            operacoes += 1
+        except OperationalError as erro:
+            if 'locked' not in str(erro):
+                raise
+            travamentos += 1
+    engine.dispose()
+    return papel, operacoes, travamentos
+
+
+def _remover_banco(caminho):
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+
+
+def benchmark(diretorio, escritores=4, leitores=4, segundos=5, perfis=None, avisar=print):
+    """Mede leituras/s, escritas/s e erros de banco travado para cada perfil."""
+    resultados = {}
+    for perfil in perfis or PERFIS_SQLITE:
+        caminho = os.path.join(diretorio, f'benchmark_{perfil}.db')
+        _remover_banco(caminho)
+        url = 'sqlite:///' + caminho
+        pragmas = pragmas_do_perfil(perfil)
+
+        engine = create_engine(url)
+        configurar_engine(engine, pragmas)
+        with engine.begin() as conexao:
+            conexao.execute(text('CREATE TABLE bench (id INTEGER PRIMARY KEY, titulo TEXT, instrucoes TEXT)'))
+            conexao.execute(text('INSERT INTO bench (titulo, instrucoes) VALUES (:t, :i)'),
+                            [{'t': f'Receita {n}', 'i': 'Misture tudo. ' * 20} for n in range(5000)])
+        engine.dispose()
+
+        papeis = ['escrita'] * escritores + ['leitura'] * leitores
+        totais = {'escrita': [0, 0], 'leitura': [0, 0]}
+        with ProcessPoolExecutor(len(papeis), mp_context=get_context('spawn')) as executor:
+            futuros = [executor.submit(_processo_benchmark, url, pragmas, papel, segundos, semente)
+                       for semente, papel in enumerate(papeis)]
+            for futuro in futuros:
+                papel, operacoes, travamentos = futuro.result()
+                totais[papel][0] += operacoes
+                totais[papel][1] += travamentos
+
+        resultados[perfil] = {
+            'escritas_por_segundo': totais['escrita'][0] / segundos,
+            'leituras_por_segundo': totais['leitura'][0] / segundos,
+            'erros_travado': totais['escrita'][1] + totais['leitura'][1],
+        }
+        avisar(f"{perfil:>12}: {resultados[perfil]['escritas_por_segundo']:8.0f} escritas/s  "
+               f"{resultados[perfil]['leituras_por_segundo']:8.0f} leituras/s  "
+               f"{resultados[perfil]['erros_travado']:5d} erros 'database is locked'")
+        _remover_banco(caminho)
+    return resultados
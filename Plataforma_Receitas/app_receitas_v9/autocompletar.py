@@ -0,0 +1,133 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right
+from heapq import nsmallest
+from sqlalchemy import func, select
+from models import Ingrediente, Categoria, ReceitaIngrediente, receita_categorias
+from eventos import Acompanhamento, sincronizar
+
+# --- Autocompletar nomes de ingredientes e categorias ---
+# Cada vocabulário fica em memória como uma lista ordenada de chaves (o nome
+# sem acentos, em minúsculas) e a lista de nomes na mesma ordem. Os nomes que
+# começam com um prefixo ocupam um intervalo contínuo da lista, achado com
+# duas buscas binárias (bisect). As sugestões são os nomes do intervalo mais
+# usados em receitas.
+#
+# Um intervalo pequeno (até VARREDURA nomes) é ordenado na hora. Prefixos
+# curtos como "a" cobrem dezenas de milhares de nomes: para eles guardamos os
+# TOPO mais usados, calculados no primeiro uso e ajustados a cada gravação.
+#
+# Cada processo mantém os seus vocabulários, montados do banco no primeiro uso
+# e atualizados pelo diário de alterações (ver eventos.py) com as receitas
+# gravadas por qualquer worker: os nomes novos entram na lista e os usos dos
+# nomes dessas receitas são recontados.
+# Usos que diminuem por outra razão (receita excluída, ingrediente retirado)
+# só são corrigidos quando o processo monta o vocabulário de novo.
+
+TOPO = 20 # Máximo de sugestões por consulta
+VARREDURA = 2000 # Acima disso, o intervalo do prefixo usa a lista pré-calculada
+
+_ACENTOS = re.compile('[\u0300-\u036f]') # Acentos, depois que o NFKD os separa das letras
+_FIM = '\U0010ffff' # Maior caractere possível: chave + _FIM fecha o intervalo do prefixo
+
+
+def chave(nome):
+    """'  Açúcar  Mascavo' -> 'acucar mascavo'."""
+    return ' '.join(_ACENTOS.sub('', unicodedata.normalize('NFKD', nome.lower())).split())
+
+
+class Vocabulario:
+    def __init__(self, modelo, associacao, coluna):
+        self._trava = threading.Lock()
+        self.pronto = False
+        self.modelo, self.associacao, self.coluna = modelo, associacao, coluna
+        self.chaves = []  # Ordenadas
+        self.nomes = []   # Na mesma ordem das chaves
+        self.usos = {}    # nome -> receitas que usam o nome
+        self._topo = {}   # prefixo -> [nomes mais usados], só para intervalos grandes
+        self.acompanhamento = Acompanhamento('receita')
+
+    def _ordem(self, nome):
+        return (-self.usos[nome], nome)
+
+    def _contagens(self, conexao, filtro=None):
+        consulta = (select(self.modelo.nome, func.count(self.associacao.c.receita_id))
+                    .outerjoin(self.associacao, self.coluna == self.modelo.id)
+                    .group_by(self.modelo.id, self.modelo.nome))
+        if filtro is not None:
+            consulta = consulta.where(filtro)
+        return dict(conexao.execute(consulta).all())
+
+    def carregar(self, conexao):
+        usos = self._contagens(conexao)
+        entradas = sorted((chave(nome), nome) for nome in usos)
+        with self._trava:
+            self.usos = usos
+            self.chaves = [c for c, _ in entradas]
+            self.nomes = [n for _, n in entradas]
+            self._topo = {}
+            # Os intervalos mais largos ("" e uma letra) já ficam prontos
+            for prefixo in {''} | {c[:1] for c in self.chaves}:
+                self._sugestoes(prefixo, TOPO)
+            self.pronto = True
+
+    def _sugestoes(self, prefixo, limite):
+        inicio = bisect_left(self.chaves, prefixo)
+        fim = bisect_left(self.chaves, prefixo + _FIM, inicio)
+        if fim - inicio <= VARREDURA:
+            return nsmallest(limite, self.nomes[inicio:fim], key=self._ordem)
+        topo = self._topo.get(prefixo)
+        if topo is None:
+            topo = self._topo[prefixo] = nsmallest(TOPO, self.nomes[inicio:fim], key=self._ordem)
+        return topo[:limite]
+
+    def sugerir(self, texto, limite=10):
+        """[(nome, usos)] dos nomes que começam com `texto`, dos mais usados para os menos."""
+        with self._trava:
+            return [(nome, self.usos[nome]) for nome in self._sugestoes(chave(texto), min(limite, TOPO))]
+
+    def atualizar(self, usos):
+        """Aplica {nome: usos} (nomes novos entram no vocabulário)."""
+        with self._trava:
+            for nome, quantidade in usos.items():
+                anterior = self.usos.get(nome)
+                c = chave(nome)
+                if anterior is None:
+                    posicao = bisect_right(self.chaves, c)
+                    self.chaves.insert(posicao, c)
+                    self.nomes.insert(posicao, nome)
+                self.usos[nome] = quantidade
+                for tamanho in range(len(c) + 1):
+                    topo = self._topo.get(c[:tamanho])
+                    if topo is None:
+                        continue
+                    if anterior is not None and quantidade < anterior and nome in topo:
+                        # Pode ter caído para fora do topo: recalcula no próximo uso
+                        del self._topo[c[:tamanho]]
+                        continue
+                    if nome not in topo:
+                        topo.append(nome)
+                    topo.sort(key=self._ordem)
+                    del topo[TOPO:]
+
+    def contagens_das_receitas(self, conexao, receitas):
+        """{nome: usos} dos nomes usados pelas `receitas`, recontados no banco."""
+        usados = select(self.coluna).where(self.associacao.c.receita_id.in_(receitas))
+        return self._contagens(conexao, self.modelo.id.in_(usados))
+
+    def aplicar(self, conexao, alteradas, excluidas):
+        if alteradas:
+            self.atualizar(self.contagens_das_receitas(conexao, list(alteradas)))
+
+
+vocabularios = {
+    'ingrediente': Vocabulario(Ingrediente, ReceitaIngrediente.__table__,
+                               ReceitaIngrediente.__table__.c.ingrediente_id),
+    'categoria': Vocabulario(Categoria, receita_categorias, receita_categorias.c.categoria_id),
+}
+
+
+def obter(tipo, conexao):
+    """Devolve o vocabulário do processo, em dia com as receitas gravadas por todos os workers."""
+    return sincronizar(vocabularios[tipo], conexao)
@@ -0,0 +1,112 @@
+import re
+from sqlalchemy import bindparam, text
+from eventos import receitas_gravadas
+
+# --- Busca textual com SQLite FTS5 ---
+# Em vez de "titulo LIKE '%termo%'" (que lê a tabela inteira), mantemos uma
+# tabela virtual FTS5 com um índice invertido de titulo, instrucoes, nomes dos
+# ingredientes e nomes das categorias. O rowid da tabela é o id da receita.
+#
+# O tokenizador unicode61 com remove_diacritics 2 ignora acentos e maiúsculas,
+# então "pao", "Pão" e "PÃO" encontram a mesma receita. O SQLite não tem um
+# stemmer de português, por isso cada termo da busca vira uma busca por prefixo
+# ("feij" encontra "feijão" e "feijoada"); o índice de prefixos de 2 e 3
+# letras deixa essas consultas rápidas.
+
+SQL_CRIAR_TABELA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS receita_fts USING fts5(
+    titulo, instrucoes, ingredientes, categorias,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+# Monta o documento de cada receita direto no banco, sem carregar objetos do ORM
+SQL_DOCUMENTOS = """
+INSERT INTO receita_fts (rowid, titulo, instrucoes, ingredientes, categorias)
+SELECT r.id, r.titulo, r.instrucoes,
+    COALESCE((SELECT group_concat(i.nome, ' ')
+              FROM receita_ingredientes ri JOIN ingrediente i ON i.id = ri.ingrediente_id
+              WHERE ri.receita_id = r.id), ''),
+    COALESCE((SELECT group_concat(c.nome, ' ')
+              FROM receita_categorias rc JOIN categoria c ON c.id = rc.categoria_id
+              WHERE rc.receita_id = r.id), '')
+FROM receita r
+"""
+
+# Pesos do bm25 na ordem das colunas: o título vale mais que os ingredientes,
+# que valem mais que as categorias e as instruções.
+SQL_BUSCA = """
+SELECT rowid FROM receita_fts
+WHERE receita_fts MATCH :consulta
+ORDER BY bm25(receita_fts, 10.0, 1.0, 5.0, 3.0)
+LIMIT :limite
+"""
+
+_tabela_pronta = False
+
+
+def criar_tabela(conexao):
+    global _tabela_pronta
+    conexao.execute(text(SQL_CRIAR_TABELA))
+    _tabela_pronta = True
+
+
+def remover_tabela(conexao):
+    global _tabela_pronta
+    conexao.execute(text("DROP TABLE IF EXISTS receita_fts"))
+    _tabela_pronta = False
+
+
+def indexar(conexao, alteradas=(), excluidas=()):
+    """Atualiza no índice apenas as receitas informadas."""
+    if not _tabela_pronta:
+        criar_tabela(conexao)
+    ids = list(set(alteradas) | set(excluidas))
+    if not ids:
+        return
+    conexao.execute(
+        text("DELETE FROM receita_fts WHERE rowid IN :ids").bindparams(bindparam('ids', expanding=True)),
+        {'ids': ids},
+    )
+    if alteradas:
+        conexao.execute(
+            text(SQL_DOCUMENTOS + " WHERE r.id IN :ids").bindparams(bindparam('ids', expanding=True)),
+            {'ids': list(alteradas)},
+        )
+
+
+def reindexar(conexao):
+    """Reconstrói o índice inteiro com um único INSERT ... SELECT."""
+    criar_tabela(conexao)
+    conexao.execute(text("DELETE FROM receita_fts"))
+    conexao.execute(text(SQL_DOCUMENTOS))
+    conexao.execute(text("INSERT INTO receita_fts (receita_fts) VALUES ('optimize')"))
+    return conexao.execute(text("SELECT count(*) FROM receita_fts")).scalar()
+
+
+def montar_consulta(termo):
+    """Converte o texto digitado em uma consulta FTS5 segura.
+
+    Cada palavra vira uma busca por prefixo entre aspas (o que neutraliza a
+    sintaxe do FTS5, como AND, OR, NEAR e aspas soltas) e todas precisam aparecer.
+    """
+    palavras = re.findall(r'\w+', termo or '')
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+
+def buscar(conexao, termo, limite=50):
+    """Devolve os ids das receitas encontradas, do mais relevante para o menos."""
+    consulta = montar_consulta(termo)
+    if not consulta:
+        return []
+    if not _tabela_pronta:
+        criar_tabela(conexao)
+    resultado = conexao.execute(text(SQL_BUSCA), {'consulta': consulta, 'limite': limite})
+    return [linha[0] for linha in resultado]
+
+
+# Mantém o índice sincronizado na mesma transação em que a receita é gravada
+@receitas_gravadas.connect
+def _sincronizar(session, alteradas, excluidas):
+    indexar(session.connection(), alteradas, excluidas)
@@ -0,0 +1,222 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import request, session, make_response, current_app
+from flask_login import current_user
+
+# --- Cache de respostas das páginas de leitura ---
+# As páginas mais acessadas (index, receita, chef, categoria) mudam pouco, mas
+# a cada visita consultam o banco e renderizam o Jinja de novo. Aqui guardamos
+# a resposta pronta, com chave = rota + argumentos + variante do usuário
+# (anônimo ou o id do usuário logado, pois a página muda para o dono da receita).
+#
+# Invalidação por "tags": cada resposta guardada anota a versão atual das tags
+# de que depende (ex.: 'receita:7', 'chef:3'). Invalidar uma tag é só trocar a
+# versão dela; as respostas com a versão antiga deixam de valer na próxima leitura.
+#
+# Dois armazenamentos:
+#   - 'memoria': LRU em memória, por processo (rápido, mas cada worker tem o seu
+#     e só enxerga as invalidações feitas por ele mesmo; com vários workers as
+#     páginas podem ficar desatualizadas até o CACHE_TTL)
+#   - 'arquivos': um arquivo por chave em um diretório, compartilhado entre os
+#     workers da mesma máquina (escritas atômicas com os.replace)
+
+
+class CacheMemoria:
+    compartilhado = False # Cada processo tem o seu
+
+    def __init__(self, tamanho=1000):
+        self.tamanho = tamanho
+        self._dados = OrderedDict()
+        self._trava = threading.Lock()
+
+    def get(self, chave):
+        with self._trava:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            expira, valor = item
+            if expira and expira < time.time():
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        with self._trava:
+            self._dados[chave] = (time.time() + ttl if ttl else None, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho:
+                self._dados.popitem(last=False)
+
+    def delete(self, chave):
+        with self._trava:
+            self._dados.pop(chave, None)
+
+    def limpar(self):
+        with self._trava:
+            self._dados.clear()
+
+
+class CacheArquivos:
+    compartilhado = True # Todos os workers da máquina leem os mesmos arquivos
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, hashlib.sha1(chave.encode('utf-8')).hexdigest())
+
+    def get(self, chave):
+        try:
+            with open(self._caminho(chave), 'rb') as arquivo:
+                expira, valor = pickle.load(arquivo)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expira and expira < time.time():
+            self.delete(chave)
+            return None
+        return valor
+
+    def set(self, chave, valor, ttl=None):
+        caminho = self._caminho(chave)
+        temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            pickle.dump((time.time() + ttl if ttl else None, valor), arquivo, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho)
+
+    def delete(self, chave):
+        try:
+            os.remove(self._caminho(chave))
+        except OSError:
+            pass
+
+    def limpar(self):
+        for nome in os.listdir(self.diretorio):
+            try:
+                os.remove(os.path.join(self.diretorio, nome))
+            except OSError:
+                pass
+
+
+class CacheRespostas:
+    def __init__(self, app=None):
+        self.armazenamento = None
+        self.ttl = None
+        self.acertos = 0
+        self.falhas = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        tipo = app.config.get('CACHE_TIPO')
+        if tipo == 'memoria':
+            self.armazenamento = CacheMemoria(app.config.get('CACHE_TAMANHO', 1000))
+        elif tipo == 'arquivos':
+            self.armazenamento = CacheArquivos(app.config['CACHE_DIRETORIO'])
+        elif tipo:
+            raise ValueError(f'CACHE_TIPO desconhecido: {tipo}')
+        self.ttl = app.config.get('CACHE_TTL')
+        app.extensions['cache_respostas'] = self
+
+    @property
+    def ativo(self):
+        return self.armazenamento is not None
+
+    @property
+    def compartilhado(self):
+        """As versões das tags valem para todos os workers (e não só para este processo)?"""
+        return self.ativo and self.armazenamento.compartilhado
+
+    # --- Versões das tags ---
+    def versao(self, tag):
+        versao = self.armazenamento.get(f'tag:{tag}')
+        if versao is None:
+            versao = uuid.uuid4().hex
+            self.armazenamento.set(f'tag:{tag}', versao)
+        return versao
+
+    def invalidar(self, *tags):
+        if not self.ativo:
+            return
+        for tag in set(tags):
+            self.armazenamento.set(f'tag:{tag}', uuid.uuid4().hex)
+
+    def limpar(self):
+        if self.ativo:
+            self.armazenamento.limpar()
+
+    # --- Respostas ---
+    def obter(self, chave):
+        entrada = self.armazenamento.get(chave)
+        if entrada is not None and all(self.versao(tag) == v for tag, v in entrada['tags'].items()):
+            self.acertos += 1
+            return entrada
+        self.falhas += 1
+        return None
+
+    def guardar(self, chave, resposta, versoes):
+        self.armazenamento.set(chave, {
+            'tags': versoes,
+            'corpo': resposta.get_data(),
+            'status': resposta.status_code,
+            'mimetype': resposta.mimetype,
+        }, self.ttl)
+
+    def estatisticas(self):
+        total = self.acertos + self.falhas
+        return {
+            'ativo': self.ativo,
+            'tipo': type(self.armazenamento).__name__ if self.ativo else None,
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'taxa_acerto': self.acertos / total if total else 0.0,
+        }
+
+
+cache = CacheRespostas()
+
+
+def _chave_da_requisicao():
+    variante = f'usuario:{current_user.get_id()}' if current_user.is_authenticated else 'anonimo'
+    argumentos = sorted(request.args.items(multi=True))
+    return f'resposta:{request.endpoint}:{sorted((request.view_args or {}).items())}:{argumentos}:{variante}'
+
+
+def em_cache(tags):
+    """Decorador de rota: guarda a resposta, dependente das `tags(**argumentos_da_rota)`."""
+    def decorador(view):
+        @wraps(view)
+        def envolvida(**kwargs):
+            # Páginas com mensagens flash pendentes são sempre renderizadas
+            if not cache.ativo or request.method != 'GET' or session.get('_flashes'):
+                return view(**kwargs)
+            chave = _chave_da_requisicao()
+            entrada = cache.obter(chave)
+            if entrada is not None:
+                resposta = current_app.response_class(entrada['corpo'], status=entrada['status'],
+                                                      mimetype=entrada['mimetype'])
+                resposta.headers['X-Cache'] = 'HIT'
+                return resposta
+            # As versões são lidas antes de renderizar: se a receita mudar durante a
+            # renderização, a resposta já nasce desatualizada e não será reutilizada.
+            versoes = {tag: cache.versao(tag) for tag in tags(**kwargs)}
+            resposta = make_response(view(**kwargs))
+            if resposta.status_code == 200 and not resposta.direct_passthrough:
+                cache.guardar(chave, resposta, versoes)
+            resposta.headers['X-Cache'] = 'MISS'
+            return resposta
+        return envolvida
+    return decorador
+
+
+def tags_da_receita(receita):
+    """Tudo o que exibe a receita: a listagem, a página dela, a do chef e as das categorias."""
+    return ['receitas', f'receita:{receita.id}', f'chef:{receita.chef_id}'] + \
+        [f'categoria:{categoria.id}' for categoria in receita.categorias]
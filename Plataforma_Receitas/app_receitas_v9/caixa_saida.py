@@ -0,0 +1,229 @@
+import smtplib
+import threading
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app, render_template
+from flask_mail import Message
+from sqlalchemy import func, or_, select, update
+from database import db
+from models import EmailPendente
+from cache_respostas import CacheMemoria
+from eventos import ao_confirmar
+
+# --- Caixa de saída de e-mails ---
+# Enviar um e-mail na própria requisição prende o worker durante toda a conversa
+# com o servidor SMTP (às vezes segundos) e, se falhar, a mensagem se perde.
+# Aqui a rota só grava a mensagem na tabela email_pendente e responde na hora.
+# Um conjunto de threads ("enviador") lê a fila e envia:
+#   - cada thread mantém uma conexão SMTP aberta e a reaproveita enquanto houver
+#     mensagens na fila (o Flask-Mail reconecta a cada MAIL_MAX_EMAILS, se definido);
+#   - as mensagens são reservadas em lotes com um identificador próprio, então
+#     vários processos podem enviar da mesma fila sem mandar nada em dobro;
+#   - uma falha agenda nova tentativa com espera exponencial (30s, 60s, 120s, ...)
+#     até EMAIL_MAX_TENTATIVAS, e o erro fica registrado na mensagem.
+#
+# Para testar sem enviar e-mails de verdade, aponte MAIL_SERVER/MAIL_PORT para um
+# servidor SMTP local (ex.: "python -m aiosmtpd -n -l localhost:1025") e use
+# "flask enviar-emails --uma-vez" para esvaziar a fila.
+
+# Reservas mais antigas do que isto são consideradas abandonadas (processo caiu no meio do envio)
+RESERVA_EXPIRADA = timedelta(minutes=10)
+
+# Espera máxima entre tentativas depois de erros inesperados seguidos no laço de envio
+ESPERA_MAXIMA_APOS_ERRO = 300
+
+# HTML já renderizado dos e-mails de receita, por (receita, versão, remetente)
+_emails_renderizados = CacheMemoria(500)
+
+
+def renderizar_email_receita(receita, remetente):
+    chave = f'{receita.id}:{receita.versao}:{remetente}'
+    html = _emails_renderizados.get(chave)
+    if html is None:
+        html = render_template('email_receita.html', receita=receita, remetente=remetente)
+        _emails_renderizados.set(chave, html)
+    return html
+
+
+def enfileirar(destinatario, assunto, html):
+    """Coloca a mensagem na fila; ela é enviada depois do commit da transação."""
+    email = EmailPendente(destinatario=destinatario, assunto=assunto, html=html)
+    db.session.add(email)
+    ao_confirmar(db.session, enviador.acordar)
+    return email
+
+
+def profundidade_fila():
+    return db.session.scalar(
+        select(func.count(EmailPendente.id)).where(EmailPendente.status.in_(['pendente', 'enviando'])))
+
+
+def reservar(tamanho):
+    """Reserva até `tamanho` mensagens prontas para envio e as devolve."""
+    agora = datetime.utcnow()
+    token = uuid.uuid4().hex
+    disponiveis = or_(
+        (EmailPendente.status == 'pendente') & (EmailPendente.proxima_tentativa <= agora),
+        (EmailPendente.status == 'enviando') & (EmailPendente.reservado_em < agora - RESERVA_EXPIRADA),
+    )
+    ids = db.session.scalars(
+        select(EmailPendente.id).where(disponiveis).order_by(EmailPendente.id).limit(tamanho)).all()
+    if not ids:
+        db.session.commit()
+        return []
+    # A condição é repetida no UPDATE: se outro processo reservou antes, a linha não muda
+    db.session.execute(
+        update(EmailPendente)
+        .where(EmailPendente.id.in_(ids), disponiveis)
+        .values(status='enviando', reservado_por=token, reservado_em=agora)
+    )
+    db.session.commit()
+    return db.session.scalars(
+        select(EmailPendente).where(EmailPendente.reservado_por == token).order_by(EmailPendente.id)).all()
+
+
+def _registrar_falha(email, erro):
+    config = current_app.config
+    email.tentativas += 1
+    email.erro = str(erro)
+    email.reservado_por = None
+    if email.tentativas >= config['EMAIL_MAX_TENTATIVAS']:
+        email.status = 'falhou'
+    else:
+        espera = config['EMAIL_ESPERA_INICIAL'] * 2 ** (email.tentativas - 1)
+        email.status = 'pendente'
+        email.proxima_tentativa = datetime.utcnow() + timedelta(seconds=espera)
+
+
+def fechar_conexao(conexao):
+    """Fecha uma conexão SMTP aberta com mail.connect(), ignorando erros; devolve None."""
+    if conexao is not None:
+        try:
+            conexao.__exit__(None, None, None)
+        except (smtplib.SMTPException, OSError):
+            pass
+    return None
+
+
+def enviar_lote(conexao, emails):
+    """Envia as mensagens reservadas pela conexão SMTP aberta.
+
+    Devolve False se a conexão falhou e precisa ser reaberta.
+    """
+    remetente = current_app.config['MAIL_USERNAME']
+    conexao_ok = True
+    for email in emails:
+        if not conexao_ok:
+            # Sem conexão: devolve o restante para a fila sem contar como tentativa
+            email.status, email.reservado_por = 'pendente', None
+            continue
+        try:
+            conexao.send(Message(subject=email.assunto, sender=remetente,
+                                 recipients=[email.destinatario], html=email.html))
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as erro:
+            # Erro só desta mensagem: a conexão continua válida para as próximas
+            _registrar_falha(email, erro)
+        except (smtplib.SMTPException, OSError) as erro:
+            _registrar_falha(email, erro)
+            conexao_ok = False
+        else:
+            email.status, email.enviado_em, email.erro = 'enviado', datetime.utcnow(), None
+    db.session.commit()
+    return conexao_ok
+
+
+class EnviadorEmails:
+    """Threads em segundo plano que esvaziam a caixa de saída."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._threads = []
+
+    def acordar(self):
+        self._acordar.set()
+
+    def iniciar(self, app):
+        """Garante EMAIL_TRABALHADORES threads vivas (recria as que morreram)."""
+        with self._trava:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            nomes = {thread.name for thread in self._threads}
+            for numero in range(app.config['EMAIL_TRABALHADORES']):
+                nome = f'enviador-emails-{numero}'
+                if nome in nomes:
+                    continue
+                thread = threading.Thread(target=self.trabalhar, args=(app,), kwargs={'parar': self._parar},
+                                          name=nome, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def parar(self, espera=None):
+        """Pede às threads que terminem e aguarda até `espera` segundos por cada uma."""
+        with self._trava:
+            # As threads atuais veem este evento; as próximas recebem um novo
+            self._parar.set()
+            self._parar = threading.Event()
+            self._acordar.set()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(espera)
+
+    def trabalhar(self, app, uma_vez=False, parar=None):
+        """Laço de uma thread: reserva lotes e envia, reaproveitando a conexão SMTP.
+
+        Um erro inesperado (banco indisponível, bug) é registrado no log e o laço
+        continua depois de uma espera que dobra a cada falha seguida; as mensagens
+        que estavam reservadas voltam para a fila quando a reserva expira. Com
+        uma_vez=True (flask enviar-emails --uma-vez) o erro sobe para o comando.
+        """
+        parar = parar or self._parar
+        conexao = None
+        falhas = 0
+        with app.app_context():
+            while not parar.is_set():
+                try:
+                    conexao, vazia = self._processar_lote(app, conexao)
+                except Exception:
+                    conexao = fechar_conexao(conexao)
+                    db.session.remove()
+                    if uma_vez:
+                        raise
+                    falhas += 1
+                    espera = min(app.config['EMAIL_INTERVALO'] * 2 ** falhas, ESPERA_MAXIMA_APOS_ERRO)
+                    app.logger.exception('Falha no envio de e-mails; nova tentativa em %.0fs', espera)
+                    parar.wait(espera)
+                    continue
+                falhas = 0
+                if not vazia:
+                    continue
+                if uma_vez:
+                    return
+                self._acordar.wait(app.config['EMAIL_INTERVALO'])
+                self._acordar.clear()
+            fechar_conexao(conexao)
+
+    def _processar_lote(self, app, conexao):
+        """Reserva e envia um lote; devolve (conexão SMTP ou None, fila estava vazia)."""
+        emails = reservar(app.config['EMAIL_LOTE'])
+        if not emails:
+            # Fila vazia: fecha a conexão e espera novas mensagens
+            db.session.remove()
+            return fechar_conexao(conexao), True
+        try:
+            if conexao is None:
+                conexao = app.extensions['mail'].connect().__enter__()
+            if not enviar_lote(conexao, emails):
+                conexao = fechar_conexao(conexao)
+        except (smtplib.SMTPException, OSError) as erro:
+            # Não foi possível nem abrir a conexão
+            for email in emails:
+                _registrar_falha(email, erro)
+            db.session.commit()
+            conexao = fechar_conexao(conexao)
+        finally:
+            db.session.remove()
+        return conexao, False
+
+
+enviador = EnviadorEmails()
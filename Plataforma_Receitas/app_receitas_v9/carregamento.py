@@ -0,0 +1,33 @@
+from sqlalchemy.orm import joinedload, selectinload
+from models import Receita, ReceitaIngrediente
+
+# --- Perfis de carregamento (evitam o problema N+1) ---
+# Por padrão o SQLAlchemy carrega relacionamentos de forma "preguiçosa": cada
+# receita.chef ou receita.categorias acessado no template dispara um SELECT.
+# Cada perfil abaixo diz, de uma vez, o que o template da rota vai usar, e assim
+# uma página faz sempre o mesmo número de consultas, não importa quantas receitas tenha.
+#   - joinedload: traz o relacionamento no mesmo SELECT (bom para muitos-para-um)
+#   - selectinload: um SELECT extra com "WHERE id IN (...)" para todas as receitas da página
+
+PERFIS_CARGA = {
+    # Cartão da receita (_cartao_receita.html, usado em index.html, busca.html e
+    # receitas_por_categoria.html): chef, categorias e ingredientes
+    'cartao': (
+        joinedload(Receita.chef),
+        selectinload(Receita.categorias),
+        selectinload(Receita.ingredientes_associados).joinedload(ReceitaIngrediente.ingrediente),
+    ),
+    # Listagem simples (o_que_cozinhar.html): só o nome do chef
+    'titulo_chef': (
+        joinedload(Receita.chef),
+    ),
+    # Lista de títulos (detalhes_chef.html): nada além da própria receita
+    'titulo': (),
+}
+# Página da receita (detalhes_receita.html e email_receita.html): usa o mesmo que o cartão
+PERFIS_CARGA['detalhe'] = PERFIS_CARGA['cartao']
+
+
+def com_perfil(consulta, perfil):
+    """Aplica um perfil de carregamento nomeado a uma consulta de Receita."""
+    return consulta.options(*PERFIS_CARGA[perfil])
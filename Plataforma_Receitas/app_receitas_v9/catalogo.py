@@ -0,0 +1,61 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from database import db
+from models import Categoria, Ingrediente
+
+# --- Resolução de categorias e ingredientes por nome ---
+# Os formulários trazem nomes ("Farinha: 2 xícaras, Ovos: 3"). Em vez de um
+# SELECT por nome (e um INSERT para cada nome novo), resolvemos todos de uma vez:
+#   1. INSERT ... ON CONFLICT (nome) DO NOTHING com todos os nomes
+#   2. SELECT ... WHERE nome IN (...) para obter os objetos
+# São sempre duas consultas por tipo, não importa quantos nomes existam. E como
+# o banco ignora os nomes que já existem, dois chefs criando o mesmo
+# ingrediente novo ao mesmo tempo não esbarram mais na restrição UNIQUE.
+
+
+def ler_categorias(texto, separador=','):
+    """'sobremesa, Rápido, sobremesa' -> ['Sobremesa', 'Rápido'] (sem repetições)."""
+    nomes = [nome.strip().capitalize() for nome in (texto or '').split(separador) if nome.strip()]
+    return list(dict.fromkeys(nomes))
+
+
+def ler_ingredientes(texto, separador=','):
+    """'Farinha: 2 xícaras, Ovos: 3' -> {'farinha': '2 xícaras', 'ovos': '3'}.
+
+    Itens sem ':' são ignorados; se um ingrediente se repetir, vale o primeiro.
+    """
+    ingredientes = {}
+    for par in (texto or '').split(separador):
+        if ':' in par:
+            nome, quantidade = par.split(':', 1)
+            nome = nome.strip().lower()
+            if nome:
+                ingredientes.setdefault(nome, quantidade.strip())
+    return ingredientes
+
+
+def insert_do_dialeto(modelo, conexao=None):
+    # INSERT com suporte a ON CONFLICT (SQLite ou PostgreSQL, conforme o banco em uso)
+    dialeto = (conexao or db.session.get_bind()).dialect.name
+    return (postgresql.insert if dialeto == 'postgresql' else sqlite.insert)(modelo)
+
+
+def resolver_nomes(modelo, nomes):
+    """Devolve {nome: objeto} para todos os `nomes`, criando os que não existem."""
+    nomes = list(dict.fromkeys(nomes))
+    if not nomes:
+        return {}
+    db.session.execute(
+        insert_do_dialeto(modelo).values([{'nome': nome} for nome in nomes])
+        .on_conflict_do_nothing(index_elements=['nome'])
+    )
+    return {obj.nome: obj for obj in modelo.query.filter(modelo.nome.in_(nomes))}
+
+
+def resolver_categorias(nomes):
+    """Lista de objetos Categoria na mesma ordem dos nomes informados."""
+    encontradas = resolver_nomes(Categoria, nomes)
+    return [encontradas[nome] for nome in nomes]
+
+
+def resolver_ingredientes(nomes):
+    return resolver_nomes(Ingrediente, nomes)
@@ -0,0 +1,50 @@
+import hashlib
+import importlib.util
+from io import BytesIO
+import qrcode
+import qrcode.image.svg
+from cache_respostas import CacheMemoria
+
+# --- QR Code do 2FA ---
+# Antes, cada visita a /2fa/setup gerava o QR Code com o Pillow, salvava um PNG
+# e embutia o PNG em base64 dentro do HTML. Agora a página só tem um <img> que
+# aponta para /2fa/qr/<versao>.<formato>, e a imagem:
+#   - é SVG por padrão (gerado pelo próprio pacote qrcode, sem o Pillow);
+#     PNG continua disponível em .png, se o Pillow ou o pypng estiver instalado;
+#   - é gerada uma vez por segredo e guardada em memória;
+#   - tem na URL uma "versão" derivada do segredo: se o usuário desativar e
+#     reativar o 2FA, a URL muda, então o navegador pode guardar a imagem
+#     para sempre (Cache-Control immutable) sem risco de mostrar um QR antigo.
+
+FORMATOS = {'svg': 'image/svg+xml'}
+if importlib.util.find_spec('PIL') or importlib.util.find_spec('png'):
+    FORMATOS['png'] = 'image/png'
+
+_imagens = CacheMemoria(1000)
+
+
+def versao_do_segredo(segredo):
+    """Identificador curto do segredo, usado na URL e no ETag (não revela o segredo)."""
+    return hashlib.sha256(f'qr-2fa:{segredo}'.encode()).hexdigest()[:16]
+
+
+def _fabrica_pypng():
+    import qrcode.image.pure
+    return qrcode.image.pure.PyPNGImage
+
+
+def gerar(uri, formato='svg'):
+    """Devolve os bytes da imagem do QR Code para a `uri` (com cache em memória)."""
+    chave = f'{formato}:{hashlib.sha256(uri.encode()).hexdigest()}'
+    imagem = _imagens.get(chave)
+    if imagem is None:
+        if formato == 'svg':
+            imagem = qrcode.make(uri, image_factory=qrcode.image.svg.SvgPathImage).to_string()
+        else:
+            # Sem o Pillow, o PNG sai do pypng (a fábrica padrão do qrcode exige o Pillow)
+            fabrica = None if importlib.util.find_spec('PIL') else _fabrica_pypng()
+            buffer = BytesIO()
+            qrcode.make(uri, image_factory=fabrica).save(buffer)
+            imagem = buffer.getvalue()
+        _imagens.set(chave, imagem)
+    return imagem
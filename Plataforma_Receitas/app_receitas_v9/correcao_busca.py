@@ -0,0 +1,171 @@
+import re
+import threading
+import unicodedata
+from collections import Counter
+from sqlalchemy import func, select
+from models import Receita, Ingrediente, Categoria, ReceitaIngrediente, receita_categorias
+from eventos import Acompanhamento, sincronizar
+
+# --- "Você quis dizer": correção de termos da busca (SymSpell) ---
+# O vocabulário são as palavras dos títulos das receitas e dos nomes de
+# ingredientes e categorias. A frequência de cada palavra é quantas receitas a
+# usam. Para corrigir "feijoda" não comparamos o termo com o vocabulário
+# inteiro: no índice guardamos, para cada palavra, todas as versões dela com
+# até DISTANCIA_MAXIMA letras removidas ("feijoada" -> "fijoada", "feijoda",
+# ...). Uma palavra a até N edições do termo tem alguma remoção em comum com
+# ele, então basta gerar as remoções do termo e consultar o dicionário. O
+# custo não depende do tamanho do vocabulário, só do tamanho do termo (e só os
+# PREFIXO primeiros caracteres entram no índice, o que limita a memória).
+# Entre as candidatas, vence a de menor distância e, no empate, a mais usada.
+#
+# Cada processo monta o seu índice do banco no primeiro uso e o atualiza pelo
+# diário de alterações (ver eventos.py), com as receitas gravadas por qualquer
+# worker: as palavras das receitas novas somam na frequência e as palavras
+# novas de uma receita editada entram no vocabulário. Cada linha do diário é
+# lida uma só vez por processo, então uma receita nova não é somada duas
+# vezes. Palavras que deixam de existir só saem quando o índice é montado de
+# novo, mas a rota só sugere uma correção que encontra receitas.
+
+DISTANCIA_MAXIMA = 2
+PREFIXO = 7
+TAMANHO_MINIMO = 3 # Termos mais curtos não são corrigidos
+
+# Nomes que entram no vocabulário e a coluna que liga cada um às receitas
+_NOMES = ((Ingrediente, ReceitaIngrediente.__table__.c.ingrediente_id),
+          (Categoria, receita_categorias.c.categoria_id))
+
+_ACENTOS = re.compile('[\u0300-\u036f]')
+
+
+def chave(palavra):
+    return _ACENTOS.sub('', unicodedata.normalize('NFKD', palavra.lower()))
+
+
+def palavras(texto):
+    return [p for p in re.findall(r'\w+', (texto or '').lower()) if len(p) >= TAMANHO_MINIMO and not p.isdigit()]
+
+
+def _remocoes(palavra, distancia):
+    """A palavra e todas as versões dela com até `distancia` letras removidas."""
+    resultado = fronteira = {palavra}
+    for _ in range(distancia):
+        fronteira = {p[:i] + p[i + 1:] for p in fronteira for i in range(len(p))}
+        resultado = resultado | fronteira
+    return resultado
+
+
+def distancia(a, b, limite):
+    """Distância de edição com transposições (Damerau restrita); limite + 1 se passar do limite."""
+    if abs(len(a) - len(b)) > limite:
+        return limite + 1
+    anterior2, anterior = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        atual = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            custo = a[i - 1] != b[j - 1]
+            atual[j] = min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + custo)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                atual[j] = min(atual[j], anterior2[j - 2] + 1)
+        if min(atual) > limite:
+            return limite + 1
+        anterior2, anterior = anterior, atual
+    return anterior[-1]
+
+
+class Corretor:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.pronto = False
+        self.frequencias = Counter() # chave -> receitas que usam a palavra
+        self.formas = {}             # chave -> palavra com acentos, para exibir
+        self.remocoes = {}           # remoção -> [chaves]
+        self.acompanhamento = Acompanhamento('receita')
+
+    def _adicionar(self, contagens):
+        for palavra, quantidade in contagens.items():
+            c = chave(palavra)
+            if c not in self.frequencias:
+                self.formas[c] = palavra
+                for remocao in _remocoes(c[:PREFIXO], DISTANCIA_MAXIMA):
+                    self.remocoes.setdefault(remocao, []).append(c)
+            self.frequencias[c] += quantidade
+
+    def carregar(self, conexao):
+        contagens = Counter()
+        for (titulo,) in conexao.execute(select(Receita.titulo)).yield_per(5000):
+            contagens.update(set(palavras(titulo)))
+        for modelo, coluna in _NOMES:
+            for nome, usos in conexao.execute(select(modelo.nome, func.count())
+                                              .join(coluna.table, coluna == modelo.id)
+                                              .group_by(modelo.id, modelo.nome)):
+                for palavra in set(palavras(nome)):
+                    contagens[palavra] += usos
+        with self._trava:
+            self.frequencias, self.formas, self.remocoes = Counter(), {}, {}
+            self._adicionar(contagens)
+            self.pronto = True
+
+    def atualizar(self, novas, editadas):
+        """Soma as palavras das receitas novas e inclui as palavras nunca vistas das editadas."""
+        with self._trava:
+            self._adicionar(novas)
+            self._adicionar({p: 1 for p in editadas if chave(p) not in self.frequencias})
+
+    def aplicar(self, conexao, alteradas, excluidas):
+        """Lê do banco as palavras das receitas alteradas e atualiza o vocabulário."""
+        if not alteradas:
+            return
+        ids = list(alteradas)
+        textos, novas = {}, set()
+        for receita_id, titulo, versao in conexao.execute(
+                select(Receita.id, Receita.titulo, Receita.versao).where(Receita.id.in_(ids))):
+            textos[receita_id] = [titulo]
+            if versao == 1: # Receita recém-criada (ver eventos.py): só ela soma na frequência
+                novas.add(receita_id)
+        for modelo, coluna in _NOMES:
+            associacao = coluna.table
+            for receita_id, nome in conexao.execute(select(associacao.c.receita_id, modelo.nome)
+                                                    .join(modelo, coluna == modelo.id)
+                                                    .where(associacao.c.receita_id.in_(ids))):
+                textos[receita_id].append(nome)
+        contagens_novas, editadas = Counter(), set()
+        for receita_id, trechos in textos.items():
+            encontradas = {p for trecho in trechos for p in palavras(trecho)}
+            if receita_id in novas:
+                contagens_novas.update(encontradas)
+            else:
+                editadas |= encontradas
+        self.atualizar(contagens_novas, editadas)
+
+    def sugerir(self, termo):
+        """Palavra do vocabulário mais próxima do termo, ou None se ele já existe ou nada é parecido."""
+        c = chave(termo)
+        if len(c) < TAMANHO_MINIMO or c.isdigit():
+            return None
+        limite = 1 if len(c) <= 4 else DISTANCIA_MAXIMA
+        with self._trava:
+            if c in self.frequencias:
+                return None
+            candidatas = set()
+            for remocao in _remocoes(c[:PREFIXO], limite):
+                candidatas.update(self.remocoes.get(remocao, ()))
+            melhor = None
+            for candidata in candidatas:
+                d = distancia(c, candidata, limite)
+                if d <= limite and (melhor is None or (d, -self.frequencias[candidata]) < melhor[:2]):
+                    melhor = (d, -self.frequencias[candidata], candidata)
+            return self.formas[melhor[2]] if melhor else None
+
+    def corrigir(self, texto):
+        """O texto com os termos desconhecidos trocados pela sugestão, ou None se nada mudou."""
+        termos = re.findall(r'\w+', texto or '')
+        corrigidos = [self.sugerir(termo) or termo for termo in termos]
+        return ' '.join(corrigidos) if corrigidos != termos else None
+
+
+corretor = Corretor()
+
+
+def obter_corretor(conexao):
+    """Devolve o corretor do processo, em dia com as receitas gravadas por todos os workers."""
+    return sincronizar(corretor, conexao)
@@ -0,0 +1,180 @@
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+from sqlalchemy import func, select
+from database import db
+from models import Usuario, Chef, Receita, Ingrediente, Categoria, ReceitaIngrediente, receita_categorias
+from catalogo import resolver_nomes
+import busca_fts
+import estatisticas
+from eventos import anotar_recarga
+
+# --- Catálogo sintético para testes de carga ("flask seed") ---
+# Gera usuários, chefs e receitas com cara de dados reais:
+#   - vocabulários de ingredientes e categorias em português, com popularidade
+#     de Zipf (o 1º da lista aparece muito mais que o 50º, como "sal" e "cebola"
+#     na vida real);
+#   - chefs com produtividade também desigual (poucos publicam muito);
+#   - quantidade variável de ingredientes (2 a 15) e categorias (1 a 3);
+#   - datas de criação crescentes nos DIAS_DE_HISTORICO dias que terminam em
+#     `ate` (por padrão a data fixa DATA_FINAL, não o relógio).
+# Tudo sai de um único random.Random(semente) e da data final: a mesma semente
+# gera o mesmo banco em qualquer dia.
+#
+# As linhas são gravadas com INSERT em lote (executemany), com os ids
+# calculados aqui, sem passar pelo ORM. Por isso os dados derivados (busca
+# textual e contadores do dashboard) são reconstruídos uma vez no final, e os
+# índices em memória de cada processo são avisados para se montarem de novo.
+
+INGREDIENTES = [
+    'sal', 'cebola', 'alho', 'azeite', 'açúcar', 'ovo', 'farinha de trigo', 'manteiga', 'leite',
+    'tomate', 'pimenta-do-reino', 'óleo', 'salsinha', 'cebolinha', 'arroz', 'feijão', 'batata',
+    'cenoura', 'frango', 'carne moída', 'queijo muçarela', 'creme de leite', 'leite condensado',
+    'fermento em pó', 'limão', 'coentro', 'pimentão', 'milho', 'ervilha', 'orégano', 'chocolate em pó',
+    'queijo parmesão', 'presunto', 'bacon', 'linguiça calabresa', 'mandioca', 'farinha de mandioca',
+    'polvilho', 'coco ralado', 'leite de coco', 'azeite de dendê', 'camarão', 'peixe', 'bacalhau',
+    'abóbora', 'abobrinha', 'berinjela', 'brócolis', 'couve', 'repolho', 'alface', 'pepino',
+    'banana', 'maçã', 'laranja', 'maracujá', 'morango', 'goiabada', 'canela', 'cravo', 'noz-moscada',
+    'gengibre', 'açafrão', 'páprica', 'cominho', 'louro', 'manjericão', 'alecrim', 'tomilho',
+    'vinagre', 'mostarda', 'maionese', 'ketchup', 'molho de tomate', 'extrato de tomate', 'caldo de galinha',
+    'carne de sol', 'costela', 'picanha', 'lombo de porco', 'peito de peru', 'atum', 'sardinha',
+    'grão-de-bico', 'lentilha', 'quinoa', 'aveia', 'granola', 'mel', 'iogurte natural', 'requeijão',
+    'cream cheese', 'ricota', 'queijo coalho', 'queijo minas', 'fubá', 'tapioca', 'castanha-do-pará',
+    'castanha de caju', 'amendoim', 'nozes', 'uva-passa', 'azeitona', 'palmito', 'cogumelo', 'shimeji',
+    'champignon', 'alcaparra', 'vinho branco', 'vinho tinto', 'cerveja', 'cachaça', 'chocolate meio amargo',
+    'chocolate branco', 'gelatina', 'amido de milho', 'bicarbonato de sódio', 'essência de baunilha',
+    'raspas de limão', 'hortelã', 'jiló', 'quiabo', 'maxixe', 'chuchu', 'inhame', 'batata-doce',
+    'beterraba', 'rúcula', 'agrião', 'espinafre', 'acelga', 'pimenta dedo-de-moça', 'pimenta biquinho',
+    'açaí', 'cupuaçu', 'caju', 'manga', 'abacaxi', 'mamão', 'goiaba', 'jabuticaba', 'pequi', 'jambu',
+    'tucupi', 'carne seca', 'paio', 'pé de porco', 'rabada', 'mocotó', 'fígado', 'coração de frango',
+]
+
+CATEGORIAS = [
+    'prato principal', 'sobremesa', 'lanche', 'bolo', 'massa', 'salada', 'sopa', 'acompanhamento',
+    'café da manhã', 'vegetariana', 'carne', 'frango', 'peixe e frutos do mar', 'doce', 'salgado',
+    'bebida', 'petisco', 'fit', 'sem glúten', 'vegana', 'festa junina', 'natal', 'culinária mineira',
+    'culinária baiana', 'culinária nordestina', 'culinária paraense', 'culinária gaúcha', 'churrasco',
+    'pão', 'torta',
+]
+
+PRATOS = ['Bolo', 'Torta', 'Sopa', 'Risoto', 'Farofa', 'Moqueca', 'Escondidinho', 'Salada', 'Caldo',
+          'Pudim', 'Mousse', 'Pão', 'Quiche', 'Refogado', 'Ensopado', 'Assado', 'Creme', 'Suflê',
+          'Cuscuz', 'Bobó', 'Fricassê', 'Strogonoff', 'Panqueca', 'Omelete', 'Biscoito', 'Brigadeiro']
+
+COMPLEMENTOS = ['', '', '', ' da vovó', ' cremoso', ' fit', ' rápido', ' de liquidificador', ' caseiro',
+                ' simples', ' especial', ' de domingo', ' na panela de pressão', ' no forno']
+
+MODOS = ['Misture {a} com {b} até ficar homogêneo.', 'Refogue {a} no azeite e junte {b}.',
+         'Leve ao forno por 40 minutos.', 'Cozinhe {a} em fogo baixo por 20 minutos.',
+         'Acrescente {b} aos poucos, mexendo sempre.', 'Tempere com {a} a gosto.',
+         'Deixe descansar por 15 minutos antes de servir.', 'Bata {a} e {b} no liquidificador.',
+         'Sirva quente.', 'Decore com {b} e leve à geladeira.']
+
+QUANTIDADES = ['1 xícara', '2 xícaras', '1/2 xícara', '1 colher de sopa', '2 colheres de sopa',
+               '1 colher de chá', 'a gosto', '1 unidade', '2 unidades', '3 unidades', '100g', '200g',
+               '500g', '1kg', '1 pitada', '1 lata', '1 maço', '300ml']
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Heitor', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago', 'Vitória', 'Yuri']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Rodrigues',
+              'Almeida', 'Nascimento', 'Araújo', 'Carvalho', 'Gomes', 'Ribeiro', 'Martins']
+
+DIAS_DE_HISTORICO = 730
+DATA_FINAL = datetime(2025, 6, 30)
+
+
+def pesos_zipf(n, expoente=1.0):
+    """Pesos acumulados de Zipf para random.choices(cum_weights=...)."""
+    return list(accumulate(1 / (posicao ** expoente) for posicao in range(1, n + 1)))
+
+
+def _proximo_id(coluna):
+    return (db.session.scalar(select(func.max(coluna))) or 0) + 1
+
+
+def _gravar(tabela, linhas):
+    if linhas:
+        db.session.execute(tabela.insert(), linhas)
+
+
+def gerar(usuarios=1000, chefs=None, receitas=10000, semente=42, lote=10000, hash_senha=None, avisar=print,
+          ate=DATA_FINAL):
+    """Grava `usuarios` usuários (dos quais `chefs` são chefs) e `receitas` receitas criadas até `ate`."""
+    sorteio = random.Random(semente)
+    chefs = usuarios if chefs is None else min(chefs, usuarios)
+    inicio = time.perf_counter()
+
+    # Vocabulários: cria o que faltar e pega os ids na ordem de popularidade
+    ingredientes = resolver_nomes(Ingrediente, INGREDIENTES)
+    categorias = resolver_nomes(Categoria, CATEGORIAS)
+    ingrediente_ids = [ingredientes[nome].id for nome in INGREDIENTES]
+    nome_ingrediente = {ingredientes[nome].id: nome for nome in INGREDIENTES}
+    categoria_ids = [categorias[nome].id for nome in CATEGORIAS]
+    pesos_ingredientes = pesos_zipf(len(ingrediente_ids), 1.1)
+    pesos_categorias = pesos_zipf(len(categoria_ids), 1.0)
+
+    # Usuários e chefs
+    primeiro_usuario = _proximo_id(Usuario.id)
+    primeiro_chef = _proximo_id(Chef.id)
+    _gravar(Usuario.__table__, [
+        {'id': primeiro_usuario + n, 'email': f'usuario{primeiro_usuario + n}@exemplo.com',
+         'password_hash': hash_senha, 'has_2fa_enabled': False}
+        for n in range(usuarios)])
+    _gravar(Chef.__table__, [
+        {'id': primeiro_chef + n, 'usuario_id': primeiro_usuario + n,
+         'nome': f'{sorteio.choice(NOMES)} {sorteio.choice(SOBRENOMES)}',
+         'especialidade': sorteio.choice(CATEGORIAS).capitalize()}
+        for n in range(chefs)])
+    db.session.commit()
+    chef_ids = list(range(primeiro_chef, primeiro_chef + chefs))
+    pesos_chefs = pesos_zipf(chefs, 0.8) if chefs else None
+
+    # Receitas, em lotes de `lote` por transação
+    primeira_receita = _proximo_id(Receita.id)
+    passo = timedelta(days=DIAS_DE_HISTORICO) / max(receitas, 1)
+    gravadas = 0
+    while chefs and gravadas < receitas:
+        tamanho = min(lote, receitas - gravadas)
+        linhas_receitas, linhas_ingredientes, linhas_categorias = [], [], []
+        autores = sorteio.choices(chef_ids, cum_weights=pesos_chefs, k=tamanho)
+        for n in range(tamanho):
+            receita_id = primeira_receita + gravadas + n
+            # Ingredientes sem repetição: sorteia a mais e descarta os duplicados
+            quantidade = round(sorteio.triangular(2, 15, 6))
+            escolhidos = list(dict.fromkeys(
+                sorteio.choices(ingrediente_ids, cum_weights=pesos_ingredientes, k=quantidade * 2)))[:quantidade]
+            principal, secundario = nome_ingrediente[escolhidos[-1]], nome_ingrediente[escolhidos[0]]
+            linhas_receitas.append({
+                'id': receita_id,
+                'titulo': f'{sorteio.choice(PRATOS)} de {principal}{sorteio.choice(COMPLEMENTOS)}',
+                'instrucoes': '\n'.join(modo.format(a=principal, b=secundario)
+                                        for modo in sorteio.sample(MODOS, sorteio.randint(2, 6))),
+                'chef_id': autores[n],
+                'criado_em': ate - passo * (receitas - gravadas - n),
+                'versao': 1,
+            })
+            linhas_ingredientes.extend(
+                {'receita_id': receita_id, 'ingrediente_id': ingrediente_id,
+                 'quantidade': sorteio.choice(QUANTIDADES)}
+                for ingrediente_id in escolhidos)
+            linhas_categorias.extend(
+                {'receita_id': receita_id, 'categoria_id': categoria_id}
+                for categoria_id in set(sorteio.choices(categoria_ids, cum_weights=pesos_categorias,
+                                                        k=sorteio.randint(1, 3))))
+        _gravar(Receita.__table__, linhas_receitas)
+        _gravar(ReceitaIngrediente.__table__, linhas_ingredientes)
+        _gravar(receita_categorias, linhas_categorias)
+        db.session.commit()
+        gravadas += tamanho
+        decorrido = time.perf_counter() - inicio
+        avisar(f'{gravadas} receitas gravadas ({gravadas / decorrido:.0f} receitas/s).')
+
+    # Dados derivados, reconstruídos de uma vez
+    avisar('Reconstruindo o índice de busca e os contadores do dashboard...')
+    busca_fts.reindexar(db.session.connection())
+    estatisticas.reconstruir(db.session.connection())
+    anotar_recarga(db.session.connection()) # Os índices em memória dos workers são montados de novo
+    db.session.commit()
+    return {'usuarios': usuarios, 'chefs': chefs, 'receitas': gravadas,
+            'segundos': time.perf_counter() - inicio}
@@ -0,0 +1,389 @@
+import hashlib
+import importlib.util
+import random
+import re
+import struct
+import time
+import unicodedata
+import zlib
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from multiprocessing import get_context
+from sqlalchemy import and_, func, or_, select
+from database import db
+from models import Receita, Ingrediente, ReceitaIngrediente, AssinaturaReceita, BandaReceita, DuplicataSuspeita
+from eventos import receitas_gravadas
+
+# --- Receitas quase iguais (MinHash + LSH) ---
+# Cada receita vira um conjunto de "shingles": as sequências de 3 palavras das
+# instruções (sem acentos nem pontuação) mais o nome de cada ingrediente. A
+# semelhança de Jaccard entre dois conjuntos é estimada pela assinatura
+# MinHash: para cada uma de NUM_PERMUTACOES funções de hash, o menor hash do
+# conjunto. A fração de posições iguais entre duas assinaturas ≈ Jaccard.
+#
+# Para achar candidatas sem comparar com o catálogo inteiro (LSH), a
+# assinatura é cortada em BANDAS faixas e cada faixa vira uma chave na tabela
+# banda_receita. Receitas com pelo menos uma faixa idêntica são candidatas, e
+# só elas têm a assinatura comparada. Com 16 faixas de 8 valores, um par com
+# Jaccard 0,8 vira candidato em ~95% das vezes; com 0,5, em ~6%.
+#
+# - Criação de receita e importação: as receitas com semelhança >=
+#   DUPLICATAS_LIMIAR são bloqueadas ou gravadas e marcadas em
+#   duplicata_suspeita (DUPLICATAS_MODO = 'bloquear' ou 'sinalizar').
+# - As assinaturas são mantidas na mesma transação em que a receita é gravada.
+# - "flask deduplicar" recalcula todas as assinaturas (em vários processos) e
+#   refaz a lista de suspeitas do catálogo inteiro. Rode-o uma vez depois de
+#   atualizar o banco, para as receitas antigas entrarem no índice.
+#
+# NUM_PERMUTACOES, BANDAS e a semente fazem parte do formato gravado no banco:
+# se mudarem, rode "flask deduplicar" de novo.
+
+NUM_PERMUTACOES = 128
+BANDAS = 16
+PRIMO = (1 << 31) - 1
+TAMANHO_SHINGLE = 3
+MAIOR_BALDE = 200 # Numa faixa repetida em muitas receitas, cada uma só é comparada com as 200 mais novas antes dela
+
+_sorteio = random.Random(20250214)
+PERMUTACOES = [(_sorteio.randrange(1, PRIMO), _sorteio.randrange(0, PRIMO)) for _ in range(NUM_PERMUTACOES)]
+
+VETORIZADO = importlib.util.find_spec('numpy') is not None
+if VETORIZADO:
+    import numpy as np
+    _MULTIPLICADORES = np.array([a for a, _ in PERMUTACOES], dtype=np.uint64)[:, None]
+    _DESLOCAMENTOS = np.array([b for _, b in PERMUTACOES], dtype=np.uint64)[:, None]
+
+MODOS = ('sinalizar', 'bloquear')
+
+
+_ACENTOS = re.compile('[\u0300-\u036f]') # Marcas que o NFKD separa das letras
+
+
+def _palavras(texto):
+    return re.findall(r'\w+', _ACENTOS.sub('', unicodedata.normalize('NFKD', (texto or '').lower())))
+
+
+def shingles(instrucoes, ingredientes):
+    palavras = _palavras(instrucoes)
+    conjunto = {' '.join(palavras[i:i + TAMANHO_SHINGLE])
+                for i in range(max(len(palavras) - TAMANHO_SHINGLE + 1, 1))} if palavras else set()
+    conjunto |= {'ingrediente:' + ' '.join(_palavras(nome)) for nome in ingredientes}
+    return conjunto
+
+
+def assinatura(instrucoes, ingredientes):
+    """Assinatura MinHash (NUM_PERMUTACOES inteiros de 32 bits, em bytes) ou None."""
+    valores = [zlib.crc32(s.encode('utf-8')) % PRIMO for s in shingles(instrucoes, ingredientes)]
+    if not valores:
+        return None
+    if VETORIZADO:
+        hashes = np.array(valores, dtype=np.uint64)[None, :]
+        minimos = ((_MULTIPLICADORES * hashes + _DESLOCAMENTOS) % PRIMO).min(axis=1)
+        return minimos.astype('<u4').tobytes()
+    return struct.pack(f'<{NUM_PERMUTACOES}I',
+                       *[min((a * x + b) % PRIMO for x in valores) for a, b in PERMUTACOES])
+
+
+def bandas(assinatura_receita):
+    """[(banda, chave)] da assinatura, para o índice LSH."""
+    tamanho = len(assinatura_receita) // BANDAS
+    return [(banda, int.from_bytes(hashlib.blake2b(assinatura_receita[banda * tamanho:(banda + 1) * tamanho],
+                                                   digest_size=8).digest(), 'little', signed=True))
+            for banda in range(BANDAS)]
+
+
+def similaridade(a, b):
+    """Jaccard estimado: fração de posições iguais nas duas assinaturas."""
+    formato = f'<{NUM_PERMUTACOES}I'
+    return sum(x == y for x, y in zip(struct.unpack(formato, a), struct.unpack(formato, b))) / NUM_PERMUTACOES
+
+
+# --- Índice no banco ---
+def gravar(conexao, assinaturas):
+    """Grava {receita_id: assinatura} (assinatura None só remove a antiga)."""
+    if not assinaturas:
+        return
+    remover(conexao, list(assinaturas))
+    validas = {receita_id: a for receita_id, a in assinaturas.items() if a is not None}
+    if not validas:
+        return
+    conexao.execute(AssinaturaReceita.__table__.insert(),
+                    [{'receita_id': receita_id, 'assinatura': a} for receita_id, a in validas.items()])
+    conexao.execute(BandaReceita.__table__.insert(),
+                    [{'banda': banda, 'chave': chave, 'receita_id': receita_id}
+                     for receita_id, a in validas.items() for banda, chave in bandas(a)])
+
+
+def remover(conexao, ids):
+    ids = list(ids)
+    if ids:
+        conexao.execute(BandaReceita.__table__.delete().where(BandaReceita.receita_id.in_(ids)))
+        conexao.execute(AssinaturaReceita.__table__.delete().where(AssinaturaReceita.receita_id.in_(ids)))
+
+
+def _em_partes(itens, tamanho=500):
+    itens = list(itens)
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+def verificar(conexao, registros, limiar):
+    """Assinatura e receita mais parecida de cada registro ({'instrucoes', 'ingredientes'}).
+
+    Devolve [(assinatura, achado)], em que achado é None ou (similaridade,
+    receita_id, None) para uma receita do banco ou (similaridade, None, índice)
+    para um registro anterior da mesma lista.
+    """
+    assinaturas = [assinatura(r['instrucoes'], r['ingredientes']) for r in registros]
+    # Receitas do banco em cada faixa: uma consulta para cada parte do lote, com
+    # uma condição por banda (cada uma usa o índice da chave primária)
+    no_banco = defaultdict(set)
+    for parte in _em_partes([a for a in assinaturas if a is not None], 50):
+        chaves = defaultdict(set)
+        for banda, chave in (faixa for a in parte for faixa in bandas(a)):
+            chaves[banda].add(chave)
+        condicoes = [and_(BandaReceita.banda == banda, BandaReceita.chave.in_(valores))
+                     for banda, valores in chaves.items()]
+        for banda, chave, receita_id in conexao.execute(
+            select(BandaReceita.banda, BandaReceita.chave, BandaReceita.receita_id).where(or_(*condicoes))
+        ):
+            no_banco[(banda, chave)].add(receita_id)
+    # Faixa muito comum (ex.: spam em massa): só as receitas mais novas dela
+    for faixa, ids in no_banco.items():
+        if len(ids) > MAIOR_BALDE:
+            no_banco[faixa] = set(sorted(ids)[-MAIOR_BALDE:])
+    candidatas = set().union(*no_banco.values()) if no_banco else set()
+    guardadas = {}
+    for parte in _em_partes(candidatas):
+        guardadas.update(conexao.execute(
+            select(AssinaturaReceita.receita_id, AssinaturaReceita.assinatura)
+            .where(AssinaturaReceita.receita_id.in_(parte))).all())
+
+    resultado = []
+    no_lote = defaultdict(list) # (banda, chave) -> índices dos registros anteriores
+    for indice, a in enumerate(assinaturas):
+        achado = None
+        if a is not None:
+            faixas = bandas(a)
+            for receita_id in set().union(*(no_banco.get(f, ()) for f in faixas)):
+                valor = similaridade(a, guardadas[receita_id]) if receita_id in guardadas else 0.0
+                if valor >= limiar and (achado is None or valor > achado[0]):
+                    achado = (valor, receita_id, None)
+            for anterior in set().union(*(no_lote.get(f, ()) for f in faixas)):
+                valor = similaridade(a, assinaturas[anterior])
+                if valor >= limiar and (achado is None or valor > achado[0]):
+                    achado = (valor, None, anterior)
+            for faixa in faixas:
+                no_lote[faixa].append(indice)
+        resultado.append((a, achado))
+    return resultado
+
+
+def memorizar(session, registro, assinatura_registro):
+    """Guarda a assinatura já calculada para a gravação não refazer a conta."""
+    chave = (registro['instrucoes'], frozenset(registro['ingredientes']))
+    session.info.setdefault('assinaturas_calculadas', {})[chave] = assinatura_registro
+
+
+def registrar_suspeitas(conexao, suspeitas):
+    """Grava [(receita_id, original_id, similaridade)] em duplicata_suspeita."""
+    if suspeitas:
+        conexao.execute(DuplicataSuspeita.__table__.insert(),
+                        [{'receita_id': r, 'original_id': o, 'similaridade': s} for r, o, s in suspeitas])
+
+
+def _conteudo(conexao, ids):
+    ids = list(ids)
+    instrucoes = dict(conexao.execute(select(Receita.id, Receita.instrucoes).where(Receita.id.in_(ids))).all())
+    nomes = defaultdict(set)
+    for receita_id, nome in conexao.execute(
+        select(ReceitaIngrediente.receita_id, Ingrediente.nome)
+        .join(Ingrediente, ReceitaIngrediente.ingrediente_id == Ingrediente.id)
+        .where(ReceitaIngrediente.receita_id.in_(ids))
+    ):
+        nomes[receita_id].add(nome)
+    return {receita_id: (texto, nomes[receita_id]) for receita_id, texto in instrucoes.items()}
+
+
+def _sincronizar(session, alteradas, excluidas):
+    # Mesma transação da receita: a assinatura nunca fica diferente do conteúdo
+    conexao = session.connection()
+    calculadas = session.info.pop('assinaturas_calculadas', {})
+    assinaturas = {}
+    for receita_id, (instrucoes, nomes) in _conteudo(conexao, alteradas).items():
+        chave = (instrucoes, frozenset(nomes))
+        assinaturas[receita_id] = calculadas[chave] if chave in calculadas else assinatura(instrucoes, nomes)
+    gravar(conexao, assinaturas)
+
+
+# Receita excluída: as linhas dela saem na mesma transação, mesmo com a
+# detecção desligada (o "flask deduplicar" pode ter preenchido as tabelas). Não
+# dependemos do ON DELETE CASCADE, que o SQLite só aplica com foreign_keys=ON.
+@receitas_gravadas.connect
+def _remover_excluidas(session, alteradas, excluidas):
+    if not excluidas:
+        return
+    conexao = session.connection()
+    remover(conexao, excluidas)
+    ids = list(excluidas)
+    conexao.execute(DuplicataSuspeita.__table__.delete().where(
+        or_(DuplicataSuspeita.receita_id.in_(ids), DuplicataSuspeita.original_id.in_(ids))))
+
+
+def init_app(app):
+    modo = app.config.get('DUPLICATAS_MODO')
+    if modo is None:
+        return
+    if modo not in MODOS:
+        raise ValueError(f'DUPLICATAS_MODO desconhecido: {modo}')
+    receitas_gravadas.connect(_sincronizar, weak=False)
+
+
+# --- Catálogo inteiro (flask deduplicar) ---
+# Nada do catálogo fica inteiro na memória do processo principal:
+#   1. as receitas são lidas em faixas de `bloco` ids, as assinaturas de cada
+#      faixa são calculadas no pool e gravadas assim que chegam;
+#   2. a tabela banda_receita é percorrida em ordem (faixa, chave) e os baldes
+#      vão para o pool em tarefas de até TAREFA_COMPARACOES receitas, com as
+#      assinaturas só dessas receitas. Cada processo compara os pares do seu
+#      pedaço e devolve apenas os que passam do limiar.
+# No máximo 2 tarefas por processo ficam pendentes de cada vez. Um mesmo par
+# pode aparecer em várias faixas: o conjunto que remove as repetições guarda
+# só as suspeitas, não todos os candidatos.
+
+TAREFA_COMPARACOES = 20000 # Receitas (com repetição entre baldes) por tarefa de comparação
+
+
+def _em_paralelo(executor, funcao, tarefas, pendentes):
+    """Resultados de funcao(*tarefa), em ordem, com no máximo `pendentes` tarefas no pool."""
+    if executor is None:
+        for tarefa in tarefas:
+            yield funcao(*tarefa)
+        return
+    fila = deque()
+    for tarefa in tarefas:
+        fila.append(executor.submit(funcao, *tarefa))
+        if len(fila) >= pendentes:
+            yield fila.popleft().result()
+    while fila:
+        yield fila.popleft().result()
+
+
+def _faixas_de_receitas(engine, bloco):
+    """Conteúdo das receitas, em listas de até `bloco` receitas na ordem do id."""
+    ultimo = 0
+    while True:
+        with engine.connect() as conexao:
+            ids = conexao.scalars(select(Receita.id).where(Receita.id > ultimo)
+                                  .order_by(Receita.id).limit(bloco)).all()
+            if not ids:
+                return
+            conteudo = _conteudo(conexao, ids)
+        ultimo = ids[-1]
+        yield [(receita_id, *conteudo[receita_id]) for receita_id in ids if receita_id in conteudo]
+
+
+def _assinaturas_do_bloco(bloco):
+    return [(receita_id, assinatura(instrucoes, nomes)) for receita_id, instrucoes, nomes in bloco]
+
+
+def _pedacos_dos_baldes(conexao, tamanho):
+    """Pedaços (membros, primeiro) dos baldes com mais de uma receita, para comparar.
+
+    Em `membros`, cada receita a partir da posição `primeiro` é comparada com as
+    até MAIOR_BALDE anteriores a ela. Um balde grande é cortado em pedaços de
+    `tamanho` receitas, cada um levando junto as MAIOR_BALDE anteriores.
+    """
+    linhas = conexao.execute(select(BandaReceita.banda, BandaReceita.chave, BandaReceita.receita_id)
+                             .order_by(BandaReceita.banda, BandaReceita.chave, BandaReceita.receita_id))
+    for _, balde in groupby(linhas, key=lambda linha: (linha.banda, linha.chave)):
+        membros = [linha.receita_id for linha in balde]
+        for inicio in range(1, len(membros), tamanho):
+            anteriores = max(0, inicio - MAIOR_BALDE)
+            yield membros[anteriores:inicio + tamanho], inicio - anteriores
+
+
+def _tarefas_de_comparacao(engine, limiar):
+    """Tarefas (pedaços, assinaturas das receitas deles, limiar, janela) para _comparar."""
+    with engine.connect() as leitura, engine.connect() as conexao:
+        pedacos, ids = [], set()
+        for pedaco in _pedacos_dos_baldes(leitura, TAREFA_COMPARACOES):
+            pedacos.append(pedaco)
+            ids.update(pedaco[0])
+            if len(ids) >= TAREFA_COMPARACOES:
+                yield pedacos, _assinaturas(conexao, ids), limiar, MAIOR_BALDE
+                pedacos, ids = [], set()
+        if pedacos:
+            yield pedacos, _assinaturas(conexao, ids), limiar, MAIOR_BALDE
+
+
+def _assinaturas(conexao, ids):
+    assinaturas = {}
+    for parte in _em_partes(ids):
+        assinaturas.update(conexao.execute(select(AssinaturaReceita.receita_id, AssinaturaReceita.assinatura)
+                                           .where(AssinaturaReceita.receita_id.in_(parte))).all())
+    return assinaturas
+
+
+def _comparar(pedacos, assinaturas, limiar, janela):
+    """([(suspeita, original, similaridade)] com similaridade >= limiar, pares comparados)."""
+    suspeitas, comparados = [], 0
+    for membros, primeiro in pedacos:
+        for i in range(primeiro, len(membros)):
+            b = membros[i]
+            for a in membros[max(0, i - janela):i]:
+                comparados += 1
+                valor = similaridade(assinaturas[a], assinaturas[b])
+                if valor >= limiar:
+                    # A mais nova é a suspeita; a mais antiga, a original
+                    suspeitas.append((max(a, b), min(a, b), valor))
+    return suspeitas, comparados
+
+
+def deduplicar(engine, limiar=0.8, processos=0, bloco=1000, avisar=print):
+    """Recalcula as assinaturas de todas as receitas e refaz a tabela duplicata_suspeita."""
+    inicio = time.perf_counter()
+    executor = ProcessPoolExecutor(processos, mp_context=get_context('spawn')) if processos > 0 else None
+    pendentes = 2 * max(processos, 1)
+    try:
+        # 1. Assinaturas (a parte cara) em paralelo; o banco só é escrito aqui
+        with engine.begin() as conexao:
+            conexao.execute(BandaReceita.__table__.delete())
+            conexao.execute(AssinaturaReceita.__table__.delete())
+        receitas = gravadas = 0
+        blocos = ((faixa,) for faixa in _faixas_de_receitas(engine, bloco))
+        for calculadas in _em_paralelo(executor, _assinaturas_do_bloco, blocos, pendentes):
+            receitas += len(calculadas)
+            calculadas = dict(calculadas)
+            with engine.begin() as conexao:
+                gravar(conexao, calculadas)
+            gravadas += sum(a is not None for a in calculadas.values())
+            avisar(f'{gravadas} assinaturas gravadas ({receitas / (time.perf_counter() - inicio):.0f} receitas/s).')
+
+        # 2. Pares candidatos: receitas com a mesma chave em alguma faixa. Num
+        # balde grande (é onde cai o spam em massa) cada receita é comparada só
+        # com as MAIOR_BALDE anteriores mais novas, e não com todas: o custo fica linear
+        suspeitas, comparados = {}, 0
+        for encontradas, quantidade in _em_paralelo(executor, _comparar,
+                                                    _tarefas_de_comparacao(engine, limiar), pendentes):
+            comparados += quantidade
+            for suspeita, original, valor in encontradas:
+                suspeitas[suspeita, original] = valor
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    with engine.begin() as conexao:
+        conexao.execute(DuplicataSuspeita.__table__.delete())
+        for parte in _em_partes(suspeitas.items(), 10000):
+            registrar_suspeitas(conexao, [(r, o, valor) for (r, o), valor in parte])
+    with engine.connect() as conexao:
+        grandes = conexao.scalar(select(func.count()).select_from(
+            select(BandaReceita.banda).group_by(BandaReceita.banda, BandaReceita.chave)
+            .having(func.count() > MAIOR_BALDE).subquery()))
+    if grandes:
+        avisar(f'{grandes} faixas com mais de {MAIOR_BALDE} receitas: cada receita foi comparada '
+               f'com as {MAIOR_BALDE} anteriores mais novas.')
+    return {'receitas': receitas, 'candidatos': comparados, 'suspeitas': len(suspeitas),
+            'segundos': time.perf_counter() - inicio}
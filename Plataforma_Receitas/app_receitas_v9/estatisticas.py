@@ -0,0 +1,91 @@
+from collections import Counter
+from sqlalchemy import event, func, select, delete
+from database import db
+from models import Chef, Receita, Estatistica, EstatisticaChef
+from catalogo import insert_do_dialeto
+
+# --- Estatísticas do dashboard mantidas de forma incremental ---
+# Em vez de COUNT(*) e GROUP BY a cada visita ao dashboard, guardamos os totais
+# em tabelas pequenas (estatistica e estatistica_chef) e os ajustamos a cada
+# INSERT/DELETE de Receita e Chef, na mesma transação da alteração.
+# O comando "flask rebuild-stats" recalcula tudo a partir das tabelas
+# originais, caso os contadores fiquem diferentes (ex.: SQL manual no banco).
+
+
+def ajustar(conexao, receitas=0, chefs=0, por_chef=None):
+    """Soma os deltas informados aos contadores (valores negativos subtraem)."""
+    globais = [{'chave': chave, 'valor': delta}
+               for chave, delta in (('receitas', receitas), ('chefs', chefs)) if delta]
+    if globais:
+        stmt = insert_do_dialeto(Estatistica, conexao)
+        conexao.execute(
+            stmt.on_conflict_do_update(index_elements=['chave'],
+                                       set_={'valor': Estatistica.valor + stmt.excluded.valor}),
+            globais,
+        )
+    por_chef = [{'chef_id': chef_id, 'total_receitas': delta}
+                for chef_id, delta in (por_chef or {}).items() if delta]
+    if por_chef:
+        stmt = insert_do_dialeto(EstatisticaChef, conexao)
+        conexao.execute(
+            stmt.on_conflict_do_update(
+                index_elements=['chef_id'],
+                set_={'total_receitas': EstatisticaChef.total_receitas + stmt.excluded.total_receitas}),
+            por_chef,
+        )
+
+
+def totais():
+    valores = dict(db.session.execute(select(Estatistica.chave, Estatistica.valor)).all())
+    return valores.get('receitas', 0), valores.get('chefs', 0)
+
+
+def chefs_com_mais_receitas(limite):
+    return db.session.execute(
+        select(Chef.nome, EstatisticaChef.total_receitas)
+        .join(Chef, EstatisticaChef.chef_id == Chef.id)
+        .where(EstatisticaChef.total_receitas > 0)
+        .order_by(EstatisticaChef.total_receitas.desc())
+        .limit(limite)
+    ).all()
+
+
+def reconstruir(conexao=None):
+    """Recalcula todos os contadores a partir de receita e chef."""
+    if conexao is None:
+        resultado = reconstruir(db.session.connection())
+        db.session.commit()
+        return resultado
+    conexao.execute(delete(Estatistica))
+    conexao.execute(delete(EstatisticaChef))
+    total_receitas = conexao.scalar(select(func.count(Receita.id)))
+    total_chefs = conexao.scalar(select(func.count(Chef.id)))
+    por_chef = Counter(dict(conexao.execute(
+        select(Receita.chef_id, func.count(Receita.id)).group_by(Receita.chef_id)).all()))
+    ajustar(conexao, receitas=total_receitas, chefs=total_chefs, por_chef=por_chef)
+    return total_receitas, total_chefs
+
+
+# --- Eventos do ORM ---
+# Os eventos de mapper recebem a conexão da transação em andamento: o contador
+# é gravado (ou desfeito) junto com a receita.
+
+@event.listens_for(Receita, 'after_insert')
+def _receita_inserida(mapper, conexao, receita):
+    ajustar(conexao, receitas=1, por_chef={receita.chef_id: 1})
+
+
+@event.listens_for(Receita, 'after_delete')
+def _receita_excluida(mapper, conexao, receita):
+    ajustar(conexao, receitas=-1, por_chef={receita.chef_id: -1})
+
+
+@event.listens_for(Chef, 'after_insert')
+def _chef_inserido(mapper, conexao, chef):
+    ajustar(conexao, chefs=1)
+
+
+@event.listens_for(Chef, 'after_delete')
+def _chef_excluido(mapper, conexao, chef):
+    ajustar(conexao, chefs=-1)
+    conexao.execute(delete(EstatisticaChef).where(EstatisticaChef.chef_id == chef.id))
@@ -0,0 +1,209 @@
+import threading
+import time
+import weakref
+from blinker import Namespace
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+from models import Receita, ReceitaIngrediente, Alteracao
+
+# --- Eventos de alteração de receitas ---
+# Vários recursos (índice de busca, caches, índices em memória) precisam saber
+# quando uma receita foi criada, editada ou excluída. Este módulo observa o
+# flush da sessão do SQLAlchemy e avisa os interessados por sinais do blinker
+# (a mesma biblioteca de sinais usada pelo Flask):
+#
+#   - receitas_gravadas: emitido DENTRO da transação, logo após o flush. Quem
+#     recebe pode usar session.connection() para gravar dados derivados que
+#     devem ser confirmados ou desfeitos junto com a receita.
+#   - receitas_confirmadas: emitido DEPOIS do commit, com todas as receitas
+#     alteradas na transação. Não é possível consultar o banco nesse momento.
+#
+# Os sinais só chegam ao processo que gravou. O que precisa valer para todos
+# os workers (os índices em memória) lê o diário de alterações, mais abaixo.
+
+sinais = Namespace()
+receitas_gravadas = sinais.signal('receitas-gravadas')
+receitas_confirmadas = sinais.signal('receitas-confirmadas')
+
+
+def registrar_alteracoes(session, alteradas=(), excluidas=()):
+    """Avisa que receitas foram gravadas nesta transação.
+
+    Chamado automaticamente no flush do ORM; as rotinas de gravação em lote
+    (que usam INSERT direto, sem passar pelo ORM) devem chamá-lo por conta própria.
+    """
+    excluidas = set(excluidas)
+    alteradas = set(alteradas) - excluidas
+    if not alteradas and not excluidas:
+        return
+    anotar(session.connection(), 'receita', alteradas, excluidas)
+    receitas_gravadas.send(session, alteradas=alteradas, excluidas=excluidas)
+    pendentes = session.info.setdefault('receitas_pendentes', {'alteradas': set(), 'excluidas': set()})
+    pendentes['alteradas'] |= alteradas
+    pendentes['excluidas'] |= excluidas
+    pendentes['alteradas'] -= pendentes['excluidas']
+
+
+def ao_confirmar(session, funcao):
+    """Agenda `funcao()` para rodar depois do commit (é descartada em caso de rollback)."""
+    session.info.setdefault('ao_confirmar', []).append(funcao)
+
+
+# Cada alteração em uma receita (inclusive só nas categorias ou nos
+# ingredientes) incrementa Receita.versao. Caches que guardam algo derivado da
+# receita usam (id, versao) como chave e assim nunca servem conteúdo antigo.
+@event.listens_for(Session, 'before_flush')
+def _incrementar_versoes(session, flush_context, instances):
+    receitas = set()
+    for obj in session.dirty:
+        if isinstance(obj, Receita) and session.is_modified(obj):
+            receitas.add(obj)
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, ReceitaIngrediente) and obj.receita is not None \
+                and obj.receita not in session.new and obj.receita not in session.deleted:
+            receitas.add(obj.receita)
+    for receita in receitas:
+        receita.versao = (receita.versao or 1) + 1
+
+
+@event.listens_for(Session, 'after_flush')
+def _apos_flush(session, flush_context):
+    alteradas, excluidas = set(), set()
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Receita):
+            alteradas.add(obj.id)
+        elif isinstance(obj, ReceitaIngrediente):
+            alteradas.add(obj.receita_id)
+    for obj in session.deleted:
+        if isinstance(obj, Receita):
+            excluidas.add(obj.id)
+        elif isinstance(obj, ReceitaIngrediente):
+            alteradas.add(obj.receita_id)
+    alteradas.discard(None)
+    registrar_alteracoes(session, alteradas, excluidas)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apos_commit(session):
+    pendentes = session.info.pop('receitas_pendentes', None)
+    funcoes = session.info.pop('ao_confirmar', [])
+    for funcao in funcoes:
+        funcao()
+    if pendentes:
+        # As gravações deste processo aparecem nos índices já no próximo uso
+        for acompanhamento in list(_acompanhamentos):
+            acompanhamento._lido_em = 0.0
+        receitas_confirmadas.send(session, **pendentes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _apos_rollback(session):
+    session.info.pop('receitas_pendentes', None)
+    session.info.pop('ao_confirmar', None)
+
+
+# --- Diário de alterações ---
+# Os índices em memória (ingredientes, autocompletar, "você quis dizer",
+# identidades) existem um por processo. Para que a gravação feita por um
+# worker chegue aos outros, cada receita ou conta gravada deixa uma linha na
+# tabela "alteracao", na mesma transação (um rollback desfaz a linha junto).
+# Cada índice guarda até que linha (seq) já leu e, ao ser usado, aplica as
+# linhas mais novas com sincronizar().
+#
+# A leitura do diário é uma consulta pela chave primária, feita no máximo uma
+# vez a cada DIARIO_INTERVALO segundos por índice; depois de um commit deste
+# processo ela acontece já no uso seguinte. O diário guarda as DIARIO_LINHAS
+# alterações mais recentes: um índice que ficou mais para trás do que isso é
+# montado de novo a partir do banco, assim como depois de uma carga em lote
+# (anotar_recarga).
+#
+# No SQLite há uma única transação de escrita por vez, então a ordem de seq é
+# a ordem dos commits. Num banco com escritas concorrentes (PostgreSQL) um
+# seq menor pode ser confirmado depois de um maior e ficar para trás.
+
+_acompanhamentos = weakref.WeakSet()
+_intervalo = 1
+_linhas_diario = 100000
+
+
+def init_app(app):
+    global _intervalo, _linhas_diario
+    _intervalo = app.config.get('DIARIO_INTERVALO', 1)
+    _linhas_diario = app.config.get('DIARIO_LINHAS', 100000)
+
+
+def anotar(conexao, tipo, alterados=(), excluidos=()):
+    """Grava no diário os objetos alterados e excluídos (na transação da `conexao`)."""
+    linhas = [{'tipo': tipo, 'objeto_id': i, 'excluido': False} for i in alterados] + \
+             [{'tipo': tipo, 'objeto_id': i, 'excluido': True} for i in excluidos]
+    if not linhas:
+        return
+    conexao.execute(insert(Alteracao), linhas)
+    ultima = select(func.max(Alteracao.seq)).scalar_subquery()
+    conexao.execute(delete(Alteracao).where(Alteracao.seq <= ultima - _linhas_diario))
+
+
+def anotar_recarga(conexao):
+    """Avisa que muita coisa mudou de uma vez (carga em lote): todo índice é montado de novo."""
+    conexao.execute(insert(Alteracao).values(tipo='*', objeto_id=0, excluido=False))
+
+
+class Acompanhamento:
+    """Até onde um índice em memória já leu o diário."""
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.trava = threading.Lock()
+        self.seq = None # Última linha aplicada; None = o índice ainda não foi montado
+        self._lido_em = 0.0
+        _acompanhamentos.add(self)
+
+    def marcar(self, conexao):
+        """Guarda a posição atual do diário. Chamar ANTES de montar o índice do banco."""
+        self.seq = conexao.scalar(select(func.max(Alteracao.seq))) or 0
+        self._lido_em = time.monotonic()
+
+    def novidades(self, conexao):
+        """(alterados, excluidos) desde a última leitura, ou None se o índice
+        precisa ser montado de novo (diário já podado além dele ou recriado)."""
+        if self.seq is None:
+            return None
+        agora = time.monotonic()
+        if agora - self._lido_em < _intervalo:
+            return set(), set()
+        self._lido_em = agora
+        primeira, ultima = conexao.execute(select(func.min(Alteracao.seq), func.max(Alteracao.seq))).one()
+        if ultima is None: # Diário vazio
+            return (set(), set()) if self.seq == 0 else None
+        if ultima < self.seq or primeira > self.seq + 1:
+            return None
+        alterados, excluidos = set(), set()
+        if ultima > self.seq:
+            for tipo, objeto_id, excluido in conexao.execute(
+                    select(Alteracao.tipo, Alteracao.objeto_id, Alteracao.excluido)
+                    .where(Alteracao.seq > self.seq, Alteracao.seq <= ultima, Alteracao.tipo.in_((self.tipo, '*')))
+                    .order_by(Alteracao.seq)):
+                if tipo == '*':
+                    return None
+                # Vale a última linha de cada objeto
+                (excluidos if excluido else alterados).add(objeto_id)
+                (alterados if excluido else excluidos).discard(objeto_id)
+            self.seq = ultima
+        return alterados, excluidos
+
+
+def sincronizar(indice, conexao):
+    """Monta o índice no primeiro uso e depois aplica as alterações do diário.
+
+    O índice precisa ter `pronto`, `acompanhamento`, `carregar(conexao)` e
+    `aplicar(conexao, alterados, excluidos)`.
+    """
+    acompanhamento = indice.acompanhamento
+    with acompanhamento.trava:
+        novidades = acompanhamento.novidades(conexao) if indice.pronto else None
+        if novidades is None:
+            acompanhamento.marcar(conexao)
+            indice.carregar(conexao)
+        elif novidades[0] or novidades[1]:
+            indice.aplicar(conexao, *novidades)
+    return indice
@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from sqlalchemy import select
+from database import db
+from models import Usuario, Chef, Receita, Ingrediente, Categoria, ReceitaIngrediente, receita_categorias
+from importacao import SEPARADOR_CSV
+
+# --- Exportação do catálogo em fluxo (NDJSON e CSV) ---
+# As receitas são lidas em blocos com yield_per: o banco entrega um bloco por
+# vez e nunca montamos a lista completa em memória. Para cada bloco buscamos
+# ingredientes e categorias com uma consulta "IN (...)" cada, e o bloco vira
+# texto que é enviado imediatamente (geradores do Python).
+# O formato é o mesmo aceito pelo "flask import-receitas".
+
+FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+COLUNAS_CSV = ['id', 'titulo', 'instrucoes', 'criado_em', 'chef_nome', 'chef_email', 'categorias', 'ingredientes']
+
+
+def _blocos(tamanho_bloco):
+    consulta = (
+        select(Receita.id, Receita.titulo, Receita.instrucoes, Receita.criado_em,
+               Chef.nome.label('chef_nome'), Usuario.email.label('chef_email'))
+        .join(Chef, Receita.chef_id == Chef.id)
+        .join(Usuario, Chef.usuario_id == Usuario.id)
+        .order_by(Receita.id)
+        .execution_options(yield_per=tamanho_bloco)
+    )
+    yield from db.session.execute(consulta).partitions()
+
+
+def _relacionados(ids):
+    ingredientes = defaultdict(list)
+    for receita_id, nome, quantidade in db.session.execute(
+        select(ReceitaIngrediente.receita_id, Ingrediente.nome, ReceitaIngrediente.quantidade)
+        .join(Ingrediente, ReceitaIngrediente.ingrediente_id == Ingrediente.id)
+        .where(ReceitaIngrediente.receita_id.in_(ids))
+    ):
+        ingredientes[receita_id].append({'nome': nome, 'quantidade': quantidade})
+    categorias = defaultdict(list)
+    for receita_id, nome in db.session.execute(
+        select(receita_categorias.c.receita_id, Categoria.nome)
+        .join(Categoria, receita_categorias.c.categoria_id == Categoria.id)
+        .where(receita_categorias.c.receita_id.in_(ids))
+    ):
+        categorias[receita_id].append(nome)
+    return ingredientes, categorias
+
+
+def registros(tamanho_bloco=1000, incluir_email=False):
+    """Gera listas de dicionários (uma por bloco), com chef, categorias e ingredientes."""
+    for bloco in _blocos(tamanho_bloco):
+        ingredientes, categorias = _relacionados([linha.id for linha in bloco])
+        registros_bloco = []
+        for linha in bloco:
+            registro = {
+                'id': linha.id,
+                'titulo': linha.titulo,
+                'instrucoes': linha.instrucoes,
+                'criado_em': linha.criado_em.isoformat() if linha.criado_em else None,
+                'chef_nome': linha.chef_nome,
+                'categorias': categorias.get(linha.id, []),
+                'ingredientes': ingredientes.get(linha.id, []),
+            }
+            # O e-mail do chef só sai na exportação feita pelo terminal (CLI)
+            if incluir_email:
+                registro['chef_email'] = linha.chef_email
+            registros_bloco.append(registro)
+        yield registros_bloco
+
+
+def gerar_ndjson(blocos):
+    for bloco in blocos:
+        yield ''.join(json.dumps(registro, ensure_ascii=False) + '\n' for registro in bloco)
+
+
+def gerar_csv(blocos):
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=COLUNAS_CSV, extrasaction='ignore', lineterminator='\n')
+
+    def descarregar():
+        texto = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return texto
+
+    # O cabeçalho sai antes da primeira consulta: o cliente recebe o primeiro byte na hora
+    escritor.writeheader()
+    yield descarregar()
+    for bloco in blocos:
+        escritor.writerows(dict(
+            registro,
+            categorias=f'{SEPARADOR_CSV} '.join(registro['categorias']),
+            ingredientes=f'{SEPARADOR_CSV} '.join(f"{i['nome']}: {i['quantidade']}" for i in registro['ingredientes']),
+        ) for registro in bloco)
+        yield descarregar()
+
+
+def gerar(formato, tamanho_bloco=1000, incluir_email=False):
+    blocos = registros(tamanho_bloco, incluir_email)
+    return gerar_csv(blocos) if formato == 'csv' else gerar_ndjson(blocos)
@@ -0,0 +1,61 @@
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from cache_respostas import CacheMemoria
+from eventos import receitas_confirmadas
+
+# --- Cache de fragmentos de template ({% cache %}) ---
+# O cartão de uma receita aparece em index.html, busca.html e
+# receitas_por_categoria.html. Com esta extensão do Jinja, o HTML do cartão é
+# renderizado uma vez e depois reaproveitado da memória:
+#
+#     {% cache 'cartao', receita.id, receita.versao, receita.criado_em %} ... {% endcache %}
+#
+# Os dois primeiros argumentos identificam o fragmento (nome e id da receita);
+# os demais formam o "carimbo de versão". Se a versão guardada for diferente
+# da atual, o fragmento é renderizado de novo. Como Receita.versao muda a cada
+# alteração (ver eventos.py), um cartão editado em outro processo também é
+# percebido. O criado_em entra no carimbo porque o SQLite pode reaproveitar o
+# id de uma receita excluída, e a receita nova recomeça em versao=1: sem ele,
+# ela herdaria o cartão da antiga. Quando a receita é editada ou excluída
+# neste processo, os fragmentos dela são removidos da memória na hora.
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(cache_fragmentos=CacheMemoria(5000), nomes_fragmentos=set())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        argumentos = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            argumentos.append(parser.parse_expression())
+        corpo = parser.parse_statements(('name:endcache',), drop_needle=True)
+        chamada = self.call_method('_renderizar', [nodes.List(argumentos)])
+        return nodes.CallBlock(chamada, [], [], corpo).set_lineno(lineno)
+
+    def _renderizar(self, argumentos, caller):
+        nome, identificador, *versao = argumentos
+        chave = f'{nome}:{identificador}'
+        armazenado = self.environment.cache_fragmentos.get(chave)
+        if armazenado is not None and armazenado[0] == versao:
+            return armazenado[1]
+        html = Markup(caller())
+        self.environment.cache_fragmentos.set(chave, (versao, html))
+        self.environment.nomes_fragmentos.add(nome)
+        return html
+
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.cache_fragmentos.tamanho = app.config.get('FRAGMENTOS_TAMANHO', 5000)
+
+    def _remover(session, alteradas, excluidas):
+        for receita_id in alteradas | excluidas:
+            for nome in list(app.jinja_env.nomes_fragmentos):
+                app.jinja_env.cache_fragmentos.delete(f'{nome}:{receita_id}')
+
+    receitas_confirmadas.connect(_remover, weak=False)
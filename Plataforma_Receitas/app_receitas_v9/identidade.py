@@ -0,0 +1,116 @@
+import threading
+from functools import partial
+from flask_login import UserMixin, current_user
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
+from database import db
+from models import Usuario, Chef
+from cache_respostas import CacheMemoria
+from eventos import Acompanhamento, anotar, ao_confirmar
+
+# --- Cache de identidade do usuário logado ---
+# O Flask-Login chama o user_loader em toda requisição autenticada, e o
+# Usuario.query.get() original custava um SELECT (mais outro para
+# current_user.chef). Aqui o current_user passa a ser uma Identidade: só o que
+# as rotas e os templates precisam (id, e-mail, chef e 2FA), guardada em
+# memória por IDENTIDADE_TTL segundos.
+#
+# Cada usuário tem um número de versão, incrementado depois do commit de
+# qualquer alteração na conta (Usuario ou Chef). Uma identidade guardada com
+# uma versão antiga é descartada na próxima leitura. A versão é por processo;
+# para os outros workers, a alteração também vai para o diário de alterações
+# (ver eventos.py), lido no máximo a cada DIARIO_INTERVALO segundos. Assim um
+# 2FA ativado em um worker vale em todos quase de imediato, e não só quando o
+# TTL vencer.
+#
+# Rotas que precisam do resto da conta (ex.: o segredo do 2FA) ou que a
+# alteram carregam o Usuario com usuario_atual().
+
+
+class Identidade(UserMixin):
+    def __init__(self, id, email, has_2fa_enabled, chef_id, chef_nome):
+        self.id = id
+        self.email = email
+        self.has_2fa_enabled = bool(has_2fa_enabled)
+        self.chef_id = chef_id
+        self.chef_nome = chef_nome
+
+
+_identidades = CacheMemoria(10000)
+_versoes = {}
+_trava = threading.Lock()
+_ttl = 300
+_acompanhamento = Acompanhamento('usuario')
+
+
+def init_app(app):
+    global _ttl
+    _identidades.tamanho = app.config.get('IDENTIDADE_TAMANHO', 10000)
+    _ttl = app.config.get('IDENTIDADE_TTL', 300)
+
+
+def _acompanhar_diario():
+    """Descarta as identidades das contas alteradas por outros workers."""
+    with _acompanhamento.trava:
+        conexao = db.session.connection()
+        novidades = _acompanhamento.novidades(conexao)
+        if novidades is None: # Primeiro uso ou diário podado: nada do que está guardado é confiável
+            _acompanhamento.marcar(conexao)
+            _identidades.limpar()
+            return
+    for usuario_id in novidades[0] | novidades[1]:
+        invalidar(usuario_id)
+
+
+def carregar(usuario_id):
+    """Identidade do usuário (para o user_loader), da memória ou com um único SELECT."""
+    _acompanhar_diario()
+    versao = _versoes.get(usuario_id, 0)
+    guardada = _identidades.get(usuario_id)
+    if guardada is not None and guardada[0] == versao:
+        return guardada[1]
+    # A versão foi lida antes do SELECT: se a conta mudar no meio, a identidade
+    # já nasce desatualizada e será descartada
+    linha = db.session.execute(
+        select(Usuario.id, Usuario.email, Usuario.has_2fa_enabled, Chef.id, Chef.nome)
+        .outerjoin(Chef, Chef.usuario_id == Usuario.id)
+        .where(Usuario.id == usuario_id)
+    ).first()
+    if linha is None:
+        return None
+    identidade = Identidade(*linha)
+    _identidades.set(usuario_id, (versao, identidade), _ttl)
+    return identidade
+
+
+def invalidar(usuario_id):
+    with _trava:
+        _versoes[usuario_id] = _versoes.get(usuario_id, 0) + 1
+    _identidades.delete(usuario_id)
+
+
+def usuario_atual():
+    """O Usuario completo do ORM, para as rotas que leem ou alteram a conta."""
+    return db.session.get(Usuario, int(current_user.get_id()))
+
+
+# Qualquer alteração na conta incrementa a versão, depois do commit, e fica
+# anotada no diário (na mesma transação) para os outros processos
+def _ao_alterar(conexao, usuario_id, target):
+    session = object_session(target)
+    if session is not None and usuario_id is not None:
+        anotar(conexao, 'usuario', [usuario_id])
+        ao_confirmar(session, partial(invalidar, usuario_id))
+
+
+@event.listens_for(Usuario, 'after_update')
+@event.listens_for(Usuario, 'after_delete')
+def _usuario_alterado(mapper, conexao, usuario):
+    _ao_alterar(conexao, usuario.id, usuario)
+
+
+@event.listens_for(Chef, 'after_insert')
+@event.listens_for(Chef, 'after_update')
+@event.listens_for(Chef, 'after_delete')
+def _chef_alterado(mapper, conexao, chef):
+    _ao_alterar(conexao, chef.usuario_id, chef)
@@ -0,0 +1,281 @@
+import csv
+import json
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import select
+from database import db
+from models import Usuario, Chef, Receita, Ingrediente, Categoria, ReceitaIngrediente, \
+    ImportacaoCheckpoint, receita_categorias
+from catalogo import ler_categorias, ler_ingredientes, insert_do_dialeto
+from eventos import registrar_alteracoes, ao_confirmar
+from cache_respostas import cache
+import estatisticas
+import duplicatas
+
+# --- Importação em lote de receitas (flask import-receitas) ---
+# O arquivo é lido como um fluxo (um registro por vez, com geradores), então a
+# memória usada não depende do tamanho do catálogo. Os registros são gravados
+# em lotes: cada lote é uma transação com poucos comandos "executemany", e o
+# checkpoint (quantos registros já foram gravados) é salvo na mesma transação.
+#
+# Formato JSONL (um objeto por linha):
+#   {"titulo": "...", "instrucoes": "...", "chef_email": "...", "chef_nome": "...",
+#    "categorias": ["Sobremesa", "Rápido"],
+#    "ingredientes": [{"nome": "farinha", "quantidade": "2 xícaras"}]}
+# "categorias" e "ingredientes" também aceitam o texto do formulário, separado por vírgulas.
+#
+# Formato CSV (com cabeçalho): titulo, instrucoes, chef_email, chef_nome,
+# categorias, ingredientes. Nas duas últimas colunas os itens são separados por
+# ";" (a vírgula aparece em quantidades como "1,5 kg"):
+#   "Sobremesa; Rápido", "farinha: 2 xícaras; leite: 1,5 xícara"
+
+SEPARADOR_CSV = ';'
+
+
+def ler_registros(caminho, formato):
+    """Gera os registros do arquivo, um por vez (None para linhas ilegíveis)."""
+    with open(caminho, encoding='utf-8', newline='') as arquivo:
+        if formato == 'csv':
+            yield from csv.DictReader(arquivo)
+            return
+        for linha in arquivo:
+            if not linha.strip():
+                continue
+            try:
+                yield json.loads(linha)
+            except ValueError:
+                yield None
+
+
+class _Invalido(Exception):
+    """Campo com o tipo errado (ex.: título numérico, categoria que não é texto)."""
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if not isinstance(valor, str):
+        raise _Invalido
+    return valor.strip()
+
+
+def _categorias(valor, separador):
+    if isinstance(valor, list):
+        return list(dict.fromkeys(nome.capitalize() for nome in map(_texto, valor) if nome))
+    return ler_categorias(_texto(valor), separador)
+
+
+def _ingredientes(valor, separador):
+    if isinstance(valor, dict):
+        valor = [{'nome': nome, 'quantidade': qtd} for nome, qtd in valor.items()]
+    if isinstance(valor, list):
+        ingredientes = {}
+        for item in valor:
+            if not isinstance(item, dict):
+                raise _Invalido
+            nome = _texto(item.get('nome')).lower()
+            quantidade = item.get('quantidade')
+            if isinstance(quantidade, (int, float)) and not isinstance(quantidade, bool):
+                quantidade = str(quantidade) # {"quantidade": 2}
+            if nome:
+                ingredientes.setdefault(nome, _texto(quantidade))
+        return ingredientes
+    return ler_ingredientes(_texto(valor), separador)
+
+
+def normalizar(registro, separador=','):
+    """Valida e padroniza um registro; devolve None se ele não puder ser importado."""
+    if not isinstance(registro, dict):
+        return None
+    try:
+        titulo = _texto(registro.get('titulo'))
+        instrucoes = _texto(registro.get('instrucoes'))
+        email = _texto(registro.get('chef_email')).lower()
+        if not titulo or not instrucoes or not email:
+            return None
+        normalizado = {
+            'titulo': titulo,
+            'instrucoes': instrucoes,
+            'chef_email': email,
+            'chef_nome': _texto(registro.get('chef_nome')) or email.split('@')[0],
+            'categorias': _categorias(registro.get('categorias'), separador),
+            'ingredientes': _ingredientes(registro.get('ingredientes'), separador),
+        }
+    except _Invalido: # JSON válido, mas com o formato errado: conta como ignorado
+        return None
+    if registro.get('criado_em'):
+        try:
+            normalizado['criado_em'] = datetime.fromisoformat(registro['criado_em'])
+        except (TypeError, ValueError):
+            pass
+    return normalizado
+
+
+class Mapas:
+    """Nomes -> ids de ingredientes, categorias e chefs, mantidos em memória.
+
+    Os nomes que ainda não existem são criados em lote (INSERT ... ON CONFLICT
+    DO NOTHING seguido de um único SELECT ... IN).
+    """
+
+    def __init__(self):
+        self.chefs_criados = 0
+        self.ingredientes = dict(db.session.execute(select(Ingrediente.nome, Ingrediente.id)).all())
+        self.categorias = dict(db.session.execute(select(Categoria.nome, Categoria.id)).all())
+        self.chefs = dict(db.session.execute(select(Usuario.email, Chef.id).join(Chef.usuario)).all())
+
+    @staticmethod
+    def _garantir_nomes(modelo, mapa, nomes):
+        faltando = list(set(nomes) - mapa.keys())
+        if not faltando:
+            return
+        db.session.execute(
+            insert_do_dialeto(modelo.__table__).on_conflict_do_nothing(index_elements=['nome']),
+            [{'nome': nome} for nome in faltando],
+        )
+        mapa.update(db.session.execute(
+            select(modelo.nome, modelo.id).where(modelo.nome.in_(faltando))).all())
+
+    def garantir(self, registros):
+        self._garantir_nomes(Ingrediente, self.ingredientes,
+                             {n for r in registros for n in r['ingredientes']})
+        self._garantir_nomes(Categoria, self.categorias,
+                             {n for r in registros for n in r['categorias']})
+
+        # Chefs desconhecidos ganham um usuário sem senha (não conseguem entrar
+        # até redefinirem a senha) e um perfil de chef.
+        novos = {}
+        for r in registros:
+            if r['chef_email'] not in self.chefs:
+                novos.setdefault(r['chef_email'], r['chef_nome'])
+        if not novos:
+            return
+        db.session.execute(
+            insert_do_dialeto(Usuario.__table__).on_conflict_do_nothing(index_elements=['email']),
+            [{'email': email, 'has_2fa_enabled': False} for email in novos],
+        )
+        usuarios = dict(db.session.execute(
+            select(Usuario.email, Usuario.id).where(Usuario.email.in_(list(novos)))).all())
+        db.session.execute(
+            insert_do_dialeto(Chef.__table__).on_conflict_do_nothing(index_elements=['usuario_id']),
+            [{'nome': nome, 'usuario_id': usuarios[email]} for email, nome in novos.items()],
+        )
+        self.chefs.update(db.session.execute(
+            select(Usuario.email, Chef.id).join(Chef.usuario).where(Usuario.email.in_(list(novos)))).all())
+        self.chefs_criados += len(novos)
+
+
+def _gravar_lote(registros, mapas):
+    chefs_antes = mapas.chefs_criados
+    mapas.garantir(registros)
+
+    linhas = []
+    for r in registros:
+        linha = {'titulo': r['titulo'], 'instrucoes': r['instrucoes'], 'chef_id': mapas.chefs[r['chef_email']]}
+        # Todas as linhas de um executemany precisam ter as mesmas colunas
+        linha['criado_em'] = r.get('criado_em') or datetime.utcnow()
+        linhas.append(linha)
+    tabela = Receita.__table__
+    ids = db.session.execute(
+        tabela.insert().returning(tabela.c.id, sort_by_parameter_order=True), linhas
+    ).scalars().all()
+
+    associacoes = [
+        {'receita_id': receita_id, 'ingrediente_id': mapas.ingredientes[nome], 'quantidade': qtd}
+        for receita_id, r in zip(ids, registros) for nome, qtd in r['ingredientes'].items()
+    ]
+    if associacoes:
+        db.session.execute(ReceitaIngrediente.__table__.insert(), associacoes)
+    categorias = [
+        {'receita_id': receita_id, 'categoria_id': mapas.categorias[nome]}
+        for receita_id, r in zip(ids, registros) for nome in r['categorias']
+    ]
+    if categorias:
+        db.session.execute(receita_categorias.insert(), categorias)
+
+    # INSERTs diretos não passam pelo flush do ORM: avisamos os índices e
+    # atualizamos os contadores do dashboard manualmente
+    registrar_alteracoes(db.session, alteradas=ids)
+    estatisticas.ajustar(
+        db.session.connection(),
+        receitas=len(ids),
+        chefs=mapas.chefs_criados - chefs_antes,
+        por_chef=Counter(linha['chef_id'] for linha in linhas),
+    )
+    tags = {'receitas'} | {f"chef:{linha['chef_id']}" for linha in linhas} | \
+        {f"categoria:{linha['categoria_id']}" for linha in categorias}
+    if mapas.chefs_criados > chefs_antes:
+        tags.add('chefs')
+    ao_confirmar(db.session, lambda: cache.invalidar(*tags))
+    return ids
+
+
+def _salvar_checkpoint(chave, registros):
+    db.session.execute(
+        insert_do_dialeto(ImportacaoCheckpoint.__table__)
+        .values(chave=chave, registros=registros, atualizado_em=datetime.utcnow())
+        .on_conflict_do_update(index_elements=['chave'],
+                               set_={'registros': registros, 'atualizado_em': datetime.utcnow()})
+    )
+
+
+def _separar_duplicatas(registros, modo, limiar):
+    """(registros a gravar, achados) conforme o modo de duplicatas (ver duplicatas.py)."""
+    verificados = duplicatas.verificar(db.session.connection(), registros, limiar)
+    for r, (assinatura, _) in zip(registros, verificados):
+        duplicatas.memorizar(db.session, r, assinatura)
+    if modo == 'bloquear':
+        # Um registro igual a outro recusado do mesmo lote também é recusado
+        return [r for r, (_, achado) in zip(registros, verificados) if achado is None], []
+    return registros, [achado for _, achado in verificados]
+
+
+def importar(caminho, formato, chave, lote=1000, recomecar=False, avisar=print,
+             modo_duplicatas=None, limiar_duplicatas=0.8):
+    """Importa o arquivo em lotes de `lote` registros, retomando do checkpoint `chave`.
+
+    Com `modo_duplicatas` ('sinalizar' ou 'bloquear'), receitas quase iguais a
+    outras do banco ou do próprio arquivo são marcadas ou deixadas de fora.
+    """
+    checkpoint = db.session.get(ImportacaoCheckpoint, chave)
+    ja_gravados = 0 if recomecar or checkpoint is None else checkpoint.registros
+    if ja_gravados:
+        avisar(f'Retomando a importação após {ja_gravados} registros.')
+
+    separador = SEPARADOR_CSV if formato == 'csv' else ','
+    mapas = Mapas()
+    registros = islice(ler_registros(caminho, formato), ja_gravados, None)
+    processados, importados, ignorados, repetidas = ja_gravados, 0, 0, 0
+    inicio = time.perf_counter()
+    while True:
+        bloco = list(islice(registros, lote))
+        if not bloco:
+            break
+        validos = [r for r in (normalizar(b, separador) for b in bloco) if r is not None]
+        ignorados += len(bloco) - len(validos)
+        achados = []
+        if validos and modo_duplicatas:
+            quantidade = len(validos)
+            validos, achados = _separar_duplicatas(validos, modo_duplicatas, limiar_duplicatas)
+            repetidas += quantidade - len(validos)
+        if validos:
+            ids = _gravar_lote(validos, mapas)
+            # A original pode ser uma receita do banco ou outro registro deste lote
+            suspeitas = [(receita_id, original if original is not None else ids[indice], valor)
+                         for receita_id, achado in zip(ids, achados) if achado is not None
+                         for valor, original, indice in [achado]]
+            duplicatas.registrar_suspeitas(db.session.connection(), suspeitas)
+            repetidas += len(suspeitas)
+        processados += len(bloco)
+        importados += len(validos)
+        _salvar_checkpoint(chave, processados)
+        db.session.commit()
+
+        decorrido = time.perf_counter() - inicio
+        avisar(f'{processados} registros processados, {importados} receitas importadas '
+               f'({importados / decorrido:.0f} receitas/s).')
+
+    return {'importados': importados, 'ignorados': ignorados, 'processados': processados,
+            'duplicatas': repetidas}
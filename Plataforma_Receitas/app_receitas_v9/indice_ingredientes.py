@@ -0,0 +1,203 @@
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+from sqlalchemy import bindparam, text
+from eventos import Acompanhamento, sincronizar
+
+# --- "O que posso cozinhar?": índice invertido de ingredientes em memória ---
+# Para cada ingrediente guardamos um bitset (um int do Python) em que o bit N
+# está ligado se a receita de id N usa aquele ingrediente. Também agrupamos as
+# receitas pela quantidade de ingredientes que elas têm.
+#
+# Um bitset ocupa maior_id/8 bytes, por mais raro que seja o ingrediente: com
+# um milhão de receitas são 125 KB para um tempero usado em três. Por isso um
+# ingrediente pouco usado guarda só a lista ordenada dos ids (array de 4 bytes
+# por receita), convertida em bitset na hora da consulta. Ele passa a bitset
+# quando a lista ficaria maior do que o bitset.
+#
+# Na consulta somamos os bitsets dos ingredientes que o usuário tem usando
+# "contadores fatiados em bits": planos[i] guarda o bit i da contagem de
+# acertos de cada receita. Assim, com poucas operações sobre inteiros grandes
+# (feitas em C pelo Python), sabemos quais receitas têm exatamente k acertos.
+# Uma receita com T ingredientes e T acertos pode ser feita; com T-1 acertos,
+# falta um ingrediente, e assim por diante. Nenhuma consulta SQL é feita.
+#
+# Cada processo mantém o seu índice: ele é montado do banco no primeiro uso e
+# depois acompanha o diário de alterações (ver eventos.py), que traz as
+# receitas gravadas por qualquer worker.
+
+SQL_INGREDIENTES = """
+SELECT ri.receita_id, i.nome
+FROM receita_ingredientes ri JOIN ingrediente i ON i.id = ri.ingrediente_id
+"""
+
+
+def normalizar(nome):
+    return nome.strip().lower()
+
+
+def _bitset(ids):
+    """Monta um bitset a partir de uma lista de ids de uma só vez (bem mais
+    rápido do que ligar bit a bit com "|= 1 << id")."""
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _denso(quantidade, maior_id):
+    """O bitset ocupa menos memória que a lista de ids (4 bytes cada)?"""
+    return quantidade * 32 >= maior_id
+
+
+def _como_bitset(receitas):
+    return receitas if isinstance(receitas, int) else _bitset(receitas)
+
+
+def _ids(bitset, limite):
+    """Devolve até `limite` ids ligados no bitset, do maior (mais recente) para o menor."""
+    ids = []
+    while bitset and len(ids) < limite:
+        i = bitset.bit_length() - 1
+        ids.append(i)
+        bitset ^= 1 << i
+    return ids
+
+
+class IndiceIngredientes:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.pronto = False
+        self.por_ingrediente = {}           # nome -> bitset ou array ordenado de receitas
+        self.por_tamanho = {}               # nº de ingredientes -> bitset de receitas
+        self.ingredientes_da_receita = {}   # receita_id -> frozenset de nomes
+        self.maior_id = 0
+        self.acompanhamento = Acompanhamento('receita')
+
+    def carregar(self, conexao):
+        ingredientes = defaultdict(set)
+        for receita_id, nome in conexao.execute(text(SQL_INGREDIENTES)):
+            ingredientes[receita_id].add(normalizar(nome))
+        ids_por_ingrediente = defaultdict(list)
+        ids_por_tamanho = defaultdict(list)
+        for receita_id, nomes in ingredientes.items():
+            ids_por_tamanho[len(nomes)].append(receita_id)
+            for nome in nomes:
+                ids_por_ingrediente[nome].append(receita_id)
+        maior_id = max(ingredientes, default=0)
+        with self._trava:
+            self.ingredientes_da_receita = {r: frozenset(n) for r, n in ingredientes.items()}
+            self.por_ingrediente = {n: _bitset(ids) if _denso(len(ids), maior_id) else array('I', sorted(ids))
+                                    for n, ids in ids_por_ingrediente.items()}
+            self.maior_id = maior_id
+            self.por_tamanho = {t: _bitset(ids) for t, ids in ids_por_tamanho.items()}
+            self.pronto = True
+
+    def _desligar(self, receita_id):
+        antigos = self.ingredientes_da_receita.pop(receita_id, None)
+        if not antigos:
+            return
+        mascara = ~(1 << receita_id)
+        for nome in antigos:
+            receitas = self.por_ingrediente[nome]
+            if isinstance(receitas, int):
+                self.por_ingrediente[nome] = receitas & mascara
+            else:
+                posicao = bisect_left(receitas, receita_id)
+                if posicao < len(receitas) and receitas[posicao] == receita_id:
+                    del receitas[posicao]
+        self.por_tamanho[len(antigos)] &= mascara
+
+    def atualizar(self, alteradas, excluidas=()):
+        """Aplica as alterações: `alteradas` é um dict {receita_id: nomes}."""
+        with self._trava:
+            for receita_id in excluidas:
+                self._desligar(receita_id)
+            for receita_id, nomes in alteradas.items():
+                self._desligar(receita_id)
+                nomes = frozenset(normalizar(n) for n in nomes)
+                if not nomes:
+                    continue
+                bit = 1 << receita_id
+                self.maior_id = max(self.maior_id, receita_id)
+                for nome in nomes:
+                    receitas = self.por_ingrediente.get(nome)
+                    if isinstance(receitas, int):
+                        self.por_ingrediente[nome] = receitas | bit
+                        continue
+                    if receitas is None:
+                        receitas = self.por_ingrediente[nome] = array('I')
+                    insort(receitas, receita_id)
+                    if _denso(len(receitas), self.maior_id):
+                        self.por_ingrediente[nome] = _bitset(receitas)
+                self.por_tamanho[len(nomes)] = self.por_tamanho.get(len(nomes), 0) | bit
+                self.ingredientes_da_receita[receita_id] = nomes
+
+    def aplicar(self, conexao, alteradas, excluidas):
+        """Relê do banco os ingredientes das receitas alteradas e atualiza o índice."""
+        ingredientes = {receita_id: [] for receita_id in alteradas}
+        if alteradas:
+            consulta = text(SQL_INGREDIENTES + " WHERE ri.receita_id IN :ids").bindparams(
+                bindparam('ids', expanding=True))
+            for receita_id, nome in conexao.execute(consulta, {'ids': list(alteradas)}):
+                ingredientes[receita_id].append(nome)
+        self.atualizar(ingredientes, excluidas)
+
+    def consultar(self, nomes, max_faltantes=2, limite=50):
+        """Receitas que dá para fazer com `nomes`, seguidas das que quase dá.
+
+        Devolve uma lista de (receita_id, ingredientes_faltantes), ordenada
+        pela quantidade de ingredientes que faltam.
+        """
+        tenho = {normalizar(n) for n in nomes if n.strip()}
+        with self._trava:
+            bitsets = [_como_bitset(self.por_ingrediente[n]) for n in tenho if self.por_ingrediente.get(n)]
+            por_tamanho = dict(self.por_tamanho)
+            ingredientes_da_receita = self.ingredientes_da_receita
+        if not bitsets:
+            return []
+
+        # Soma os bitsets em contadores fatiados em bits
+        candidatas = 0
+        planos = []
+        for bitset in bitsets:
+            candidatas |= bitset
+            vai_um = bitset
+            for i, plano in enumerate(planos):
+                if not vai_um:
+                    break
+                planos[i], vai_um = plano ^ vai_um, plano & vai_um
+            if vai_um:
+                planos.append(vai_um)
+
+        def com_acertos(k):
+            if k >> len(planos):
+                return 0
+            mascara = candidatas
+            for i, plano in enumerate(planos):
+                mascara &= plano if (k >> i) & 1 else ~plano
+            return mascara
+
+        resultado = []
+        for faltantes in range(max_faltantes + 1):
+            encontradas = 0
+            for tamanho, receitas in por_tamanho.items():
+                if tamanho - faltantes >= 1:
+                    encontradas |= receitas & com_acertos(tamanho - faltantes)
+            for receita_id in _ids(encontradas, limite - len(resultado)):
+                faltam = sorted(ingredientes_da_receita.get(receita_id, frozenset()) - tenho)
+                resultado.append((receita_id, faltam))
+            if len(resultado) >= limite:
+                break
+        return resultado
+
+
+indice = IndiceIngredientes()
+
+
+def obter_indice(conexao):
+    """Devolve o índice do processo, em dia com as receitas gravadas por todos os workers."""
+    return sincronizar(indice, conexao)
@@ -0,0 +1,120 @@
+import re
+import time
+from collections import Counter, deque
+from datetime import datetime
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from database import db
+
+# --- Instrumentação de SQL por requisição ---
+# Os eventos before/after_cursor_execute do SQLAlchemy medem cada comando
+# enviado ao banco. Para cada requisição anotamos:
+#   - quantos comandos rodaram e o tempo total no banco;
+#   - o comando mais lento;
+#   - comandos com a mesma "forma" repetidos muitas vezes: o sinal clássico do
+#     problema N+1 (um SELECT por item da lista, em vez de um para todos).
+#     Nesse caso um aviso com o nome da rota vai para o log.
+# Os números saem no cabeçalho Server-Timing (aparece na aba Rede/Timing das
+# ferramentas do navegador) e as últimas requisições ficam em /_debug/requests.
+#
+# A query string não é guardada: só os nomes dos parâmetros (buscas, cursores
+# e tokens não ficam em memória nem aparecem na página).
+#
+# A "forma" de um comando é o SQL com as listas de parâmetros "IN (?, ?, ?)"
+# reduzidas a "IN (?)" e números literais trocados por "?".
+
+_LISTA_PARAMETROS = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+)\s*\)')
+_NUMERO = re.compile(r'\b\d+\b')
+_ESPACOS = re.compile(r'\s+')
+
+
+def caminho_sem_valores(requisicao):
+    """'/busca?q=bolo&pagina=2' -> '/busca?q=…&pagina=…'."""
+    if not requisicao.args:
+        return requisicao.path
+    return requisicao.path + '?' + '&'.join(f'{nome}=…' for nome in requisicao.args.keys())
+
+
+def forma_do_comando(sql):
+    sql = _LISTA_PARAMETROS.sub('(?)', sql)
+    sql = _NUMERO.sub('?', sql)
+    return _ESPACOS.sub(' ', sql).strip()
+
+
+class InstrumentacaoSQL:
+    def __init__(self, app=None):
+        self.historico = deque(maxlen=100)
+        self.limite_repeticoes = 5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('SQL_INSTRUMENTACAO', True):
+            return
+        self.historico = deque(maxlen=app.config.get('SQL_HISTORICO', 100))
+        self.limite_repeticoes = app.config.get('SQL_N_MAIS_1_LIMITE', 5)
+        self.logger = app.logger
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._antes)
+            event.listen(db.engine, 'after_cursor_execute', self._depois)
+        app.before_request(self._iniciar)
+        app.after_request(self._finalizar)
+        app.extensions['instrumentacao_sql'] = self
+
+    # --- Eventos do SQLAlchemy ---
+    def _antes(self, conexao, cursor, sql, parametros, contexto, executemany):
+        conexao.info['inicio_comando'] = time.perf_counter()
+
+    def _depois(self, conexao, cursor, sql, parametros, contexto, executemany):
+        # Comandos fora de uma requisição (CLI, threads de e-mail) não são medidos
+        if not has_request_context() or 'sql' not in g:
+            return
+        duracao = time.perf_counter() - conexao.info['inicio_comando']
+        medidas = g.sql
+        medidas['comandos'] += 1
+        medidas['tempo'] += duracao
+        if duracao > medidas['mais_lento'][0]:
+            medidas['mais_lento'] = (duracao, sql)
+        medidas['formas'][forma_do_comando(sql)] += 1
+
+    # --- Ciclo da requisição ---
+    def _iniciar(self):
+        g.sql = {'inicio': time.perf_counter(), 'comandos': 0, 'tempo': 0.0,
+                 'mais_lento': (0.0, None), 'formas': Counter()}
+
+    def _finalizar(self, resposta):
+        # g.sql continua disponível para as métricas (metricas.py)
+        medidas = g.get('sql')
+        if medidas is None:
+            return resposta
+        total = time.perf_counter() - medidas['inicio']
+        repetidos = [(forma, vezes) for forma, vezes in medidas['formas'].most_common()
+                     if vezes >= self.limite_repeticoes]
+        for forma, vezes in repetidos:
+            self.logger.warning('Possível N+1 na rota %s: o mesmo comando rodou %d vezes: %s',
+                                request.endpoint, vezes, forma[:200])
+
+        resposta.headers.add('Server-Timing', f'db;dur={medidas["tempo"] * 1000:.1f};'
+                                              f'desc="{medidas["comandos"]} comandos SQL"')
+        resposta.headers.add('Server-Timing', f'total;dur={total * 1000:.1f}')
+        if request.endpoint != 'static':
+            self.historico.append({
+                'quando': datetime.now(),
+                'metodo': request.method,
+                'caminho': caminho_sem_valores(request),
+                'rota': request.endpoint,
+                'status': resposta.status_code,
+                'total_ms': total * 1000,
+                'comandos': medidas['comandos'],
+                'tempo_db_ms': medidas['tempo'] * 1000,
+                'mais_lento_ms': medidas['mais_lento'][0] * 1000,
+                'mais_lento': medidas['mais_lento'][1],
+                'repetidos': repetidos,
+            })
+        return resposta
+
+    def ultimas(self):
+        return list(reversed(self.historico))
+
+
+instrumentacao = InstrumentacaoSQL()
@@ -0,0 +1,344 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from cache_respostas import cache
+from senhas import hasher
+import caixa_saida
+
+# --- Métricas no formato do Prometheus (/metrics) ---
+# Para cada rota: requisições por método e status, histograma do tempo de
+# resposta (p50/p95/p99 saem de histogram_quantile no Prometheus), histograma
+# do tamanho da resposta, tempo no banco (medido pela instrumentacao.py) e
+# tempo renderizando templates. Também: requisições em andamento, acertos e
+# falhas do cache de respostas, o tamanho da fila de e-mails e o hash de
+# senhas (operações, CPU nos processos do bcrypt, espera das requisições e
+# senhas em andamento; a vazão é o rate() de receitas_senhas_operacoes_total).
+#
+# Custo por requisição: cada thread soma nos seus próprios dicionários (um
+# _Coletor por thread), então o caminho da requisição não usa trava nenhuma.
+# Quem lê (/metrics ou o gravador) copia os dicionários de todas as threads.
+# Servidores que criam uma thread por requisição deixariam um coletor para
+# cada thread já encerrada: os números delas são somados num coletor único
+# (_encerradas) e o coletor da thread é descartado, na leitura ou quando uma
+# thread nova se registra.
+#
+# Vários processos (gunicorn -w N): com METRICAS_DIRETORIO definido, cada
+# processo grava a cada METRICAS_INTERVALO segundos um arquivo <pid>.json com
+# os seus totais, e /metrics soma os arquivos de todos. Contadores de
+# processos que já terminaram continuam na soma (um contador nunca diminui);
+# "em andamento" só conta processos vivos. Apague o diretório ao reiniciar o
+# serviço. Sem METRICAS_DIRETORIO, cada processo mostra só os próprios números.
+#
+# O tempo de resposta vai até o fim da view: o envio de respostas em
+# streaming (exportação) não entra.
+
+LIMITES_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Segundos
+LIMITES_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+REQUISICOES = 'receitas_http_requisicoes_total'
+DURACAO = 'receitas_http_duracao_segundos'
+TAMANHO = 'receitas_http_resposta_bytes'
+EM_ANDAMENTO = 'receitas_http_em_andamento'
+DB_TEMPO = 'receitas_db_duracao_segundos_total'
+DB_COMANDOS = 'receitas_db_comandos_total'
+TEMPLATES = 'receitas_template_duracao_segundos_total'
+CACHE_ACERTOS = 'receitas_cache_acertos_total'
+CACHE_FALHAS = 'receitas_cache_falhas_total'
+CACHE_TAXA = 'receitas_cache_taxa_acerto'
+FILA_EMAIL = 'receitas_email_fila'
+SENHAS_OPERACOES = 'receitas_senhas_operacoes_total'
+SENHAS_CPU = 'receitas_senhas_cpu_segundos_total'
+SENHAS_ESPERA = 'receitas_senhas_espera_segundos_total'
+SENHAS_REHASHES = 'receitas_senhas_rehashes_total'
+SENHAS_EM_ANDAMENTO = 'receitas_senhas_em_andamento'
+
+# nome: (tipo, descrição, limites do histograma)
+METRICAS = {
+    REQUISICOES: ('counter', 'Requisições atendidas, por rota, método e status.', None),
+    DURACAO: ('histogram', 'Tempo de resposta por rota.', LIMITES_DURACAO),
+    TAMANHO: ('histogram', 'Tamanho do corpo da resposta por rota.', LIMITES_BYTES),
+    EM_ANDAMENTO: ('gauge', 'Requisições sendo atendidas agora.', None),
+    DB_TEMPO: ('counter', 'Tempo gasto no banco de dados, por rota.', None),
+    DB_COMANDOS: ('counter', 'Comandos SQL executados, por rota.', None),
+    TEMPLATES: ('counter', 'Tempo renderizando templates, por rota.', None),
+    CACHE_ACERTOS: ('counter', 'Respostas servidas pelo cache.', None),
+    CACHE_FALHAS: ('counter', 'Consultas ao cache sem resposta válida.', None),
+    CACHE_TAXA: ('gauge', 'Acertos / (acertos + falhas) do cache de respostas.', None),
+    FILA_EMAIL: ('gauge', 'E-mails pendentes ou sendo enviados na caixa de saída.', None),
+    SENHAS_OPERACOES: ('counter', 'Hashes e verificações de senha concluídos, por tipo.', None),
+    SENHAS_CPU: ('counter', 'Tempo de CPU do bcrypt nos processos de hash, por tipo.', None),
+    SENHAS_ESPERA: ('counter', 'Tempo que as requisições esperaram pelo hash (fila + cálculo).', None),
+    SENHAS_REHASHES: ('counter', 'Hashes refeitos com o custo atual no login.', None),
+    SENHAS_EM_ANDAMENTO: ('gauge', 'Senhas na fila ou sendo calculadas agora.', None),
+}
+
+
+class _Coletor:
+    """Números de uma única thread: só ela escreve, por isso não há trava."""
+
+    def __init__(self):
+        self.contadores = {} # (nome, rótulos): valor
+        self.histogramas = {} # (nome, rótulos): [contagem por faixa..., +Inf, soma]
+
+
+def _somar(contadores, chave, valor):
+    contadores[chave] = contadores.get(chave, 0) + valor
+
+
+def _juntar(destino, origem):
+    """Soma os números do coletor `origem` nos do `destino`."""
+    # dict() e list() copiam de uma vez só, sem a thread dona mexer no meio
+    for chave, valor in dict(origem.contadores).items():
+        _somar(destino.contadores, chave, valor)
+    for chave, faixas in dict(origem.histogramas).items():
+        total = destino.histogramas.setdefault(chave, [0] * len(faixas))
+        for posicao, valor in enumerate(list(faixas)):
+            total[posicao] += valor
+
+
+def _observar(histogramas, chave, limites, valor):
+    faixas = histogramas.get(chave)
+    if faixas is None:
+        faixas = histogramas[chave] = [0] * (len(limites) + 1) + [0.0]
+    faixas[bisect_left(limites, valor)] += 1
+    faixas[-1] += valor
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Metricas:
+    def __init__(self, app=None):
+        self.diretorio = None
+        self.intervalo = 5
+        self._coletores = {} # thread -> _Coletor
+        self._encerradas = _Coletor() # Soma das threads que já terminaram
+        self._local = threading.local()
+        self._trava = threading.Lock() # Só para registrar a thread nova e para ler
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.diretorio = app.config.get('METRICAS_DIRETORIO')
+        self.intervalo = app.config.get('METRICAS_INTERVALO', 5)
+        self.logger = app.logger
+        if self.diretorio:
+            os.makedirs(self.diretorio, exist_ok=True)
+        app.before_request(self._iniciar)
+        app.after_request(self._registrar)
+        app.teardown_request(self._encerrar)
+        before_render_template.connect(self._antes_do_template, app)
+        template_rendered.connect(self._depois_do_template, app)
+        app.extensions['metricas'] = self
+
+    def _coletor(self):
+        try:
+            return self._local.coletor
+        except AttributeError:
+            coletor = self._local.coletor = _Coletor()
+            with self._trava:
+                self._recolher()
+                self._coletores[threading.current_thread()] = coletor
+            return coletor
+
+    def _recolher(self):
+        """Passa os números das threads encerradas para _encerradas (com a trava)."""
+        for thread, coletor in list(self._coletores.items()):
+            if not thread.is_alive():
+                _juntar(self._encerradas, coletor)
+                del self._coletores[thread]
+
+    def _novo_processo(self):
+        # Primeiro uso neste processo (ou logo depois de um fork do gunicorn):
+        # os números herdados do processo pai não são deste processo
+        with self._trava:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._coletores = {}
+            self._encerradas = _Coletor()
+            self._local = threading.local()
+        if self.diretorio:
+            threading.Thread(target=self._gravar_periodicamente, daemon=True, name='metricas').start()
+
+    # --- Ciclo da requisição ---
+    # g e request são proxies (cada acesso custa ~1 µs): os objetos reais são
+    # resolvidos uma vez por gancho
+    def _iniciar(self):
+        if self._pid != os.getpid():
+            self._novo_processo()
+        contexto = g._get_current_object()
+        contexto.metricas_inicio = time.perf_counter()
+        contexto.metricas_templates = 0.0
+        _somar(self._coletor().contadores, (EM_ANDAMENTO, ()), 1)
+
+    def _registrar(self, resposta):
+        contexto = g._get_current_object()
+        inicio = getattr(contexto, 'metricas_inicio', None)
+        if inicio is None:
+            return resposta
+        duracao = time.perf_counter() - inicio
+        requisicao = request._get_current_object()
+        rota = (('rota', requisicao.endpoint or 'nao_encontrada'),)
+        coletor = self._coletor()
+        _somar(coletor.contadores, (REQUISICOES, rota + (('metodo', requisicao.method),
+                                                         ('status', str(resposta.status_code)))), 1)
+        _observar(coletor.histogramas, (DURACAO, rota), LIMITES_DURACAO, duracao)
+        tamanho = resposta.calculate_content_length()
+        if tamanho is not None:
+            _observar(coletor.histogramas, (TAMANHO, rota), LIMITES_BYTES, tamanho)
+        sql = getattr(contexto, 'sql', None)
+        if sql is not None:
+            _somar(coletor.contadores, (DB_TEMPO, rota), sql['tempo'])
+            _somar(coletor.contadores, (DB_COMANDOS, rota), sql['comandos'])
+        if contexto.metricas_templates:
+            _somar(coletor.contadores, (TEMPLATES, rota), contexto.metricas_templates)
+        return resposta
+
+    def _encerrar(self, erro):
+        contexto = g._get_current_object()
+        if getattr(contexto, 'metricas_inicio', None) is not None:
+            contexto.metricas_inicio = None
+            _somar(self._coletor().contadores, (EM_ANDAMENTO, ()), -1)
+
+    # --- Templates ---
+    # Um template renderizado dentro de outro (fragmentos) não é contado duas vezes
+    def _antes_do_template(self, remetente, template, context, **extra):
+        if not has_request_context():
+            return
+        contexto = g._get_current_object()
+        if getattr(contexto, 'metricas_inicio', None) is not None:
+            contexto.setdefault('metricas_pilha', []).append(time.perf_counter())
+
+    def _depois_do_template(self, remetente, template, context, **extra):
+        if not has_request_context():
+            return
+        contexto = g._get_current_object()
+        pilha = getattr(contexto, 'metricas_pilha', None)
+        if pilha:
+            inicio = pilha.pop()
+            if not pilha:
+                contexto.metricas_templates += time.perf_counter() - inicio
+
+    # --- Leitura ---
+    def instantaneo(self):
+        """Totais deste processo, somando as threads, em formato JSON."""
+        soma = _Coletor()
+        with self._trava:
+            self._recolher()
+            _juntar(soma, self._encerradas)
+            for coletor in self._coletores.values():
+                _juntar(soma, coletor)
+        contadores, histogramas = soma.contadores, soma.histogramas
+        contadores[(CACHE_ACERTOS, ())] = cache.acertos
+        contadores[(CACHE_FALHAS, ())] = cache.falhas
+        senhas = hasher.totais()
+        for tipo, quantidade in senhas['operacoes'].items():
+            contadores[(SENHAS_OPERACOES, (('tipo', tipo),))] = quantidade
+            contadores[(SENHAS_CPU, (('tipo', tipo),))] = senhas['segundos'][tipo]
+        contadores[(SENHAS_ESPERA, ())] = senhas['espera']
+        contadores[(SENHAS_REHASHES, ())] = senhas['rehashes']
+        contadores[(SENHAS_EM_ANDAMENTO, ())] = senhas['em_andamento']
+        return {
+            'pid': os.getpid(),
+            'contadores': [[nome, rotulos, valor] for (nome, rotulos), valor in contadores.items()],
+            'histogramas': [[nome, rotulos, faixas] for (nome, rotulos), faixas in histogramas.items()],
+        }
+
+    def gravar(self, dados=None):
+        caminho = os.path.join(self.diretorio, f'{os.getpid()}.json')
+        with open(caminho + '.tmp', 'w') as arquivo:
+            json.dump(dados or self.instantaneo(), arquivo)
+        os.replace(caminho + '.tmp', caminho)
+
+    def _gravar_periodicamente(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.gravar()
+            except OSError as erro:
+                self.logger.warning('Não foi possível gravar as métricas: %s', erro)
+
+    def agregar(self):
+        """Soma os totais de todos os processos: (contadores, histogramas)."""
+        proprio = self.instantaneo()
+        todos = [proprio]
+        if self.diretorio:
+            self.gravar(proprio)
+            for caminho in glob.glob(os.path.join(self.diretorio, '*.json')):
+                try:
+                    with open(caminho) as arquivo:
+                        dados = json.load(arquivo)
+                except (OSError, ValueError):
+                    continue
+                if dados['pid'] != proprio['pid']:
+                    todos.append(dados)
+
+        contadores, histogramas = {}, {}
+        for dados in todos:
+            vivo = dados['pid'] == proprio['pid'] or _processo_vivo(dados['pid'])
+            for nome, rotulos, valor in dados['contadores']:
+                if vivo or METRICAS[nome][0] != 'gauge':
+                    _somar(contadores, (nome, tuple(map(tuple, rotulos))), valor)
+            for nome, rotulos, faixas in dados['histogramas']:
+                total = histogramas.setdefault((nome, tuple(map(tuple, rotulos))), [0] * len(faixas))
+                for posicao, valor in enumerate(faixas):
+                    total[posicao] += valor
+        return contadores, histogramas
+
+    def exposicao(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        contadores, histogramas = self.agregar()
+        acertos = contadores.get((CACHE_ACERTOS, ()), 0)
+        falhas = contadores.get((CACHE_FALHAS, ()), 0)
+        contadores[(CACHE_TAXA, ())] = acertos / (acertos + falhas) if acertos + falhas else 0.0
+        contadores[(FILA_EMAIL, ())] = caixa_saida.profundidade_fila()
+
+        linhas = []
+        for nome, (tipo, descricao, limites) in METRICAS.items():
+            linhas.append(f'# HELP {nome} {descricao}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+            if tipo != 'histogram':
+                for (nome_serie, rotulos), valor in sorted(contadores.items()):
+                    if nome_serie == nome:
+                        linhas.append(f'{nome}{_rotulos(rotulos)} {_numero(valor)}')
+                continue
+            for (nome_serie, rotulos), faixas in sorted(histogramas.items()):
+                if nome_serie != nome:
+                    continue
+                acumulado = 0
+                for limite, quantidade in zip(limites + ('+Inf',), faixas):
+                    acumulado += quantidade
+                    linhas.append(f'{nome}_bucket{_rotulos(rotulos + (("le", limite),))} {acumulado}')
+                linhas.append(f'{nome}_sum{_rotulos(rotulos)} {_numero(faixas[-1])}')
+                linhas.append(f'{nome}_count{_rotulos(rotulos)} {acumulado}')
+        return '\n'.join(linhas) + '\n'
+
+
+metricas = Metricas()
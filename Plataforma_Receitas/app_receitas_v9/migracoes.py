@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, bindparam, func, inspect, or_, select, text, tuple_
+from database import db
+from models import (Usuario, Chef, Receita, Ingrediente, ReceitaIngrediente, receita_categorias,
+                    EmailPendente, EstatisticaChef, MigracaoEsquema, ReceitaSimilar,
+                    AssinaturaReceita, BandaReceita, DuplicataSuspeita, Alteracao)
+import busca_fts
+import estatisticas
+
+# --- Migrações do esquema ---
+# O "flask init-db" apagava o banco inteiro (drop_all) a cada mudança de
+# esquema. Agora ele aplica, em ordem, as migrações abaixo que ainda não
+# constam na tabela migracao_esquema, cada uma na sua própria transação.
+# Um banco antigo é atualizado sem perder dados e um banco novo passa pelas
+# mesmas etapas.
+#
+# Toda migração verifica o estado atual antes de mudar algo (tabela/coluna/
+# índice já existe?), então pode rodar num banco criado por qualquer versão.
+# Para alterar o esquema, acrescente uma nova função com o próximo número;
+# nunca edite uma migração que já foi publicada.
+
+MIGRACOES = []
+
+
+def migracao(versao, descricao):
+    def registrar(funcao):
+        MIGRACOES.append((versao, descricao, funcao))
+        return funcao
+    return registrar
+
+
+@migracao(1, 'Tabelas que ainda não existem no banco')
+def _criar_tabelas(conexao):
+    db.metadata.create_all(conexao)
+
+
+@migracao(2, 'Colunas receita.criado_em e receita.versao')
+def _colunas_receita(conexao):
+    colunas = {coluna['name'] for coluna in inspect(conexao).get_columns('receita')}
+    if 'criado_em' not in colunas:
+        tipo = Receita.__table__.c.criado_em.type.compile(conexao.dialect)
+        conexao.execute(text(f'ALTER TABLE receita ADD COLUMN criado_em {tipo}'))
+        # Receitas antigas não têm data: a ordem de criação (id) é preservada
+        agora = datetime.utcnow()
+        ids = conexao.scalars(select(Receita.id).order_by(Receita.id.desc())).all()
+        if ids: # executemany com lista vazia não tem valor para o b_id
+            conexao.execute(Receita.__table__.update().where(Receita.id == bindparam('b_id')),
+                            [{'b_id': receita_id, 'criado_em': agora - timedelta(seconds=n)}
+                             for n, receita_id in enumerate(ids)])
+    if 'versao' not in colunas:
+        conexao.execute(text('ALTER TABLE receita ADD COLUMN versao INTEGER NOT NULL DEFAULT 1'))
+
+
+@migracao(3, 'Índice de busca textual (FTS5)')
+def _busca_textual(conexao):
+    if conexao.dialect.name == 'sqlite':
+        busca_fts.reindexar(conexao)
+
+
+@migracao(4, 'Índices das consultas mais frequentes')
+def _indices(conexao):
+    for tabela in (Receita.__table__, ReceitaIngrediente.__table__, receita_categorias):
+        for indice in tabela.indexes:
+            indice.create(conexao, checkfirst=True)
+
+
+@migracao(5, 'Contadores do dashboard')
+def _contadores(conexao):
+    estatisticas.reconstruir(conexao)
+
+
+@migracao(6, 'Tabela receita_similar (receitas similares)')
+def _receitas_similares(conexao):
+    # Preenchida depois, por "flask similares"
+    ReceitaSimilar.__table__.create(conexao, checkfirst=True)
+
+
+@migracao(7, 'Tabelas da detecção de receitas quase iguais (MinHash/LSH)')
+def _duplicatas(conexao):
+    # As receitas já existentes entram no índice com "flask deduplicar"
+    for modelo in (AssinaturaReceita, BandaReceita, DuplicataSuspeita):
+        modelo.__table__.create(conexao, checkfirst=True)
+
+
+@migracao(8, 'Diário de alterações lido pelos índices em memória de cada processo')
+def _diario(conexao):
+    Alteracao.__table__.create(conexao, checkfirst=True)
+
+
+def versao_atual(conexao):
+    MigracaoEsquema.__table__.create(conexao, checkfirst=True)
+    return conexao.scalar(select(func.max(MigracaoEsquema.versao))) or 0
+
+
+def migrar(engine, avisar=print):
+    """Aplica as migrações pendentes e devolve quantas foram aplicadas."""
+    with engine.begin() as conexao:
+        aplicadas = set(conexao.scalars(select(MigracaoEsquema.versao))) \
+            if versao_atual(conexao) else set()
+    pendentes = [m for m in sorted(MIGRACOES, key=lambda m: m[0]) if m[0] not in aplicadas]
+    for versao, descricao, funcao in pendentes:
+        with engine.begin() as conexao:
+            funcao(conexao)
+            conexao.execute(MigracaoEsquema.__table__.insert().values(
+                versao=versao, descricao=descricao, aplicada_em=datetime.utcnow()))
+        avisar(f'Migração {versao} aplicada: {descricao}')
+    return len(pendentes)
+
+
+# --- Verificação dos planos de consulta ---
+# As consultas abaixo reproduzem as das rotas mais acessadas. "flask
+# verificar-indices" mostra o plano de cada uma (EXPLAIN QUERY PLAN) e acusa
+# as que leem uma tabela inteira ("SCAN tabela" sem índice, ou varrendo um
+# índice que não serve para a ordenação). Nas listagens paginadas também não
+# pode haver "USE TEMP B-TREE FOR ORDER BY", nem depois de um SEARCH: ordenar
+# na hora significa ler todas as linhas do filtro (a categoria inteira, todas
+# as receitas do chef) para devolver uma página.
+
+LISTAGENS_PAGINADAS = {
+    'index: primeira página', 'index: página seguinte (cursor)', 'detalhes_chef', 'receitas_por_categoria',
+    'dashboard: chefs com mais receitas', 'resumo semanal: receitas da semana',
+    'caixa de saída: mensagens pendentes',
+}
+
+
+def _consultas_das_rotas():
+    recentes = (Receita.criado_em.desc(), Receita.id.desc())
+    cursor = tuple_(Receita.criado_em, Receita.id) < (datetime.utcnow(), 1000)
+    return {
+        'index: primeira página': select(Receita.id).order_by(*recentes).limit(21),
+        'index: página seguinte (cursor)': select(Receita.id).where(cursor).order_by(*recentes).limit(21),
+        'detalhes_chef': select(Receita.id).where(Receita.chef_id == 1).order_by(*recentes).limit(21),
+        'receitas_por_categoria': select(Receita.id).join(receita_categorias)
+            .where(receita_categorias.c.categoria_id == 1, receita_categorias.c.receita_id < 1000)
+            .order_by(receita_categorias.c.receita_id.desc()).limit(21),
+        'cartão: ingredientes das receitas da página': select(ReceitaIngrediente)
+            .where(ReceitaIngrediente.receita_id.in_([1, 2, 3])),
+        'cartão: categorias das receitas da página': select(receita_categorias)
+            .where(receita_categorias.c.receita_id.in_([1, 2, 3])),
+        'receitas de um ingrediente': select(ReceitaIngrediente.receita_id)
+            .where(ReceitaIngrediente.ingrediente_id == 1),
+        'catálogo: ingredientes por nome': select(Ingrediente).where(Ingrediente.nome.in_(['farinha', 'ovo'])),
+        'dashboard: chefs com mais receitas': select(EstatisticaChef.chef_id)
+            .where(EstatisticaChef.total_receitas > 0)
+            .order_by(EstatisticaChef.total_receitas.desc()).limit(20),
+        'resumo semanal: receitas da semana': select(Receita.id)
+            .where(Receita.criado_em >= datetime.utcnow() - timedelta(days=7))
+            .order_by(*recentes).limit(10),
+        'detalhes_receita: receitas similares': select(Receita.id, Receita.titulo)
+            .join(ReceitaSimilar, ReceitaSimilar.similar_id == Receita.id)
+            .where(ReceitaSimilar.receita_id == 1).order_by(ReceitaSimilar.pontuacao.desc()).limit(6),
+        'criar_receita: candidatas a duplicata (LSH)': select(BandaReceita.receita_id)
+            .where(or_(and_(BandaReceita.banda == 0, BandaReceita.chave.in_([1, 2])),
+                       and_(BandaReceita.banda == 1, BandaReceita.chave.in_([3, 4])))),
+        'login: usuário por e-mail': select(Usuario.id).where(Usuario.email == 'a@a.com'),
+        'identidade do usuário logado': select(Usuario.id, Chef.id)
+            .outerjoin(Chef, Chef.usuario_id == Usuario.id).where(Usuario.id == 1),
+        'caixa de saída: mensagens pendentes': select(EmailPendente.id)
+            .where(EmailPendente.status == 'pendente').order_by(EmailPendente.id).limit(20),
+    }
+
+
+def verificar_indices(conexao):
+    """Devolve [(nome, linhas do plano, usa_indice)] para cada consulta das rotas."""
+    resultados = []
+    for nome, consulta in _consultas_das_rotas().items():
+        compilada = consulta.compile(dialect=conexao.dialect, compile_kwargs={'render_postcompile': True})
+        parametros = compilada.construct_params()
+        plano = [linha[-1] for linha in conexao.exec_driver_sql(
+            'EXPLAIN QUERY PLAN ' + str(compilada),
+            tuple(parametros[chave] for chave in compilada.positiontup))]
+        varreduras = [linha for linha in plano if linha.startswith('SCAN ')]
+        ordena = any('TEMP B-TREE FOR ORDER BY' in linha for linha in plano)
+        # Varrer um índice só é aceitável se ele já entrega a ordem pedida (sem ordenar tudo depois)
+        leitura_completa = any(' USING ' not in linha for linha in varreduras) or \
+            (ordena and (varreduras or nome in LISTAGENS_PAGINADAS))
+        resultados.append((nome, plano, not leitura_completa))
+    return resultados
@@ -1,3 +1,4 @@
+from datetime import datetime
 from database import db
 from flask_login import UserMixin
 
@@ -8,13 +9,18 @@ class ReceitaIngrediente(db.Model):
     ingrediente_id = db.Column(db.Integer, db.ForeignKey('ingrediente.id'), primary_key=True)
     quantidade = db.Column(db.String(50), nullable=False)
 
+    # Receitas de um ingrediente (a chave primária só serve para buscar por receita)
+    __table_args__ = (db.Index('ix_receita_ingredientes_ingrediente', 'ingrediente_id', 'receita_id'),)
+
     ingrediente = db.relationship("Ingrediente", back_populates="receitas_associadas")
     receita = db.relationship("Receita", back_populates="ingredientes_associados")
 
 # Tabela de associação para a relação M:M entre Receita e Categoria
 receita_categorias = db.Table('receita_categorias',
     db.Column('receita_id', db.Integer, db.ForeignKey('receita.id'), primary_key=True),
-    db.Column('categoria_id', db.Integer, db.ForeignKey('categoria.id'), primary_key=True)
+    db.Column('categoria_id', db.Integer, db.ForeignKey('categoria.id'), primary_key=True),
+    # Receitas de uma categoria (página da categoria)
+    db.Index('ix_receita_categorias_categoria', 'categoria_id', 'receita_id')
 )
 
 
@@ -53,6 +59,14 @@ class Receita(db.Model):
     titulo = db.Column(db.String(200), nullable=False)
     instrucoes = db.Column(db.Text, nullable=False)
     chef_id = db.Column(db.Integer, db.ForeignKey('chef.id'), nullable=False) # Continua apontando para Chef
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) # Usado na paginação por data
+    versao = db.Column(db.Integer, nullable=False, default=1) # Incrementada a cada alteração (ver eventos.py)
+
+    # Índices das listagens paginadas (index e página do chef), na ordem 'recentes'
+    __table_args__ = (
+        db.Index('ix_receita_criado_em', 'criado_em', 'id'),
+        db.Index('ix_receita_chef_criado_em', 'chef_id', 'criado_em', 'id'),
+    )
 
     # Relação M:M com Categoria
     categorias = db.relationship('Categoria', secondary=receita_categorias,
@@ -72,3 +86,102 @@ class Ingrediente(db.Model):
 class Categoria(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(50), unique=True, nullable=False)
+
+# Progresso das importações em lote (flask import-receitas): quantos registros
+# de cada arquivo já foram gravados. É atualizado na mesma transação de cada
+# lote, então após uma falha a importação recomeça exatamente de onde parou.
+class ImportacaoCheckpoint(db.Model):
+    __tablename__ = 'importacao_checkpoint'
+    chave = db.Column(db.String(255), primary_key=True)
+    registros = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Contadores pré-calculados para o dashboard, mantidos por eventos do SQLAlchemy
+# (ver estatisticas.py). Ler daqui custa o mesmo com 10 ou 10 milhões de receitas.
+class Estatistica(db.Model):
+    chave = db.Column(db.String(50), primary_key=True) # 'receitas' ou 'chefs'
+    valor = db.Column(db.Integer, nullable=False, default=0)
+
+class EstatisticaChef(db.Model):
+    __tablename__ = 'estatistica_chef'
+    chef_id = db.Column(db.Integer, db.ForeignKey('chef.id'), primary_key=True)
+    total_receitas = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+    chef = db.relationship('Chef')
+
+# Caixa de saída de e-mails: as rotas só gravam a mensagem aqui e um conjunto
+# de threads em segundo plano faz o envio por SMTP (ver caixa_saida.py).
+class EmailPendente(db.Model):
+    __tablename__ = 'email_pendente'
+    id = db.Column(db.Integer, primary_key=True)
+    destinatario = db.Column(db.String(120), nullable=False)
+    assunto = db.Column(db.String(255), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente', index=True) # pendente, enviando, enviado, falhou
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    proxima_tentativa = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    reservado_por = db.Column(db.String(32)) # Identifica o lote que está enviando a mensagem
+    reservado_em = db.Column(db.DateTime)
+    erro = db.Column(db.Text)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    enviado_em = db.Column(db.DateTime)
+
+# Progresso do resumo semanal: uma linha por usuário que já recebeu o resumo
+# da semana. Se o envio for interrompido, "flask send-digest" continua só com
+# quem ainda falta (ver resumo_semanal.py).
+class ResumoEnviado(db.Model):
+    __tablename__ = 'resumo_enviado'
+    semana = db.Column(db.String(10), primary_key=True) # Semana ISO, ex.: '2025-W07'
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), primary_key=True)
+    enviado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Receitas parecidas com cada receita (ingredientes e categorias em comum),
+# calculadas por "flask similares" e atualizadas a cada edição (ver similares.py)
+class ReceitaSimilar(db.Model):
+    __tablename__ = 'receita_similar'
+    receita_id = db.Column(db.Integer, db.ForeignKey('receita.id', ondelete='CASCADE'), primary_key=True)
+    similar_id = db.Column(db.Integer, db.ForeignKey('receita.id', ondelete='CASCADE'), primary_key=True,
+                           index=True) # Quem tem esta receita como similar (para as atualizações)
+    pontuacao = db.Column(db.Float, nullable=False)
+
+# Detecção de receitas quase iguais (ver duplicatas.py): a assinatura MinHash
+# de cada receita e as faixas dela, que formam o índice LSH de candidatas
+class AssinaturaReceita(db.Model):
+    __tablename__ = 'assinatura_receita'
+    receita_id = db.Column(db.Integer, db.ForeignKey('receita.id', ondelete='CASCADE'), primary_key=True)
+    assinatura = db.Column(db.LargeBinary, nullable=False)
+
+class BandaReceita(db.Model):
+    __tablename__ = 'banda_receita'
+    banda = db.Column(db.Integer, primary_key=True)
+    chave = db.Column(db.BigInteger, primary_key=True, autoincrement=False) # Hash dos valores da faixa
+    receita_id = db.Column(db.Integer, db.ForeignKey('receita.id', ondelete='CASCADE'), primary_key=True,
+                           index=True)
+
+# Pares suspeitos de duplicata: a receita mais nova e a original parecida com ela
+class DuplicataSuspeita(db.Model):
+    __tablename__ = 'duplicata_suspeita'
+    receita_id = db.Column(db.Integer, db.ForeignKey('receita.id', ondelete='CASCADE'), primary_key=True)
+    original_id = db.Column(db.Integer, db.ForeignKey('receita.id', ondelete='CASCADE'), primary_key=True,
+                            index=True)
+    similaridade = db.Column(db.Float, nullable=False)
+    detectada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Diário de alterações (ver eventos.py): uma linha por receita ou conta gravada,
+# na mesma transação da gravação. É por ele que os índices em memória de cada
+# processo ficam sabendo do que os outros workers gravaram.
+class Alteracao(db.Model):
+    __tablename__ = 'alteracao'
+    seq = db.Column(db.Integer, primary_key=True) # Só cresce (AUTOINCREMENT: não reaproveita números)
+    tipo = db.Column(db.String(20), nullable=False) # 'receita' ou 'usuario'
+    objeto_id = db.Column(db.Integer, nullable=False)
+    excluido = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = {'sqlite_autoincrement': True}
+
+# Migrações do esquema já aplicadas neste banco (ver migracoes.py)
+class MigracaoEsquema(db.Model):
+    __tablename__ = 'migracao_esquema'
+    versao = db.Column(db.Integer, primary_key=True)
+    descricao = db.Column(db.String(200), nullable=False)
+    aplicada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,142 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from flask import current_app, request, url_for, abort
+from sqlalchemy import tuple_
+
+# --- Paginação por cursor (keyset) ---
+# Em vez de OFFSET (que obriga o banco a percorrer todas as linhas anteriores),
+# cada página guarda a chave da última receita exibida e a próxima consulta
+# continua a partir dela: "WHERE (criado_em, id) < (:criado_em, :id) LIMIT n".
+# O custo de uma página é o mesmo seja ela a primeira ou a milésima.
+
+# Cada ordenação define as colunas da chave e se a listagem é decrescente.
+ORDENACOES = {
+    'recentes': {'colunas': ('criado_em', 'id'), 'decrescente': True},
+    'id': {'colunas': ('id',), 'decrescente': False},
+    # Mais novas primeiro pela chave de uma coluna só (o id cresce com a criação).
+    # Usada onde a listagem passa por uma tabela de associação, cujo índice tem
+    # o id da receita mas não a data (ver receitas_por_categoria)
+    'novas': {'colunas': ('id',), 'decrescente': True},
+}
+
+
+class Pagina:
+    def __init__(self, itens, ordem, por_pagina, proximo=None, anterior=None):
+        self.itens = itens
+        self.ordem = ordem
+        self.por_pagina = por_pagina
+        self.proximo = proximo      # cursor para a página seguinte (ou None)
+        self.anterior = anterior    # cursor para a página anterior (ou None)
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def _url(self, **cursor):
+        # Mantém os parâmetros da rota e apenas os filtros informados pelo usuário
+        args = dict(request.view_args or {})
+        for nome in ('q', 'ordem', 'por_pagina'):
+            if nome in request.args:
+                args[nome] = request.args[nome]
+        args.update(cursor)
+        return url_for(request.endpoint, **args)
+
+    @property
+    def url_proxima(self):
+        return self._url(depois=self.proximo) if self.proximo else None
+
+    @property
+    def url_anterior(self):
+        return self._url(antes=self.anterior) if self.anterior else None
+
+
+def codificar_cursor(ordem, valores):
+    valores = [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+    dados = json.dumps([ordem] + valores, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(dados).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(ordem, cursor):
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        abort(400)
+    # JSON válido mas de outro formato (ex.: um número): também é um cursor inválido
+    if not isinstance(dados, list) or not dados:
+        abort(400)
+    ordem_cursor, *valores = dados
+    colunas = ORDENACOES[ordem]['colunas']
+    if ordem_cursor != ordem or len(valores) != len(colunas):
+        abort(400)
+    try:
+        return [datetime.fromisoformat(v) if coluna == 'criado_em' else int(v)
+                for coluna, v in zip(colunas, valores)]
+    except (TypeError, ValueError):
+        abort(400)
+
+
+def _chave(item, colunas):
+    return [getattr(item, coluna) for coluna in colunas]
+
+
+def paginar(consulta, modelo, ordem=None, depois=None, antes=None, por_pagina=None, colunas=None):
+    """Aplica a paginação por cursor a uma consulta de `modelo` e devolve uma Pagina.
+
+    `colunas` troca colunas da chave por outras de mesmo valor (ex.: o
+    receita_id da tabela de associação no lugar de Receita.id), para o banco
+    filtrar e ordenar pelo índice da tabela que a consulta percorre.
+    """
+    ordem = ordem if ordem in ORDENACOES else current_app.config['PAGINACAO_ORDEM_PADRAO']
+    maximo = current_app.config['RECEITAS_POR_PAGINA_MAX']
+    por_pagina = min(max(por_pagina or current_app.config['RECEITAS_POR_PAGINA'], 1), maximo)
+
+    nomes = ORDENACOES[ordem]['colunas']
+    decrescente = ORDENACOES[ordem]['decrescente']
+    colunas = [(colunas or {}).get(nome, getattr(modelo, nome)) for nome in nomes]
+    chave = tuple_(*colunas) if len(colunas) > 1 else colunas[0]
+
+    # Voltar uma página é percorrer a mesma ordenação no sentido contrário
+    voltando = antes is not None and depois is None
+    cursor = antes if voltando else depois
+    invertido = decrescente != voltando
+
+    if cursor is not None:
+        valores = decodificar_cursor(ordem, cursor)
+        limite = tuple_(*valores) if len(valores) > 1 else valores[0]
+        consulta = consulta.filter(chave < limite if invertido else chave > limite)
+
+    consulta = consulta.order_by(*[c.desc() if invertido else c.asc() for c in colunas])
+    itens = consulta.limit(por_pagina + 1).all()
+    tem_mais = len(itens) > por_pagina
+    itens = itens[:por_pagina]
+
+    proximo = anterior = None
+    if voltando:
+        itens.reverse()
+        if itens:
+            proximo = codificar_cursor(ordem, _chave(itens[-1], nomes))
+            if tem_mais:
+                anterior = codificar_cursor(ordem, _chave(itens[0], nomes))
+    elif itens:
+        if tem_mais:
+            proximo = codificar_cursor(ordem, _chave(itens[-1], nomes))
+        if cursor is not None:
+            anterior = codificar_cursor(ordem, _chave(itens[0], nomes))
+
+    return Pagina(itens, ordem, por_pagina, proximo=proximo, anterior=anterior)
+
+
+def paginar_da_requisicao(consulta, modelo, ordem=None, colunas=None):
+    """Lê ordem, cursores e tamanho da página da query string (?depois=, ?antes=, ...)."""
+    return paginar(
+        consulta, modelo,
+        ordem=ordem or request.args.get('ordem'),
+        colunas=colunas,
+        depois=request.args.get('depois'),
+        antes=request.args.get('antes'),
+        por_pagina=request.args.get('por_pagina', type=int),
+    )
@@ -0,0 +1,198 @@
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from flask import render_template
+from flask_mail import Message
+from sqlalchemy import exists, select
+from database import db
+from models import Receita, ResumoEnviado, Usuario
+from carregamento import com_perfil
+from catalogo import insert_do_dialeto
+from caixa_saida import fechar_conexao
+
+# --- Resumo semanal por e-mail ("flask send-digest") ---
+# Envia a todos os usuários as receitas mais novas de uma semana. O envio foi
+# pensado para dezenas de milhares de destinatários:
+#   - o conteúdo é o mesmo para todos, então o template é renderizado UMA vez;
+#   - os destinatários são lidos do banco em lotes (paginação por id) e
+#     distribuídos a um conjunto de threads, cada uma com a sua conexão SMTP,
+#     reaproveitada para todas as mensagens que ela enviar;
+#   - um limite de mensagens por segundo, comum a todas as threads, evita que o
+#     servidor SMTP recuse o envio por excesso de volume;
+#   - quem já recebeu fica registrado na tabela resumo_enviado, então rodar o
+#     comando de novo (após uma queda, por exemplo) envia só para quem falta.
+#
+# A semana é identificada no formato ISO ('2025-W07') e define o conteúdo:
+# sempre as receitas criadas de segunda a domingo daquela semana. Assim uma
+# retomada envia exatamente o mesmo resumo que o restante dos usuários recebeu.
+#
+# Para testar sem enviar e-mails de verdade, aponte MAIL_SERVER/MAIL_PORT para
+# um servidor SMTP local (ex.: "python -m aiosmtpd -n -l localhost:1025").
+
+
+def semana_anterior(hoje=None):
+    """A última semana completa (a que terminou no domingo passado)."""
+    ano, semana, _ = ((hoje or date.today()) - timedelta(days=7)).isocalendar()
+    return f'{ano}-W{semana:02d}'
+
+
+def periodo_da_semana(semana):
+    """Devolve (início, fim) da semana ISO: de segunda 00:00 até a segunda seguinte."""
+    try:
+        ano, numero = semana.split('-W')
+        inicio = date.fromisocalendar(int(ano), int(numero), 1)
+    except ValueError:
+        raise ValueError(f'Semana inválida: {semana!r} (use o formato 2025-W07)')
+    inicio = datetime.combine(inicio, datetime.min.time())
+    return inicio, inicio + timedelta(days=7)
+
+
+def receitas_da_semana(inicio, fim, limite):
+    consulta = Receita.query.filter(Receita.criado_em >= inicio, Receita.criado_em < fim) \
+        .order_by(Receita.criado_em.desc(), Receita.id.desc()).limit(limite)
+    return com_perfil(consulta, 'titulo_chef').all()
+
+
+def destinatarios(semana, lote):
+    """Gera lotes de (id, e-mail) dos usuários que ainda não receberam o resumo da semana."""
+    ja_recebeu = exists().where(ResumoEnviado.semana == semana, ResumoEnviado.usuario_id == Usuario.id)
+    ultimo_id = 0
+    while True:
+        linhas = db.session.execute(
+            select(Usuario.id, Usuario.email)
+            .where(Usuario.id > ultimo_id, ~ja_recebeu)
+            .order_by(Usuario.id).limit(lote)
+        ).all()
+        if not linhas:
+            return
+        ultimo_id = linhas[-1].id
+        yield [tuple(linha) for linha in linhas]
+
+
+def registrar_envios(semana, usuario_ids):
+    if not usuario_ids:
+        return
+    agora = datetime.utcnow()
+    db.session.execute(
+        insert_do_dialeto(ResumoEnviado)
+        .values([{'semana': semana, 'usuario_id': usuario_id, 'enviado_em': agora} for usuario_id in usuario_ids])
+        .on_conflict_do_nothing(index_elements=['semana', 'usuario_id'])
+    )
+    db.session.commit()
+
+
+class LimiteTaxa:
+    """Libera no máximo `por_segundo` mensagens por segundo, somando todas as threads."""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo else 0
+        self._proxima = time.monotonic()
+        self._trava = threading.Lock()
+
+    def aguardar(self):
+        if not self.intervalo:
+            return
+        with self._trava:
+            agora = time.monotonic()
+            vez = max(self._proxima, agora)
+            self._proxima = vez + self.intervalo
+        if vez > agora:
+            time.sleep(vez - agora)
+
+
+class Progresso:
+    def __init__(self, avisar):
+        self.enviados = 0
+        self.falhas = 0
+        self.inicio = time.perf_counter()
+        self._avisar = avisar
+        self._trava = threading.Lock()
+
+    def contar(self, enviados, falhas):
+        with self._trava:
+            self.enviados += enviados
+            self.falhas += falhas
+            self._avisar(f'{self.enviados} resumos enviados, {self.falhas} falhas '
+                         f'({self.enviados / self.decorrido():.0f} e-mails/s).')
+
+    def decorrido(self):
+        return max(time.perf_counter() - self.inicio, 1e-9)
+
+
+def _trabalhar(app, fila, semana, assunto, html, limite, progresso):
+    """Thread de envio: pega lotes da fila e envia pela mesma conexão SMTP."""
+    mail = app.extensions['mail']
+    remetente = app.config['MAIL_USERNAME']
+    conexao = None
+    with app.app_context():
+        try:
+            while True:
+                lote = fila.get()
+                if lote is None:
+                    return
+                enviados = []
+                for usuario_id, email in lote:
+                    limite.aguardar()
+                    try:
+                        if conexao is None:
+                            conexao = mail.connect().__enter__()
+                        conexao.send(Message(subject=assunto, sender=remetente, recipients=[email], html=html))
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError):
+                        pass # Só este destinatário falhou; fica para a próxima execução
+                    except (smtplib.SMTPException, OSError):
+                        conexao = fechar_conexao(conexao) # Reabre a conexão na próxima mensagem
+                    else:
+                        enviados.append(usuario_id)
+                registrar_envios(semana, enviados)
+                progresso.contar(len(enviados), len(lote) - len(enviados))
+        finally:
+            fechar_conexao(conexao)
+            db.session.remove()
+
+
+def enviar_resumo(app, semana, trabalhadores=4, taxa=10, lote=200, max_receitas=10, avisar=print):
+    """Envia o resumo da `semana` a todos os usuários que ainda não o receberam."""
+    inicio, fim = periodo_da_semana(semana)
+    receitas = receitas_da_semana(inicio, fim, max_receitas)
+    if not receitas:
+        avisar(f'Nenhuma receita nova na semana {semana}; nada a enviar.')
+        return {'enviados': 0, 'falhas': 0}
+
+    # Renderizado uma vez só; os links precisam de URL absoluta, daí o contexto de requisição
+    with app.test_request_context(base_url=app.config['URL_BASE']):
+        html = render_template('email_resumo.html', receitas=receitas, inicio=inicio, fim=fim - timedelta(days=1))
+    assunto = f"As receitas da semana ({inicio:%d/%m} a {fim - timedelta(days=1):%d/%m})"
+
+    # Fila limitada: o banco é lido no ritmo do envio, não tudo de uma vez
+    fila = queue.Queue(maxsize=trabalhadores * 2)
+    limite = LimiteTaxa(taxa)
+    progresso = Progresso(avisar)
+    with ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix='resumo') as executor:
+        futuros = [executor.submit(_trabalhar, app, fila, semana, assunto, html, limite, progresso)
+                   for _ in range(trabalhadores)]
+        try:
+            for bloco in destinatarios(semana, lote):
+                _colocar(fila, bloco, futuros)
+        finally:
+            for _ in futuros:
+                _colocar(fila, None, futuros)
+        for futuro in futuros:
+            futuro.result() # Repassa erros inesperados das threads
+
+    avisar(f'Resumo da semana {semana}: {progresso.enviados} enviados, {progresso.falhas} falhas '
+           f'em {progresso.decorrido():.1f}s.')
+    return {'enviados': progresso.enviados, 'falhas': progresso.falhas}
+
+
+def _colocar(fila, item, futuros):
+    # Se todas as threads morreram, ninguém vai esvaziar a fila: não espera para sempre
+    while True:
+        try:
+            fila.put(item, timeout=1)
+            return
+        except queue.Full:
+            if all(futuro.done() for futuro in futuros):
+                return
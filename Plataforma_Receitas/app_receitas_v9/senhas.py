@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import bcrypt
+
+# --- Hash de senhas fora da thread da requisição ---
+# O bcrypt é lento de propósito (~250ms de CPU por senha). Feito dentro da
+# requisição, ele segura o GIL e, num pico de logins, todas as outras rotas
+# ficam paradas esperando. Aqui o cálculo vai para um conjunto limitado de
+# processos (SENHAS_PROCESSOS); a thread da requisição só espera o resultado.
+#
+# Custo (work factor): em produção, fixe SENHAS_CUSTO. Se ele for None, o
+# custo é calibrado no init_app, medindo o bcrypt nesta máquina e escolhendo o
+# maior custo que fique dentro de SENHAS_TEMPO_ALVO_MS (respeitando o mínimo e
+# o máximo). A medição é feita uma vez só e gravada em SENHAS_CALIBRAGEM: os
+# outros workers e as próximas inicializações leem o arquivo, então todos usam
+# o mesmo custo (medições diferentes fariam o hash de um usuário mudar de
+# custo a cada login, conforme o worker que o atendesse).
+#
+# Quando o custo aumenta, os hashes antigos continuam válidos e são refeitos
+# com o custo novo no próximo login do usuário (ver precisa_rehash). Hashes
+# com custo maior que o atual só são refeitos com SENHAS_REBAIXAR=True, para
+# o operador baixar o custo de propósito.
+#
+# Os hashes são compatíveis com os gerados antes pelo Flask-Bcrypt ($2b$).
+
+
+# Funções executadas nos processos do pool (precisam estar no nível do módulo)
+def _gerar(senha, custo):
+    inicio = time.perf_counter()
+    hash_senha = bcrypt.hashpw(senha, bcrypt.gensalt(rounds=custo)).decode('utf-8')
+    return hash_senha, time.perf_counter() - inicio
+
+
+def _verificar(hash_senha, senha):
+    inicio = time.perf_counter()
+    try:
+        valida = bcrypt.checkpw(senha, hash_senha)
+    except ValueError: # Hash em formato inválido
+        valida = False
+    return valida, time.perf_counter() - inicio
+
+
+def custo_do_hash(hash_senha):
+    """Custo gravado no hash ('$2b$12$...' -> 12), ou None se não for um hash bcrypt."""
+    try:
+        return int(hash_senha.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def calibrar(alvo_ms, minimo=10, maximo=15):
+    """Maior custo cujo tempo estimado nesta máquina não passa de `alvo_ms`."""
+    # Mede o custo mínimo (melhor de 3) e extrapola: cada +1 dobra o tempo
+    tempo = min(_gerar(b'calibragem', minimo)[1] for _ in range(3))
+    custo = minimo
+    while custo < maximo and tempo * 2 <= alvo_ms / 1000:
+        custo += 1
+        tempo *= 2
+    return custo
+
+
+def custo_calibrado(caminho, alvo_ms, minimo=10, maximo=15):
+    """Custo gravado em `caminho`; se não houver, calibra e grava (o primeiro processo a gravar vence)."""
+    try:
+        with open(caminho) as arquivo:
+            return int(arquivo.read())
+    except (OSError, ValueError):
+        pass
+    custo = calibrar(alvo_ms, minimo, maximo)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'w') as arquivo:
+        arquivo.write(str(custo))
+    try:
+        os.link(temporario, caminho) # Falha se outro processo já gravou
+    except FileExistsError:
+        with open(caminho) as arquivo:
+            custo = int(arquivo.read())
+    finally:
+        os.remove(temporario)
+    return custo
+
+
+class HasherSenhas:
+    def __init__(self, app=None):
+        self.processos = 0
+        self.custo = None
+        self.rebaixar = False
+        self._executor = None
+        self._vagas = None
+        self._trava_pool = threading.Lock()
+        self._trava_custo = threading.Lock()
+        self._metricas = threading.Lock()
+        self.operacoes = {'hash': 0, 'verificacao': 0}
+        self.segundos = {'hash': 0.0, 'verificacao': 0.0} # Tempo de CPU nos processos
+        self.espera = 0.0 # Tempo total que as requisições ficaram esperando (fila + cálculo)
+        self.rehashes = 0
+        self.em_andamento = 0
+        self._concluidas = deque(maxlen=10000) # Instantes de conclusão, para a vazão recente
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.processos = app.config.get('SENHAS_PROCESSOS', 0)
+        self.custo = app.config.get('SENHAS_CUSTO')
+        self.alvo_ms = app.config.get('SENHAS_TEMPO_ALVO_MS', 250)
+        self.custo_minimo = app.config.get('SENHAS_CUSTO_MINIMO', 10)
+        self.custo_maximo = app.config.get('SENHAS_CUSTO_MAXIMO', 15)
+        self.rebaixar = app.config.get('SENHAS_REBAIXAR', False)
+        if self.custo is None and app.config.get('SENHAS_CALIBRAGEM'):
+            self.custo = custo_calibrado(app.config['SENHAS_CALIBRAGEM'], self.alvo_ms,
+                                         self.custo_minimo, self.custo_maximo)
+        app.extensions['senhas'] = self
+
+    def custo_atual(self):
+        # Sem SENHAS_CALIBRAGEM (scripts), calibra neste processo no primeiro uso
+        if self.custo is None:
+            with self._trava_custo:
+                if self.custo is None:
+                    self.custo = self._executar(calibrar, self.alvo_ms, self.custo_minimo, self.custo_maximo)
+        return self.custo
+
+    def _pool(self):
+        with self._trava_pool:
+            if self._executor is None:
+                # "spawn": os processos não herdam as threads e conexões do servidor web
+                self._executor = ProcessPoolExecutor(self.processos, mp_context=get_context('spawn'))
+                self._vagas = threading.BoundedSemaphore(self.processos * 4)
+        return self._executor
+
+    def _executar(self, funcao, *argumentos):
+        # Sem processos configurados, calcula na própria thread (útil em scripts e testes)
+        if not self.processos:
+            return funcao(*argumentos)
+        executor = self._pool()
+        # Limita quantas senhas podem estar na fila ao mesmo tempo
+        with self._vagas:
+            with self._metricas:
+                self.em_andamento += 1
+            try:
+                return executor.submit(funcao, *argumentos).result()
+            finally:
+                with self._metricas:
+                    self.em_andamento -= 1
+
+    def _medir(self, tipo, funcao, *argumentos):
+        inicio = time.perf_counter()
+        valor, segundos = self._executar(funcao, *argumentos)
+        with self._metricas:
+            self.operacoes[tipo] += 1
+            self.segundos[tipo] += segundos
+            self.espera += time.perf_counter() - inicio
+            self._concluidas.append(time.monotonic())
+        return valor
+
+    def gerar_hash(self, senha):
+        return self._medir('hash', _gerar, senha.encode('utf-8'), self.custo_atual())
+
+    def verificar(self, hash_senha, senha):
+        return self._medir('verificacao', _verificar, hash_senha.encode('utf-8'), senha.encode('utf-8'))
+
+    def precisa_rehash(self, hash_senha):
+        custo = custo_do_hash(hash_senha)
+        if custo is None:
+            return True
+        return custo < self.custo_atual() or (self.rebaixar and custo != self.custo_atual())
+
+    def rehash(self, senha):
+        """Hash novo com o custo atual, para um usuário que acabou de entrar com um hash antigo."""
+        with self._metricas:
+            self.rehashes += 1
+        return self.gerar_hash(senha)
+
+    def totais(self):
+        """Contadores acumulados deste processo (exportados no /metrics, ver metricas.py)."""
+        with self._metricas:
+            return {'operacoes': dict(self.operacoes), 'segundos': dict(self.segundos),
+                    'espera': self.espera, 'rehashes': self.rehashes, 'em_andamento': self.em_andamento}
+
+    def estatisticas(self):
+        with self._metricas:
+            total = sum(self.operacoes.values())
+            ultimo_minuto = sum(1 for instante in self._concluidas if instante > time.monotonic() - 60)
+            return {
+                'custo': self.custo,
+                'processos': self.processos,
+                'em_andamento': self.em_andamento,
+                'hashes': self.operacoes['hash'],
+                'verificacoes': self.operacoes['verificacao'],
+                'rehashes': self.rehashes,
+                'tempo_medio_ms': {
+                    tipo: 1000 * self.segundos[tipo] / self.operacoes[tipo] if self.operacoes[tipo] else 0.0
+                    for tipo in self.operacoes
+                },
+                'espera_media_ms': 1000 * self.espera / total if total else 0.0,
+                'operacoes_por_segundo': ultimo_minuto / 60,
+            }
+
+
+hasher = HasherSenhas()
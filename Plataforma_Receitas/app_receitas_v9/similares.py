@@ -0,0 +1,441 @@
+import heapq
+import importlib.util
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from flask import has_request_context
+from sqlalchemy import func, or_, select
+from database import db
+from models import Receita, ReceitaIngrediente, ReceitaSimilar, Estatistica, receita_categorias
+from cache_respostas import cache
+from eventos import receitas_confirmadas
+
+# --- Receitas similares ---
+# Cada receita vira um vetor esparso de atributos: os seus ingredientes e as
+# suas categorias. O peso de cada atributo é o IDF (ingredientes raros como
+# "jambu" pesam mais que "sal", presente em quase tudo) e as categorias valem
+# SIMILARES_PESO_CATEGORIAS do peso de um ingrediente. A semelhança entre duas
+# receitas é o cosseno entre os vetores ou o Jaccard ponderado
+# (soma dos pesos em comum / soma dos pesos da união), conforme SIMILARES_METRICA.
+#
+# As SIMILARES_K mais parecidas de cada receita ficam na tabela receita_similar:
+#   - "flask similares" calcula o catálogo inteiro. Com NumPy e SciPy
+#     instalados, a matriz receitas x atributos é esparsa e cada bloco de
+#     SIMILARES_BLOCO receitas é multiplicado pela matriz inteira de uma vez,
+#     em SIMILARES_PROCESSOS processos. Sem eles, um índice invertido em Python
+#     puro faz o mesmo cálculo (bem mais lento; serve para catálogos pequenos).
+#   - Depois de cada commit feito pelo site, uma thread refaz só as linhas de
+#     receita_similar em que a receita editada aparece: a lista dela e a
+#     posição dela na lista das outras. Do banco vêm só o vetor da receita e
+#     os das candidatas (receitas com algum ingrediente ou categoria em comum,
+#     até CANDIDATOS_MAXIMO, começando pelos atributos mais raros, que são os
+#     que mais pesam), e o IDF sai da contagem de cada atributo no índice.
+#     Uma receita que cai ou sai da lista de outra não é substituída ali, e os
+#     pesos IDF mudam um pouco a cada receita nova sem reordenar as outras
+#     listas: rode "flask similares" de tempos em tempos (ex.: uma vez por dia).
+#
+# Só pares com algum atributo em comum têm semelhança maior que zero; os
+# demais nunca aparecem como similares.
+
+CANDIDATOS_MAXIMO = 5000 # Receitas comparadas com a editada na atualização incremental
+
+VETORIZADO = bool(importlib.util.find_spec('numpy') and importlib.util.find_spec('scipy'))
+METRICAS = ('cosseno', 'jaccard')
+
+
+class Matriz:
+    """Receitas x atributos, com os pesos já aplicados."""
+
+    def __init__(self, ids, atributos, pesos, metrica='cosseno'):
+        if metrica not in METRICAS:
+            raise ValueError(f'SIMILARES_METRICA desconhecida: {metrica}')
+        self.ids = ids                      # posição -> id da receita
+        self.posicao = {receita_id: p for p, receita_id in enumerate(ids)}
+        self.atributos = atributos          # posição -> índices dos atributos
+        self.metrica = metrica
+        # Quanto cada atributo em comum soma no produto escalar
+        self.contribuicao = [peso * peso if metrica == 'cosseno' else peso for peso in pesos]
+        self.tamanhos = [sum(self.contribuicao[a] for a in linha) for linha in atributos]
+        self._postagens = None
+        self._esparsa = None
+
+    def pontuar(self, produto, tamanho_a, tamanho_b):
+        # Funciona com números e com arrays do NumPy
+        if self.metrica == 'jaccard':
+            return produto / (tamanho_a + tamanho_b - produto)
+        return produto / (tamanho_a * tamanho_b) ** 0.5
+
+    # --- Representações (montadas no primeiro uso) ---
+    @property
+    def postagens(self):
+        if self._postagens is None:
+            postagens = defaultdict(list)
+            for posicao, linha in enumerate(self.atributos):
+                for atributo in linha:
+                    postagens[atributo].append(posicao)
+            self._postagens = postagens
+        return self._postagens
+
+    @property
+    def esparsa(self):
+        """(matriz CSR com raiz da contribuição, sua transposta, tamanhos) para o NumPy/SciPy."""
+        if self._esparsa is None:
+            import numpy as np
+            from scipy import sparse
+            linhas = np.repeat(np.arange(len(self.atributos)), [len(linha) for linha in self.atributos])
+            colunas = np.fromiter((a for linha in self.atributos for a in linha), dtype=np.int64,
+                                  count=len(linhas))
+            raizes = np.sqrt(np.asarray(self.contribuicao, dtype=np.float64))
+            matriz = sparse.csr_matrix((raizes[colunas], (linhas, colunas)),
+                                       shape=(len(self.atributos), len(self.contribuicao)))
+            self._esparsa = (matriz, matriz.T.tocsr(), np.asarray(self.tamanhos))
+        return self._esparsa
+
+    # --- Consultas ---
+    def pontuacoes(self, posicao):
+        """{posição: semelhança} de todas as receitas com algo em comum com a da `posicao`."""
+        if VETORIZADO:
+            matriz, transposta, tamanhos = self.esparsa
+            linha = matriz[posicao] @ transposta
+            colunas = linha.indices
+            valores = self.pontuar(linha.data, tamanhos[posicao], tamanhos[colunas])
+            pontos = dict(zip(colunas.tolist(), valores.tolist()))
+        else:
+            produtos = defaultdict(float)
+            for atributo in self.atributos[posicao]:
+                contribuicao = self.contribuicao[atributo]
+                for outra in self.postagens[atributo]:
+                    produtos[outra] += contribuicao
+            tamanho = self.tamanhos[posicao]
+            pontos = {outra: self.pontuar(produto, tamanho, self.tamanhos[outra])
+                      for outra, produto in produtos.items()}
+        pontos.pop(posicao, None)
+        return pontos
+
+    def melhores_posicoes(self, pontos, k):
+        """As `k` maiores semelhanças, como [(posição, pontuação)]."""
+        return [(posicao, pontuacao)
+                for posicao, pontuacao in heapq.nlargest(k, pontos.items(), key=lambda item: (item[1], -item[0]))
+                if pontuacao > 0]
+
+    def melhores(self, pontos, k):
+        """As `k` maiores semelhanças, como [(id da receita, pontuação)]."""
+        return [(self.ids[posicao], pontuacao) for posicao, pontuacao in self.melhores_posicoes(pontos, k)]
+
+
+def carregar(conexao, metrica='cosseno', peso_categorias=0.5):
+    """Monta a Matriz a partir de receita_ingredientes e receita_categorias."""
+    ids = conexao.scalars(select(Receita.id).order_by(Receita.id)).all()
+    posicao = {receita_id: p for p, receita_id in enumerate(ids)}
+    atributos = [[] for _ in ids]
+    numeros = {} # ('ingrediente' | 'categoria', id) -> índice do atributo
+    consultas = (
+        ('ingrediente', select(ReceitaIngrediente.receita_id, ReceitaIngrediente.ingrediente_id)),
+        ('categoria', select(receita_categorias.c.receita_id, receita_categorias.c.categoria_id)),
+    )
+    for tipo, consulta in consultas:
+        for receita_id, atributo_id in conexao.execute(consulta):
+            p = posicao.get(receita_id)
+            if p is not None:
+                atributos[p].append(numeros.setdefault((tipo, atributo_id), len(numeros)))
+
+    frequencias = Counter(atributo for linha in atributos for atributo in linha)
+    pesos = [0.0] * len(numeros)
+    for (tipo, _), atributo in numeros.items():
+        pesos[atributo] = _peso(tipo, len(ids), frequencias[atributo], peso_categorias)
+    return Matriz(ids, atributos, pesos, metrica)
+
+
+def _peso(tipo, total, frequencia, peso_categorias):
+    # IDF suavizado: log((1 + N) / (1 + receitas com o atributo)) + 1
+    return (math.log((1 + total) / (1 + frequencia)) + 1) * (peso_categorias if tipo == 'categoria' else 1.0)
+
+
+# Tabelas de atributos: tipo, coluna da receita, coluna do atributo
+_ATRIBUTOS = {
+    'ingrediente': (ReceitaIngrediente.__table__.c.receita_id, ReceitaIngrediente.__table__.c.ingrediente_id),
+    'categoria': (receita_categorias.c.receita_id, receita_categorias.c.categoria_id),
+}
+
+
+def _em_partes(itens, tamanho=500):
+    itens = list(itens)
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+def _atributos_das_receitas(conexao, ids):
+    """{receita_id: [(tipo, atributo_id)]}."""
+    atributos = defaultdict(list)
+    for tipo, (coluna_receita, coluna_atributo) in _ATRIBUTOS.items():
+        for parte in _em_partes(ids):
+            for receita_id, atributo_id in conexao.execute(
+                    select(coluna_receita, coluna_atributo).where(coluna_receita.in_(parte))):
+                atributos[receita_id].append((tipo, atributo_id))
+    return atributos
+
+
+def _frequencias(conexao, chaves):
+    """{(tipo, atributo_id): receitas com o atributo}, contadas no índice de cada atributo."""
+    frequencias = {}
+    for tipo, (coluna_receita, coluna_atributo) in _ATRIBUTOS.items():
+        for parte in _em_partes(sorted(a for t, a in chaves if t == tipo)):
+            for atributo_id, quantidade in conexao.execute(
+                    select(coluna_atributo, func.count()).where(coluna_atributo.in_(parte)).group_by(coluna_atributo)):
+                frequencias[(tipo, atributo_id)] = quantidade
+    return frequencias
+
+
+def carregar_vizinhanca(conexao, receita_id, metrica='cosseno', peso_categorias=0.5):
+    """Matriz só com a receita (posição 0) e as candidatas a similar, ou None se ela não tem atributos."""
+    proprios = _atributos_das_receitas(conexao, [receita_id]).get(receita_id)
+    if not proprios:
+        return None
+    frequencias = _frequencias(conexao, set(proprios))
+    candidatas = set()
+    for tipo, atributo_id in sorted(set(proprios), key=lambda chave: (frequencias.get(chave, 0), chave)):
+        if len(candidatas) >= CANDIDATOS_MAXIMO:
+            break
+        coluna_receita, coluna_atributo = _ATRIBUTOS[tipo]
+        candidatas.update(conexao.scalars(
+            select(coluna_receita).where(coluna_atributo == atributo_id, coluna_receita != receita_id)
+            .order_by(coluna_receita.desc()).limit(CANDIDATOS_MAXIMO - len(candidatas))))
+
+    ids = [receita_id] + sorted(candidatas)
+    atributos_por_receita = _atributos_das_receitas(conexao, ids[1:])
+    atributos_por_receita[receita_id] = proprios
+    todos = {chave for lista in atributos_por_receita.values() for chave in lista}
+    frequencias.update(_frequencias(conexao, todos - frequencias.keys()))
+    total = conexao.scalar(select(Estatistica.valor).where(Estatistica.chave == 'receitas')) or \
+        conexao.scalar(select(func.count()).select_from(Receita))
+    numeros = {}
+    atributos = [[numeros.setdefault(chave, len(numeros)) for chave in atributos_por_receita.get(r, ())]
+                 for r in ids]
+    pesos = [0.0] * len(numeros)
+    for (tipo, atributo_id), numero in numeros.items():
+        pesos[numero] = _peso(tipo, total, frequencias.get((tipo, atributo_id), 0), peso_categorias)
+    return Matriz(ids, atributos, pesos, metrica)
+
+
+def da_receita(receita_id, limite):
+    """(id, título) das receitas mais parecidas, da mais para a menos parecida."""
+    return db.session.execute(
+        select(Receita.id, Receita.titulo)
+        .join(ReceitaSimilar, ReceitaSimilar.similar_id == Receita.id)
+        .where(ReceitaSimilar.receita_id == receita_id)
+        .order_by(ReceitaSimilar.pontuacao.desc())
+        .limit(limite)
+    ).all()
+
+
+def _gravar_listas(conexao, listas):
+    """Substitui as listas {receita_id: [(similar_id, pontuação)]} no banco."""
+    if not listas:
+        return
+    tabela = ReceitaSimilar.__table__
+    conexao.execute(tabela.delete().where(tabela.c.receita_id.in_(list(listas))))
+    linhas = [{'receita_id': receita_id, 'similar_id': similar_id, 'pontuacao': pontuacao}
+              for receita_id, lista in listas.items() for similar_id, pontuacao in lista]
+    if linhas:
+        conexao.execute(tabela.insert(), linhas)
+
+
+# --- Cálculo do catálogo inteiro (flask similares) ---
+_processo = {}
+
+
+def _iniciar_processo(esparsa, metrica, k):
+    # Roda uma vez em cada processo: a matriz chega aqui uma só vez, não a cada bloco
+    _processo.update(esparsa=esparsa, metrica=metrica, k=k)
+
+
+def _bloco_vetorizado(inicio, fim, esparsa=None, metrica=None, k=None):
+    """[(posição, pontuação)] das k mais parecidas de cada receita do bloco [inicio, fim)."""
+    import numpy as np
+    matriz, transposta, tamanhos = esparsa or _processo['esparsa']
+    metrica = metrica or _processo['metrica']
+    k = k or _processo['k']
+    # O produto continua esparso (CSR): só os pares com algum atributo em comum
+    # ocupam memória, e não bloco x total de receitas
+    produtos = (matriz[inicio:fim] @ transposta).tocsr()
+    produtos.sort_indices()
+    colunas, inicios = produtos.indices, produtos.indptr
+    linhas = np.repeat(np.arange(inicio, fim), np.diff(inicios))
+    if metrica == 'jaccard':
+        pontos = produtos.data / (tamanhos[linhas] + tamanhos[colunas] - produtos.data)
+    else:
+        pontos = produtos.data / np.sqrt(tamanhos[linhas] * tamanhos[colunas])
+    pontos[colunas == linhas] = 0 # A própria receita
+    resultado = []
+    for n in range(fim - inicio):
+        posicoes, valores = colunas[inicios[n]:inicios[n + 1]], pontos[inicios[n]:inicios[n + 1]]
+        if len(valores) > k:
+            # Todas as empatadas com a k-ésima entram, para o desempate abaixo escolher
+            escolhidas = valores >= np.partition(valores, len(valores) - k)[len(valores) - k]
+            posicoes, valores = posicoes[escolhidas], valores[escolhidas]
+        # Maior pontuação primeiro; no empate, a menor posição (como em Matriz.melhores_posicoes)
+        ordem = np.lexsort((posicoes, -valores))[:k]
+        resultado.append([(posicao, valor) for posicao, valor in zip(posicoes[ordem].tolist(), valores[ordem].tolist())
+                          if valor > 0])
+    return resultado
+
+
+def calcular_todas(engine, k=10, metrica='cosseno', peso_categorias=0.5, processos=0, bloco=256, avisar=print):
+    """Recalcula a tabela receita_similar inteira, bloco a bloco."""
+    inicio_total = time.perf_counter()
+    with engine.connect() as conexao:
+        matriz = carregar(conexao, metrica, peso_categorias)
+    total = len(matriz.ids)
+    blocos = [(inicio, min(inicio + bloco, total)) for inicio in range(0, total, bloco)]
+    avisar(f'{total} receitas, {len(matriz.contribuicao)} atributos '
+           f'({"NumPy/SciPy" if VETORIZADO else "Python puro"}).')
+
+    executor = None
+    if not VETORIZADO:
+        resultados = ([matriz.melhores_posicoes(matriz.pontuacoes(posicao), k) for posicao in range(inicio, fim)]
+                      for inicio, fim in blocos)
+    elif processos > 0:
+        executor = ProcessPoolExecutor(processos, mp_context=get_context('spawn'), initializer=_iniciar_processo,
+                                       initargs=(matriz.esparsa, metrica, k))
+        resultados = executor.map(_bloco_vetorizado, [b[0] for b in blocos], [b[1] for b in blocos])
+    else:
+        resultados = (_bloco_vetorizado(inicio, fim, matriz.esparsa, metrica, k) for inicio, fim in blocos)
+
+    try:
+        gravadas = 0
+        for (inicio, fim), vizinhos in zip(blocos, resultados):
+            listas = {matriz.ids[inicio + n]: [(matriz.ids[p], v) for p, v in lista]
+                      for n, lista in enumerate(vizinhos)}
+            with engine.begin() as conexao:
+                _gravar_listas(conexao, listas)
+            gravadas = fim
+            decorrido = time.perf_counter() - inicio_total
+            avisar(f'{gravadas}/{total} receitas ({gravadas / decorrido:.0f} receitas/s).')
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    # Linhas de receitas que não existem mais
+    tabela = ReceitaSimilar.__table__
+    with engine.begin() as conexao:
+        conexao.execute(tabela.delete().where(tabela.c.receita_id.not_in(select(Receita.id))))
+    return {'receitas': total, 'segundos': time.perf_counter() - inicio_total}
+
+
+# --- Atualização incremental ---
+def atualizar(conexao, alteradas=(), excluidas=(), k=10, metrica='cosseno', peso_categorias=0.5):
+    """Refaz as linhas de receita_similar em que as receitas alteradas ou excluídas aparecem.
+
+    Devolve os ids das receitas cuja lista mudou.
+    """
+    tabela = ReceitaSimilar.__table__
+    excluidas = set(excluidas)
+    alteradas = set(alteradas) - excluidas
+    afetadas = sorted(alteradas | excluidas)
+    if not afetadas:
+        return set()
+    # O primeiro comando grava: no SQLite a transação já fica com o banco
+    # reservado (um escritor por vez), então nenhuma receita lida daqui em
+    # diante é excluída por outro processo antes de gravarmos as linhas
+    conexao.execute(tabela.delete().where(tabela.c.receita_id.in_(afetadas)))
+    mudaram = set(alteradas)
+    listadas = defaultdict(set) # receita alterada -> receitas que a têm na lista
+    for receita_id, similar_id in conexao.execute(select(tabela.c.receita_id, tabela.c.similar_id)
+                                                  .where(tabela.c.similar_id.in_(afetadas))):
+        listadas[similar_id].add(receita_id)
+        mudaram.add(receita_id)
+    if excluidas:
+        conexao.execute(tabela.delete().where(tabela.c.similar_id.in_(sorted(excluidas))))
+
+    for receita_id in sorted(alteradas):
+        matriz = carregar_vizinhanca(conexao, receita_id, metrica, peso_categorias)
+        pontos = matriz.pontuacoes(0) if matriz else {}
+        _gravar_listas(conexao, {receita_id: matriz.melhores(pontos, k) if matriz else []})
+        pontuacoes = {matriz.ids[posicao]: valor for posicao, valor in pontos.items() if valor > 0} if matriz else {}
+
+        # A nota desta receita na lista de quem já a tinha
+        for outra_id in listadas[receita_id]:
+            filtro = (tabela.c.receita_id == outra_id, tabela.c.similar_id == receita_id)
+            if outra_id in pontuacoes:
+                conexao.execute(tabela.update().where(*filtro).values(pontuacao=pontuacoes[outra_id]))
+            else:
+                conexao.execute(tabela.delete().where(*filtro))
+
+        # Listas em que ela passa a entrar (só as que já foram calculadas; as
+        # das outras alteradas são refeitas inteiras neste mesmo laço)
+        novas = sorted(set(pontuacoes) - listadas[receita_id] - alteradas)
+        resumo = {}
+        for parte in _em_partes(novas):
+            resumo.update((outra_id, (quantidade, minimo)) for outra_id, quantidade, minimo in conexao.execute(
+                select(tabela.c.receita_id, func.count(), func.min(tabela.c.pontuacao))
+                .where(tabela.c.receita_id.in_(parte)).group_by(tabela.c.receita_id)))
+        for outra_id, (quantidade, minimo) in resumo.items():
+            nova = pontuacoes[outra_id]
+            if quantidade >= k and nova <= minimo:
+                continue
+            if quantidade >= k: # Sai a menos parecida
+                ultima = select(tabela.c.similar_id).where(tabela.c.receita_id == outra_id) \
+                    .order_by(tabela.c.pontuacao, tabela.c.similar_id.desc()).limit(1).scalar_subquery()
+                conexao.execute(tabela.delete().where(tabela.c.receita_id == outra_id,
+                                                      tabela.c.similar_id == ultima))
+            conexao.execute(tabela.insert().values(receita_id=outra_id, similar_id=receita_id, pontuacao=nova))
+            mudaram.add(outra_id)
+    return mudaram
+
+
+class AtualizadorSimilares:
+    """Thread em segundo plano que aplica atualizar() depois dos commits do site."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._acordar = threading.Event()
+        self._alteradas = set()
+        self._excluidas = set()
+        self._thread = None
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        if app.config.get('SIMILARES_AUTOMATICO', True):
+            receitas_confirmadas.connect(self._ao_confirmar, weak=False)
+
+    def _ao_confirmar(self, session, alteradas, excluidas):
+        # Importações e comandos do terminal alteram muitas receitas de uma vez:
+        # para eles, "flask similares" recalcula tudo de forma bem mais eficiente
+        limite = self.app.config.get('SIMILARES_LIMITE_INCREMENTAL', 100)
+        if not has_request_context() or len(alteradas) + len(excluidas) > limite:
+            return
+        with self._trava:
+            self._alteradas |= alteradas
+            self._excluidas |= excluidas
+            self._alteradas -= self._excluidas
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.trabalhar, name='similares', daemon=True)
+                self._thread.start()
+        self._acordar.set()
+
+    def trabalhar(self):
+        config = self.app.config
+        while True:
+            self._acordar.wait()
+            self._acordar.clear()
+            with self._trava:
+                alteradas, self._alteradas = self._alteradas, set()
+                excluidas, self._excluidas = self._excluidas, set()
+            if not alteradas and not excluidas:
+                continue
+            with self.app.app_context():
+                try:
+                    with db.engine.begin() as conexao:
+                        mudaram = atualizar(conexao, alteradas, excluidas, config['SIMILARES_K'],
+                                            config['SIMILARES_METRICA'], config['SIMILARES_PESO_CATEGORIAS'])
+                    cache.invalidar(*[f'receita:{receita_id}' for receita_id in mudaram])
+                except Exception:
+                    self.app.logger.exception('Falha ao atualizar as receitas similares de %s',
+                                              sorted(alteradas | excluidas))
+
+
+atualizador = AtualizadorSimilares()
@@ -0,0 +1,160 @@
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# O app.py lê a configuração do ambiente ao ser importado: usamos um banco
+# temporário, desligamos o cache de respostas (os testes contam o SQL) e
+# fixamos o custo do bcrypt
+_diretorio = tempfile.mkdtemp(prefix='receitas-testes-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_diretorio, 'receitas.db')
+os.environ['CACHE_TIPO'] = ''
+os.environ['SENHAS_CUSTO'] = '4' # Custo mínimo do bcrypt, sem calibrar nesta máquina
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import event
+from app import app as aplicacao
+from database import db
+from models import Usuario, Chef, Receita, Categoria, Ingrediente, ReceitaIngrediente
+from senhas import hasher
+import busca_fts
+import migracoes
+import identidade
+import indice_ingredientes
+import autocompletar
+import correcao_busca
+
+
+@pytest.fixture
+def app():
+    aplicacao.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    hasher.processos = 0
+    with aplicacao.app_context():
+        # Banco zerado e migrado, como depois de "flask init-db --reset"
+        db.drop_all()
+        with db.engine.begin() as conexao:
+            busca_fts.remover_tabela(conexao)
+        migracoes.migrar(db.engine, avisar=lambda mensagem: None)
+        # Estado em memória do processo que sobreviveria de um teste para o outro
+        aplicacao.jinja_env.cache_fragmentos.limpar()
+        identidade._identidades.limpar()
+        indice_ingredientes.indice.pronto = False
+        for vocabulario in autocompletar.vocabularios.values():
+            vocabulario.pronto = False
+        correcao_busca.corretor.pronto = False
+        yield aplicacao
+        db.session.remove()
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def contar_sql(app):
+    """Conta os comandos SQL executados dentro do bloco: with contar_sql() as comandos: ..."""
+    @contextmanager
+    def contar():
+        comandos = []
+
+        def _registrar(conexao, cursor, sql, parametros, contexto, executemany):
+            comandos.append(sql)
+
+        event.listen(db.engine, 'before_cursor_execute', _registrar)
+        try:
+            yield comandos
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _registrar)
+    return contar
+
+
+# --- Servidor SMTP de mentira (caixa de saída e resumo semanal) ---
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _ConversaSMTP)
+        self.recebidas = [] # Destinatário de cada mensagem
+        self.mensagens = [] # Bytes (cabeçalhos e corpo) de cada mensagem
+        self.conexoes = 0
+
+
+class _ConversaSMTP(socketserver.StreamRequestHandler):
+    def responder(self, linha):
+        self.wfile.write(linha.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.conexoes += 1
+        self.responder('220 teste')
+        destinatarios = []
+        while linha := self.rfile.readline().decode().strip():
+            comando = linha[:4].upper()
+            if comando == 'EHLO' or comando == 'HELO':
+                self.responder('250 teste')
+            elif comando == 'RCPT':
+                destinatarios.append(linha.split(':', 1)[1].strip(' <>'))
+                self.responder('250 OK')
+            elif comando == 'DATA':
+                self.responder('354 fim com <CRLF>.<CRLF>')
+                corpo = []
+                while (dados := self.rfile.readline()) not in (b'.\r\n', b''):
+                    corpo.append(dados)
+                self.server.recebidas.extend(destinatarios)
+                self.server.mensagens.append(b''.join(corpo))
+                destinatarios = []
+                self.responder('250 OK')
+            elif comando == 'QUIT':
+                self.responder('221 tchau')
+                return
+            else: # MAIL, RSET, NOOP
+                self.responder('250 OK')
+
+
+@pytest.fixture
+def smtp(app):
+    """Servidor SMTP local que guarda o que recebe; o Flask-Mail passa a enviar para ele."""
+    servidor = ServidorSMTP()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    mail = app.extensions['mail']
+    originais = (mail.server, mail.port, mail.use_tls, mail.username)
+    mail.server, mail.port = servidor.server_address
+    mail.use_tls, mail.username = False, None
+    yield servidor
+    mail.server, mail.port, mail.use_tls, mail.username = originais
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def criar_chef(email='chef@exemplo.com', nome='Ana'):
+    usuario = Usuario(email=email, password_hash='x')
+    chef = Chef(nome=nome, especialidade='doces', usuario=usuario)
+    db.session.add_all([usuario, chef])
+    db.session.commit()
+    return chef
+
+
+def entrar(cliente, usuario_id):
+    """Deixa o cliente logado como o usuário, sem passar pelo formulário de login."""
+    with cliente.session_transaction() as sessao:
+        sessao['_user_id'] = str(usuario_id)
+        sessao['_fresh'] = True
+
+
+def criar_receitas(chef, quantidade, ingredientes=3, categorias=2, prefixo='Receita'):
+    """Cria `quantidade` receitas do chef, cada uma com ingredientes e categorias próprios."""
+    receitas = []
+    for i in range(quantidade):
+        receita = Receita(titulo=f'{prefixo} {i}', instrucoes=f'Misture tudo da receita {i}.', chef=chef)
+        receita.categorias = [Categoria(nome=f'{prefixo} categoria {i}-{j}') for j in range(categorias)]
+        for j in range(ingredientes):
+            receita.ingredientes_associados.append(ReceitaIngrediente(
+                ingrediente=Ingrediente(nome=f'{prefixo.lower()} ingrediente {i}-{j}'), quantidade='1'))
+        receitas.append(receita)
+    db.session.add_all(receitas)
+    db.session.commit()
+    return receitas
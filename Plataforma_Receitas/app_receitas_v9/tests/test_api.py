@@ -0,0 +1,36 @@
+from sqlalchemy import update
+from database import db
+from models import Receita
+from cache_respostas import cache, CacheArquivos, CacheMemoria
+from conftest import criar_chef, criar_receitas
+
+
+# --- ETag e 304 da API ---
+def _renomear_em_outro_worker(receita_id, titulo):
+    """Altera a receita sem passar pelo cache deste processo (nenhuma tag é invalidada aqui)."""
+    with db.engine.begin() as conexao:
+        conexao.execute(update(Receita).where(Receita.id == receita_id).values(titulo=titulo))
+    db.session.expunge_all()
+
+
+def test_cache_por_processo_nao_responde_304_para_dados_alterados_em_outro_worker(cliente, monkeypatch):
+    monkeypatch.setattr(cache, 'armazenamento', CacheMemoria(100))
+    receita, = criar_receitas(criar_chef(), 1)
+    url = f'/api/v1/receitas/{receita.id}'
+    etag = cliente.get(url).headers['ETag']
+    assert cliente.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    _renomear_em_outro_worker(receita.id, 'Renomeada')
+    resposta = cliente.get(url, headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert resposta.get_json()['dados']['titulo'] == 'Renomeada'
+
+
+def test_cache_compartilhado_responde_304_sem_consultar_o_banco(cliente, contar_sql, monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, 'armazenamento', CacheArquivos(str(tmp_path)))
+    criar_receitas(criar_chef(), 2)
+    etag = cliente.get('/api/v1/receitas').headers['ETag']
+    with contar_sql() as comandos:
+        resposta = cliente.get('/api/v1/receitas', headers={'If-None-Match': etag})
+    assert resposta.status_code == 304
+    assert comandos == []
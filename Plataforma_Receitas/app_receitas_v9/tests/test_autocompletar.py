@@ -0,0 +1,53 @@
+import pytest
+from database import db
+from models import Receita, Ingrediente, ReceitaIngrediente
+import autocompletar
+from conftest import criar_chef, entrar
+
+
+def _receitas_com(chef, usos):
+    """Cria, para cada {nome: quantidade}, `quantidade` receitas que usam o ingrediente."""
+    for nome, quantidade in usos.items():
+        ingrediente = Ingrediente(nome=nome)
+        for i in range(quantidade):
+            receita = Receita(titulo=f'Receita com {nome} {i}', instrucoes=f'Use {nome} ({i}).', chef=chef)
+            receita.ingredientes_associados.append(ReceitaIngrediente(ingrediente=ingrediente, quantidade='1'))
+            db.session.add(receita)
+    db.session.commit()
+
+
+def _sugestoes(cliente, texto, tipo='ingrediente'):
+    resposta = cliente.get(f'/api/autocomplete/{tipo}', query_string={'q': texto})
+    return [(item['nome'], item['usos']) for item in resposta.get_json()['sugestoes']]
+
+
+@pytest.fixture
+def chef(app):
+    chef = criar_chef()
+    _receitas_com(chef, {'açafrão': 1, 'acelga': 2, 'açúcar': 3, 'batata': 5})
+    return chef
+
+
+# --- Sugestões ---
+def test_sugestoes_ordenadas_por_uso(cliente, chef):
+    assert _sugestoes(cliente, 'ac') == [('açúcar', 3), ('acelga', 2), ('açafrão', 1)]
+
+
+@pytest.mark.parametrize('texto', ['acuc', 'AÇÚC', '  açuc'])
+def test_prefixo_sem_acentos_nem_maiusculas(cliente, chef, texto):
+    assert _sugestoes(cliente, texto) == [('açúcar', 3)]
+
+
+def test_lista_pre_calculada_acompanha_receita_nova(cliente, chef, monkeypatch):
+    # Intervalos com mais de 1 nome usam a lista pré-calculada (_topo) do prefixo
+    monkeypatch.setattr(autocompletar, 'VARREDURA', 1)
+    assert _sugestoes(cliente, 'a') == [('açúcar', 3), ('acelga', 2), ('açafrão', 1)]
+    assert 'a' in autocompletar.vocabularios['ingrediente']._topo
+
+    entrar(cliente, chef.usuario_id)
+    for i in range(2):
+        cliente.post('/receita/nova', data={
+            'titulo': f'Salada {i}', 'instrucoes': f'Corte tudo e tempere ({i}).', 'categorias_str': 'Saladas',
+            'ingredientes': 'acelga: 1 maço, abobrinha: 2'})
+    assert _sugestoes(cliente, 'a') == [('acelga', 4), ('açúcar', 3), ('abobrinha', 2), ('açafrão', 1)]
+    assert _sugestoes(cliente, 'ab') == [('abobrinha', 2)]
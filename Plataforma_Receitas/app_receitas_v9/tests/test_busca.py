@@ -0,0 +1,31 @@
+from sqlalchemy import select
+from database import db
+from models import Receita
+from conftest import criar_chef, entrar
+
+
+def _titulos_encontrados(cliente, termo):
+    return cliente.get('/busca', query_string={'q': termo}).get_data(as_text=True)
+
+
+# --- Busca textual (FTS5) acompanha as receitas gravadas pelas rotas ---
+def test_busca_acompanha_criacao_edicao_e_exclusao(cliente):
+    chef = criar_chef()
+    entrar(cliente, chef.usuario_id)
+    resposta = cliente.post('/receita/nova', data={
+        'titulo': 'Moqueca capixaba', 'instrucoes': 'Refogue o peixe na panela de barro.',
+        'categorias_str': 'Peixes', 'ingredientes': 'peixe: 1 kg, tomate: 3'})
+    assert resposta.status_code == 302
+    assert 'Moqueca capixaba' in _titulos_encontrados(cliente, 'moqueca')
+    receita_id = db.session.scalar(select(Receita.id).where(Receita.titulo == 'Moqueca capixaba'))
+
+    cliente.post(f'/receita/{receita_id}/editar', data={
+        'titulo': 'Feijoada completa', 'instrucoes': 'Cozinhe o feijão preto com as carnes.',
+        'categorias_str': 'Pratos principais'})
+    assert 'Feijoada completa' in _titulos_encontrados(cliente, 'feijoada')
+    assert 'Feijoada completa' in _titulos_encontrados(cliente, 'feijão preto') # Instruções novas
+    assert 'Feijoada completa' not in _titulos_encontrados(cliente, 'moqueca')
+
+    cliente.post(f'/receita/{receita_id}/excluir')
+    assert 'Feijoada completa' not in _titulos_encontrados(cliente, 'feijoada')
+    assert f'/receita/{receita_id}"' not in _titulos_encontrados(cliente, 'feijoada')
@@ -0,0 +1,77 @@
+import threading
+import time
+import pytest
+from sqlalchemy import select
+from database import db
+from models import EmailPendente
+import caixa_saida
+
+
+@pytest.fixture(autouse=True)
+def enviador(app, smtp):
+    app.config.update(EMAIL_TRABALHADORES=1, EMAIL_INTERVALO=0.01)
+    yield caixa_saida.enviador
+    caixa_saida.enviador.parar(espera=5)
+    app.config.update(EMAIL_TRABALHADORES=2, EMAIL_INTERVALO=5)
+
+
+def _enfileirar(*destinatarios):
+    for destinatario in destinatarios:
+        caixa_saida.enfileirar(destinatario, 'Receita', '<p>Olá</p>')
+    db.session.commit()
+
+
+def _situacao():
+    db.session.expire_all()
+    return {email.destinatario: email.status for email in db.session.scalars(select(EmailPendente))}
+
+
+def _aguardar(condicao, segundos=5):
+    limite = time.monotonic() + segundos
+    while not condicao():
+        assert time.monotonic() < limite, 'tempo esgotado'
+        time.sleep(0.02)
+
+
+def test_uma_vez_esvazia_a_fila(app, smtp):
+    _enfileirar('a@exemplo.com', 'b@exemplo.com')
+    caixa_saida.enviador.trabalhar(app, uma_vez=True)
+    assert sorted(smtp.recebidas) == ['a@exemplo.com', 'b@exemplo.com']
+    assert set(_situacao().values()) == {'enviado'}
+
+
+def test_erro_inesperado_nao_mata_a_thread(app, smtp, monkeypatch):
+    reservar = caixa_saida.reservar
+    erros = []
+
+    def reservar_com_falha(tamanho):
+        if not erros:
+            erros.append(1)
+            raise RuntimeError('banco indisponível')
+        return reservar(tamanho)
+
+    monkeypatch.setattr(caixa_saida, 'reservar', reservar_com_falha)
+    _enfileirar('a@exemplo.com')
+    caixa_saida.enviador.iniciar(app)
+    _aguardar(lambda: smtp.recebidas == ['a@exemplo.com'])
+    assert erros == [1]
+    assert all(thread.is_alive() for thread in caixa_saida.enviador._threads)
+
+
+def test_uma_vez_repassa_o_erro_inesperado(app, smtp, monkeypatch):
+    monkeypatch.setattr(caixa_saida, 'reservar', lambda tamanho: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        caixa_saida.enviador.trabalhar(app, uma_vez=True)
+
+
+def test_iniciar_recria_threads_que_morreram(app, smtp):
+    morta = threading.Thread(target=lambda: None, name='enviador-emails-0')
+    morta.start()
+    morta.join()
+    caixa_saida.enviador._threads = [morta]
+    caixa_saida.enviador.iniciar(app)
+    threads = caixa_saida.enviador._threads
+    assert len(threads) == 1 and threads[0] is not morta and threads[0].is_alive()
+    _enfileirar('a@exemplo.com')
+    caixa_saida.enviador.acordar()
+    _aguardar(lambda: smtp.recebidas == ['a@exemplo.com'])
@@ -0,0 +1,73 @@
+import pytest
+from database import db
+from models import Receita
+from carregamento import PERFIS_CARGA, com_perfil
+from conftest import criar_chef, criar_receitas
+
+
+# --- Rotas: o número de comandos SQL não cresce com o número de receitas ---
+def _comandos_da_pagina(cliente, contar_sql, url):
+    # Nada carregado de antes: nem objetos na sessão nem cartões já renderizados
+    db.session.expunge_all()
+    cliente.application.jinja_env.cache_fragmentos.limpar()
+    with contar_sql() as comandos:
+        resposta = cliente.get(url)
+    assert resposta.status_code == 200
+    return len(comandos)
+
+
+def test_index_faz_o_mesmo_numero_de_consultas_com_mais_receitas(cliente, contar_sql):
+    chef = criar_chef()
+    criar_receitas(chef, 2)
+    poucas = _comandos_da_pagina(cliente, contar_sql, '/')
+    for i in range(5): # Chefs diferentes: um chef carregado por receita também seria N+1
+        criar_receitas(criar_chef(f'chef{i}@exemplo.com', f'Chef {i}'), 3, prefixo=f'Outra {i}')
+    assert _comandos_da_pagina(cliente, contar_sql, '/') == poucas
+
+
+def test_detalhe_faz_o_mesmo_numero_de_consultas_com_mais_ingredientes(cliente, contar_sql):
+    chef = criar_chef()
+    pequena, = criar_receitas(chef, 1, ingredientes=1, categorias=1)
+    grande, = criar_receitas(chef, 1, ingredientes=12, categorias=6, prefixo='Grande')
+    urls = [f'/receita/{pequena.id}', f'/receita/{grande.id}']
+    assert _comandos_da_pagina(cliente, contar_sql, urls[0]) == _comandos_da_pagina(cliente, contar_sql, urls[1])
+
+
+def test_pagina_do_chef_faz_o_mesmo_numero_de_consultas_com_mais_receitas(cliente, contar_sql):
+    chef = criar_chef()
+    outro = criar_chef('outro@exemplo.com', 'Bruno')
+    criar_receitas(chef, 2)
+    criar_receitas(outro, 15, prefixo='Outra')
+    urls = [f'/chef/{chef.id}', f'/chef/{outro.id}']
+    assert _comandos_da_pagina(cliente, contar_sql, urls[0]) == _comandos_da_pagina(cliente, contar_sql, urls[1])
+
+
+# --- Perfis de carregamento ---
+def _usar_relacionamentos(receita, perfil):
+    """Acessa o que o template do perfil usa."""
+    if perfil in ('cartao', 'detalhe', 'titulo_chef'):
+        receita.chef.nome
+    if perfil in ('cartao', 'detalhe'):
+        [categoria.nome for categoria in receita.categorias]
+        [(associacao.ingrediente.nome, associacao.quantidade) for associacao in receita.ingredientes_associados]
+
+
+@pytest.mark.parametrize('perfil', sorted(PERFIS_CARGA))
+def test_perfil_carrega_tudo_o_que_o_template_usa(app, contar_sql, perfil):
+    chef = criar_chef()
+    criar_receitas(chef, 5)
+    db.session.expunge_all()
+    with contar_sql() as comandos:
+        receitas = com_perfil(Receita.query, perfil).all()
+    consultas_da_listagem = len(comandos)
+    with contar_sql() as comandos:
+        for receita in receitas:
+            _usar_relacionamentos(receita, perfil)
+    assert len(receitas) == 5
+    assert comandos == [] # Nenhum carregamento preguiçoso
+    assert consultas_da_listagem <= 1 + 2 # A receita (com o chef) e um SELECT ... IN por coleção
+
+
+def test_perfil_desconhecido(app):
+    with pytest.raises(KeyError):
+        com_perfil(Receita.query, 'inexistente')
@@ -0,0 +1,39 @@
+import re
+import pytest
+import codigo_qr
+from conftest import criar_chef, entrar
+
+# formato: início dos bytes da imagem
+ASSINATURAS = {'png': b'\x89PNG\r\n\x1a\n', 'svg': b'<'}
+
+
+@pytest.fixture
+def url_do_qr(cliente):
+    entrar(cliente, criar_chef().usuario_id)
+    pagina = cliente.get('/2fa/setup').get_data(as_text=True)
+    return re.search(r'src="(/2fa/qr/[0-9a-f]+)\.svg"', pagina).group(1)
+
+
+# --- Imagem do QR Code do 2FA ---
+@pytest.mark.parametrize('formato', [
+    pytest.param('png', marks=pytest.mark.skipif('png' not in codigo_qr.FORMATOS,
+                                                 reason='Pillow/pypng não instalados')),
+    'svg',
+])
+def test_qr_com_cache_imutavel_e_304(cliente, url_do_qr, formato):
+    resposta = cliente.get(f'{url_do_qr}.{formato}')
+    assert resposta.status_code == 200
+    assert resposta.mimetype == codigo_qr.FORMATOS[formato]
+    assert resposta.data.startswith(ASSINATURAS[formato])
+    assert resposta.cache_control.private and resposta.cache_control.immutable
+    assert resposta.cache_control.max_age == 31536000
+    etag, _ = resposta.get_etag()
+    assert etag == f"{url_do_qr.rsplit('/', 1)[1]}-{formato}"
+
+    condicional = cliente.get(f'{url_do_qr}.{formato}', headers={'If-None-Match': f'"{etag}"'})
+    assert condicional.status_code == 304 and condicional.data == b''
+
+
+def test_qr_de_versao_ou_formato_desconhecido(cliente, url_do_qr):
+    assert cliente.get('/2fa/qr/0000000000000000.svg').status_code == 404
+    assert cliente.get(url_do_qr + '.gif').status_code == 404
@@ -0,0 +1,39 @@
+import pytest
+from database import db
+from correcao_busca import PREFIXO, obter_corretor
+from conftest import criar_chef, criar_receitas
+
+
+@pytest.fixture
+def corretor(app):
+    chef = criar_chef()
+    for receita, titulo in zip(criar_receitas(chef, 3), ['Brigadeiro de colher', 'Brigadeiro branco', 'Bolo gelado']):
+        receita.titulo = titulo
+    db.session.commit()
+    return obter_corretor(db.session.connection())
+
+
+# --- "Você quis dizer" ---
+@pytest.mark.parametrize('termo', [
+    'bigadeiro',  # Letra faltando dentro dos PREFIXO primeiros caracteres
+    'brgiadeiro', # Letras trocadas dentro do prefixo
+    'brigadeirp', # Letra errada depois do prefixo
+    'brigadeir',  # Letra faltando no fim
+])
+def test_sugere_a_palavra_mais_proxima(corretor, termo):
+    assert len('brigadeiro') > PREFIXO
+    assert corretor.sugerir(termo) == 'brigadeiro'
+
+
+def test_nao_sugere_para_palavra_conhecida_ou_sem_parecida(corretor):
+    assert corretor.sugerir('brigadeiro') is None
+    assert corretor.sugerir('xyzwvut') is None
+    assert corretor.corrigir('bigadeiro branco') == 'brigadeiro branco'
+
+
+def test_pagina_de_busca_mostra_voce_quis_dizer(cliente, corretor):
+    pagina = cliente.get('/busca', query_string={'q': 'bigadeiro'}).get_data(as_text=True)
+    assert 'Você quis dizer' in pagina
+    assert 'href="/busca?q=brigadeiro"' in pagina
+    sem_erro = cliente.get('/busca', query_string={'q': 'brigadeiro'}).get_data(as_text=True)
+    assert 'Você quis dizer' not in sem_erro and 'Brigadeiro de colher' in sem_erro
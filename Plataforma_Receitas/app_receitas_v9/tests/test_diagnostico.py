@@ -0,0 +1,47 @@
+import pytest
+from conftest import criar_chef, entrar
+
+ROTAS = ['/_debug/cache', '/_debug/senhas', '/_debug/requests', '/_debug/duplicatas', '/metrics']
+
+
+@pytest.fixture
+def admin(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'DIAGNOSTICO_ADMINS', {'admin@exemplo.com'})
+    return criar_chef('admin@exemplo.com', 'Admin').usuario_id
+
+
+@pytest.mark.parametrize('rota', ROTAS)
+def test_rotas_de_diagnostico_fechadas_para_anonimos_e_usuarios_comuns(cliente, admin, rota):
+    assert cliente.get(rota).status_code == 404
+    entrar(cliente, criar_chef().usuario_id)
+    assert cliente.get(rota).status_code == 404
+
+
+@pytest.mark.parametrize('rota', ROTAS)
+def test_rotas_de_diagnostico_abertas_para_admins(cliente, admin, rota):
+    entrar(cliente, admin)
+    assert cliente.get(rota).status_code == 200
+
+
+@pytest.mark.parametrize('rota', ROTAS)
+def test_rotas_de_diagnostico_abertas_em_modo_debug(cliente, monkeypatch, rota):
+    monkeypatch.setattr(cliente.application, 'debug', True)
+    assert cliente.get(rota).status_code == 200
+
+
+def test_historico_de_requisicoes_nao_guarda_a_query_string(cliente, monkeypatch):
+    monkeypatch.setattr(cliente.application, 'debug', True)
+    cliente.get('/busca?q=segredo&pagina=2')
+    pagina = cliente.get('/_debug/requests').get_data(as_text=True)
+    assert '/busca?q=…&amp;pagina=…' in pagina
+    assert 'segredo' not in pagina
+
+
+def test_metricas_para_o_coletor_com_token_ou_ip_liberado(cliente, monkeypatch):
+    monkeypatch.setitem(cliente.application.config, 'METRICAS_TOKEN', 'abc123')
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer errado'}).status_code == 404
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer abc123'}).status_code == 200
+
+    monkeypatch.setitem(cliente.application.config, 'METRICAS_IPS', {'10.0.0.5'})
+    assert cliente.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.6'}).status_code == 404
+    assert cliente.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.5'}).status_code == 200
@@ -0,0 +1,66 @@
+from sqlalchemy import func, insert, select, update
+from database import db
+from models import Alteracao, Ingrediente, ReceitaIngrediente, Usuario
+import eventos
+import identidade
+import autocompletar
+from indice_ingredientes import obter_indice
+from conftest import criar_chef, criar_receitas
+
+
+# --- Diário de alterações: o índice em memória vê o que outro worker gravou ---
+def _gravar_como_outro_worker(receita_id, nome):
+    """Acrescenta um ingrediente sem passar pelo ORM deste processo (nenhum sinal é emitido)."""
+    with db.engine.begin() as conexao:
+        ingrediente_id = conexao.execute(insert(Ingrediente).values(nome=nome)).inserted_primary_key[0]
+        conexao.execute(insert(ReceitaIngrediente).values(
+            receita_id=receita_id, ingrediente_id=ingrediente_id, quantidade='1'))
+        eventos.anotar(conexao, 'receita', [receita_id])
+
+
+def test_indice_aplica_alteracoes_de_outro_worker(app, monkeypatch):
+    receita, = criar_receitas(criar_chef(), 1, ingredientes=1)
+    indice = obter_indice(db.session.connection())
+    assert indice.consultar(['pimenta rosa']) == []
+
+    _gravar_como_outro_worker(receita.id, 'pimenta rosa')
+    db.session.rollback() # Nova transação: enxerga o que foi confirmado
+    monkeypatch.setattr(eventos, '_intervalo', 0)
+    encontradas = obter_indice(db.session.connection()).consultar(['pimenta rosa'], max_faltantes=1)
+    assert [receita_id for receita_id, _ in encontradas] == [receita.id]
+
+
+def test_indice_e_remontado_se_o_diario_foi_podado(app, monkeypatch):
+    receita, = criar_receitas(criar_chef(), 1, ingredientes=1)
+    obter_indice(db.session.connection())
+    monkeypatch.setattr(eventos, '_linhas_diario', 1)
+    monkeypatch.setattr(eventos, '_intervalo', 0)
+    _gravar_como_outro_worker(receita.id, 'cardamomo')
+    _gravar_como_outro_worker(receita.id, 'cravo')
+    db.session.rollback()
+    assert db.session.scalar(select(func.count()).select_from(Alteracao)) == 1
+
+    encontradas = obter_indice(db.session.connection()).consultar(['cardamomo'], max_faltantes=2)
+    assert [receita_id for receita_id, _ in encontradas] == [receita.id]
+
+
+def test_autocompletar_inclui_nomes_gravados_por_outro_worker(app, monkeypatch):
+    receita, = criar_receitas(criar_chef(), 1, ingredientes=1)
+    assert autocompletar.obter('ingrediente', db.session.connection()).sugerir('pimenta') == []
+
+    _gravar_como_outro_worker(receita.id, 'pimenta rosa')
+    db.session.rollback()
+    monkeypatch.setattr(eventos, '_intervalo', 0)
+    assert autocompletar.obter('ingrediente', db.session.connection()).sugerir('pimenta') == [('pimenta rosa', 1)]
+
+
+def test_identidade_guardada_e_descartada_quando_outro_worker_altera_a_conta(app, monkeypatch):
+    usuario_id = criar_chef().usuario_id
+    assert identidade.carregar(usuario_id).has_2fa_enabled is False
+
+    with db.engine.begin() as conexao: # 2FA ativado em outro worker
+        conexao.execute(update(Usuario).where(Usuario.id == usuario_id).values(has_2fa_enabled=True))
+        eventos.anotar(conexao, 'usuario', [usuario_id])
+    db.session.rollback()
+    monkeypatch.setattr(eventos, '_intervalo', 0)
+    assert identidade.carregar(usuario_id).has_2fa_enabled is True
@@ -0,0 +1,61 @@
+from sqlalchemy import func, select
+from database import db
+from models import AssinaturaReceita, BandaReceita, DuplicataSuspeita
+import duplicatas
+from conftest import criar_chef, criar_receitas
+
+
+def _linhas(modelo):
+    return db.session.scalar(select(func.count()).select_from(modelo))
+
+
+def test_excluir_receita_remove_as_linhas_da_deteccao(app):
+    original, copia = criar_receitas(criar_chef(), 2)
+    duplicatas.deduplicar(db.engine, avisar=lambda mensagem: None)
+    db.session.execute(DuplicataSuspeita.__table__.insert().values(
+        receita_id=copia.id, original_id=original.id, similaridade=0.9))
+    db.session.commit()
+    assert _linhas(AssinaturaReceita) == 2
+
+    db.session.delete(original)
+    db.session.commit()
+    assert _linhas(AssinaturaReceita) == 1
+    assert db.session.scalar(select(func.count()).select_from(BandaReceita)
+                             .where(BandaReceita.receita_id == original.id)) == 0
+    assert _linhas(DuplicataSuspeita) == 0
+
+
+def test_faixa_grande_ainda_compara_as_receitas_mais_novas(app, monkeypatch):
+    monkeypatch.setattr(duplicatas, 'MAIOR_BALDE', 3)
+    chef = criar_chef()
+    # Mesmas instruções e nenhum ingrediente: as 6 receitas caem nas mesmas faixas
+    for receita in criar_receitas(chef, 6, ingredientes=0, prefixo='Spam'):
+        receita.instrucoes = 'Compre agora o produto milagroso no site oficial com desconto de hoje.'
+    db.session.commit()
+    resumo = duplicatas.deduplicar(db.engine, avisar=lambda mensagem: None)
+    # Cada receita entra nas suspeitas (comparada com as 3 anteriores), menos a primeira
+    suspeitas = db.session.scalars(select(DuplicataSuspeita.receita_id).distinct()).all()
+    assert len(suspeitas) == 5 and resumo['suspeitas'] > 0
+
+
+def _suspeitas():
+    return set(db.session.execute(select(DuplicataSuspeita.receita_id, DuplicataSuspeita.original_id)).all())
+
+
+def test_deduplicar_em_pedacos_e_processos_acha_as_mesmas_suspeitas(app, monkeypatch):
+    monkeypatch.setattr(duplicatas, 'MAIOR_BALDE', 3)
+    chef = criar_chef()
+    receitas = criar_receitas(chef, 9, ingredientes=0, prefixo='Spam')
+    for i, receita in enumerate(receitas):
+        # Três grupos de receitas iguais entre si
+        receita.instrucoes = f'Compre agora o produto número {i % 3} no site oficial com desconto de hoje.'
+    db.session.commit()
+    inteiro = duplicatas.deduplicar(db.engine, avisar=lambda mensagem: None)
+    esperadas = _suspeitas()
+
+    monkeypatch.setattr(duplicatas, 'TAREFA_COMPARACOES', 2)
+    em_pedacos = duplicatas.deduplicar(db.engine, processos=2, bloco=2, avisar=lambda mensagem: None)
+    db.session.expire_all()
+    assert _suspeitas() == esperadas and len(esperadas) == 9 # 3 pares em cada grupo
+    assert em_pedacos['receitas'] == inteiro['receitas'] == 9
+    assert _linhas(AssinaturaReceita) == 9
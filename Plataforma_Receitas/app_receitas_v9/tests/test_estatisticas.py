@@ -0,0 +1,41 @@
+from sqlalchemy import select
+from database import db
+from models import EstatisticaChef, Receita, Usuario
+import estatisticas
+from conftest import criar_chef, criar_receitas
+
+
+def _contadores():
+    por_chef = {chef_id: total for chef_id, total in db.session.execute(
+        select(EstatisticaChef.chef_id, EstatisticaChef.total_receitas)) if total}
+    return estatisticas.totais(), por_chef
+
+
+# --- Contadores do dashboard ajustados a cada gravação ---
+def test_contadores_incrementais_iguais_aos_reconstruidos(app):
+    ana, bruno = criar_chef(), criar_chef('bruno@exemplo.com', 'Bruno')
+    sem_receitas = criar_chef('carla@exemplo.com', 'Carla')
+    receitas_ana = criar_receitas(ana, 4)
+    receitas_bruno = criar_receitas(bruno, 3, prefixo='Bruno')
+    db.session.delete(receitas_ana[0])
+    for receita in receitas_bruno: # Bruno fica sem receitas
+        db.session.delete(receita)
+    db.session.commit()
+    db.session.delete(db.session.get(Usuario, sem_receitas.usuario_id)) # Leva o chef junto
+    db.session.commit()
+
+    incrementais = _contadores()
+    assert incrementais == ((3, 2), {ana.id: 3})
+    estatisticas.reconstruir()
+    assert _contadores() == incrementais
+
+
+def test_rollback_desfaz_o_ajuste(app):
+    chef = criar_chef()
+    receita, _ = criar_receitas(chef, 2)
+    chef_id = chef.id
+    db.session.delete(receita)
+    db.session.add(Receita(titulo='Desfeita', instrucoes='Misture.', chef_id=chef_id))
+    db.session.flush() # Os eventos já ajustaram os contadores nesta transação
+    db.session.rollback()
+    assert _contadores() == ((2, 1), {chef_id: 2})
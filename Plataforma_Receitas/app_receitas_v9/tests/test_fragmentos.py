@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert
+from database import db
+from models import Receita
+from conftest import criar_chef, criar_receitas
+
+
+# --- Cache de fragmentos: o cartão guardado não passa para outra receita ---
+def test_receita_recriada_com_o_mesmo_id_nao_herda_o_cartao(cliente):
+    chef = criar_chef()
+    receita, = criar_receitas(chef, 1, ingredientes=0, categorias=0, prefixo='Antiga')
+    receita_id, chef_id = receita.id, chef.id
+    assert 'Antiga 0' in cliente.get('/').get_data(as_text=True)
+
+    # Em outro worker: a receita é excluída e o SQLite reaproveita o id, com versao=1 de novo
+    with db.engine.begin() as conexao:
+        conexao.execute(delete(Receita).where(Receita.id == receita_id))
+        conexao.execute(insert(Receita).values(
+            id=receita_id, titulo='Nova', instrucoes='Misture.', chef_id=chef_id, versao=1,
+            criado_em=datetime.utcnow() + timedelta(seconds=1)))
+    db.session.expunge_all()
+
+    pagina = cliente.get('/').get_data(as_text=True)
+    assert 'Nova' in pagina and 'Antiga 0' not in pagina
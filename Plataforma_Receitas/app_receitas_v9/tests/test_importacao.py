@@ -0,0 +1,31 @@
+import pytest
+from importacao import normalizar
+
+VALIDO = {'titulo': 'Bolo', 'instrucoes': 'Misture e asse.', 'chef_email': 'Ana@Exemplo.com',
+          'categorias': ['sobremesa', 'Rápido'], 'ingredientes': [{'nome': 'Farinha', 'quantidade': 2}]}
+
+
+def test_registro_valido():
+    registro = normalizar(VALIDO)
+    assert registro['chef_email'] == 'ana@exemplo.com'
+    assert registro['categorias'] == ['Sobremesa', 'Rápido']
+    assert registro['ingredientes'] == {'farinha': '2'}
+    assert normalizar(dict(VALIDO, ingredientes='farinha: 2 xícaras, ovo: 3', categorias='doce'))['ingredientes'] \
+        == {'farinha': '2 xícaras', 'ovo': '3'}
+
+
+# JSON válido com o formato errado: o registro é ignorado em vez de derrubar a importação
+@pytest.mark.parametrize('campos', [
+    {'titulo': 123},
+    {'instrucoes': ['passo 1']},
+    {'chef_email': {'email': 'a@a.com'}},
+    {'chef_nome': 7},
+    {'categorias': [{'nome': 'Doce'}]},
+    {'categorias': 5},
+    {'ingredientes': ['farinha', 'ovo']},
+    {'ingredientes': [{'nome': 3, 'quantidade': '1'}]},
+    {'ingredientes': {'farinha': ['2']}},
+    {'ingredientes': 10},
+])
+def test_registro_com_tipo_errado_e_ignorado(campos):
+    assert normalizar(dict(VALIDO, **campos)) is None
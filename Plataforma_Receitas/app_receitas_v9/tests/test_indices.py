@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import select, text
+from database import db
+from models import Receita
+import busca_fts
+import migracoes
+
+
+def _planos():
+    with db.engine.connect() as conexao:
+        return migracoes.verificar_indices(conexao)
+
+
+def test_consultas_das_rotas_usam_indices_no_banco_migrado(app):
+    sem_indice = [(nome, plano) for nome, plano, usa_indice in _planos() if not usa_indice]
+    assert sem_indice == []
+
+
+def test_todas_as_listagens_paginadas_sao_verificadas(app):
+    assert migracoes.LISTAGENS_PAGINADAS <= set(migracoes._consultas_das_rotas())
+
+
+@pytest.mark.parametrize('consulta', [
+    # Ordenação sem índice depois de um SEARCH: lê todas as receitas do chef para devolver 21
+    select(Receita.id).where(Receita.chef_id == 1).order_by(Receita.titulo).limit(21),
+    # Tabela inteira
+    select(Receita.id).where(Receita.titulo == 'Bolo'),
+])
+def test_verificacao_acusa_ordenacao_temporaria_e_leitura_completa(app, monkeypatch, consulta):
+    monkeypatch.setattr(migracoes, '_consultas_das_rotas', lambda: {'detalhes_chef': consulta})
+    (_, plano, usa_indice), = _planos()
+    assert not usa_indice, plano
+
+
+# --- Migração de um banco criado antes da v9 ---
+ESQUEMA_ANTIGO = [
+    'CREATE TABLE usuario (id INTEGER PRIMARY KEY, email VARCHAR(120) NOT NULL UNIQUE, '
+    'password_hash VARCHAR(128), otp_secret VARCHAR(16) UNIQUE, has_2fa_enabled BOOLEAN)',
+    'CREATE TABLE chef (id INTEGER PRIMARY KEY, nome VARCHAR(100) NOT NULL, especialidade VARCHAR(100), '
+    'usuario_id INTEGER NOT NULL UNIQUE REFERENCES usuario (id))',
+    'CREATE TABLE receita (id INTEGER PRIMARY KEY, titulo VARCHAR(200) NOT NULL, instrucoes TEXT NOT NULL, '
+    'chef_id INTEGER NOT NULL REFERENCES chef (id))',
+    'CREATE TABLE ingrediente (id INTEGER PRIMARY KEY, nome VARCHAR(100) NOT NULL UNIQUE)',
+    'CREATE TABLE categoria (id INTEGER PRIMARY KEY, nome VARCHAR(50) NOT NULL UNIQUE)',
+    'CREATE TABLE receita_ingredientes (receita_id INTEGER REFERENCES receita (id), '
+    'ingrediente_id INTEGER REFERENCES ingrediente (id), quantidade VARCHAR(50) NOT NULL, '
+    'PRIMARY KEY (receita_id, ingrediente_id))',
+    'CREATE TABLE receita_categorias (receita_id INTEGER REFERENCES receita (id), '
+    'categoria_id INTEGER REFERENCES categoria (id), PRIMARY KEY (receita_id, categoria_id))',
+]
+DADOS_ANTIGOS = [
+    "INSERT INTO usuario (id, email, password_hash) VALUES (1, 'ana@exemplo.com', 'x')",
+    "INSERT INTO chef (id, nome, usuario_id) VALUES (1, 'Ana', 1)",
+    "INSERT INTO receita (id, titulo, instrucoes, chef_id) VALUES (1, 'Bolo', 'Asse.', 1), (2, 'Pão', 'Sove.', 1)",
+    "INSERT INTO categoria (id, nome) VALUES (1, 'doces')",
+    "INSERT INTO receita_categorias (receita_id, categoria_id) VALUES (1, 1)",
+]
+
+
+@pytest.mark.parametrize('dados', [[], DADOS_ANTIGOS], ids=['vazio', 'com receitas'])
+def test_migra_banco_de_versao_anterior(app, dados):
+    db.drop_all()
+    with db.engine.begin() as conexao:
+        busca_fts.remover_tabela(conexao)
+        conexao.execute(text('DROP TABLE IF EXISTS migracao_esquema'))
+        for comando in ESQUEMA_ANTIGO + dados:
+            conexao.execute(text(comando))
+
+    assert migracoes.migrar(db.engine, avisar=lambda mensagem: None) == len(migracoes.MIGRACOES)
+
+    receitas = db.session.execute(select(Receita.id, Receita.criado_em, Receita.versao).order_by(Receita.id)).all()
+    assert [receita_id for receita_id, _, _ in receitas] == [1, 2][:len(receitas)]
+    assert all(versao == 1 for _, _, versao in receitas)
+    if receitas: # A ordem de criação (id) vira a ordem das datas
+        assert receitas[0].criado_em < receitas[1].criado_em
+    assert all(usa_indice for _, _, usa_indice in _planos())
+    assert migracoes.migrar(db.engine, avisar=lambda mensagem: None) == 0
@@ -0,0 +1,83 @@
+import time
+from datetime import datetime
+from email import message_from_bytes
+from sqlalchemy import insert, select
+from database import db
+from models import ResumoEnviado, Usuario
+import resumo_semanal
+from conftest import criar_chef, criar_receitas
+
+SEMANA = '2025-W07' # 10/02/2025 a 16/02/2025
+
+
+def _preparar(usuarios):
+    chef = criar_chef()
+    for i, receita in enumerate(criar_receitas(chef, 3, prefixo='Da semana')):
+        receita.criado_em = datetime(2025, 2, 10 + i, 12)
+    db.session.add_all(Usuario(email=f'leitor{i}@exemplo.com', password_hash='x') for i in range(usuarios))
+    db.session.commit()
+    return db.session.scalars(select(Usuario.email).order_by(Usuario.id)).all()
+
+
+def _enviar(app, **opcoes):
+    opcoes = {'trabalhadores': 1, 'taxa': 0, 'lote': 2, **opcoes}
+    return resumo_semanal.enviar_resumo(app, SEMANA, avisar=lambda mensagem: None, **opcoes)
+
+
+def _html(mensagem):
+    return next(parte.get_payload(decode=True).decode(parte.get_content_charset() or 'utf-8')
+                for parte in message_from_bytes(mensagem).walk() if parte.get_content_type() == 'text/html')
+
+
+# --- Envio para um servidor SMTP local ---
+def test_resumo_renderizado_uma_vez_e_enviado_pela_mesma_conexao(app, smtp, monkeypatch):
+    emails = _preparar(usuarios=5)
+    renderizacoes = []
+    renderizar = resumo_semanal.render_template
+    monkeypatch.setattr(resumo_semanal, 'render_template',
+                        lambda *args, **kwargs: renderizacoes.append(args[0]) or renderizar(*args, **kwargs))
+
+    assert _enviar(app) == {'enviados': len(emails), 'falhas': 0}
+    assert renderizacoes == ['email_resumo.html']
+    assert sorted(smtp.recebidas) == sorted(emails)
+    assert smtp.conexoes == 1
+    corpos = {_html(mensagem) for mensagem in smtp.mensagens}
+    assert len(corpos) == 1
+    corpo = corpos.pop()
+    assert all(f'Da semana {i}' in corpo for i in range(3))
+
+
+def test_segunda_execucao_envia_so_para_quem_falta(app, smtp):
+    emails = _preparar(usuarios=4)
+    ja_recebeu = db.session.scalars(select(Usuario.id).order_by(Usuario.id).limit(2)).all()
+    db.session.execute(insert(ResumoEnviado), [
+        {'semana': SEMANA, 'usuario_id': usuario_id, 'enviado_em': datetime.utcnow()} for usuario_id in ja_recebeu])
+    db.session.commit()
+
+    assert _enviar(app)['enviados'] == len(emails) - 2
+    assert sorted(smtp.recebidas) == sorted(emails[2:])
+    assert _enviar(app)['enviados'] == 0 # Todos registrados em resumo_enviado
+    assert len(smtp.recebidas) == len(emails) - 2
+    assert db.session.query(ResumoEnviado).filter_by(semana=SEMANA).count() == len(emails)
+
+
+def test_limite_de_taxa_espaca_os_envios(app, smtp):
+    emails = _preparar(usuarios=5)
+    inicio = time.perf_counter()
+    _enviar(app, trabalhadores=3, taxa=20)
+    # 6 mensagens (o chef também é usuário) a 20/s, somando as 3 threads: ao menos 5 intervalos de 50ms
+    assert time.perf_counter() - inicio >= (len(emails) - 1) / 20
+    assert len(smtp.recebidas) == len(emails)
+
+
+def test_limite_de_taxa_sozinho():
+    limite = resumo_semanal.LimiteTaxa(50)
+    inicio = time.monotonic()
+    for _ in range(11):
+        limite.aguardar()
+    assert time.monotonic() - inicio >= 10 / 50 * 0.95
+    sem_limite = resumo_semanal.LimiteTaxa(0)
+    inicio = time.monotonic()
+    for _ in range(1000):
+        sem_limite.aguardar()
+    assert time.monotonic() - inicio < 0.1
@@ -0,0 +1,107 @@
+import bcrypt
+import pytest
+from database import db
+from models import Usuario
+from senhas import HasherSenhas, custo_do_hash, hasher
+import senhas
+
+
+def _hash(senha, custo):
+    return bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt(rounds=custo)).decode('utf-8')
+
+
+def _usuario(hash_senha):
+    usuario = Usuario(email='ana@exemplo.com', password_hash=hash_senha)
+    db.session.add(usuario)
+    db.session.commit()
+    return usuario.id
+
+
+def _login(cliente, senha='segredo'):
+    return cliente.post('/login', data={'email': 'ana@exemplo.com', 'password': senha})
+
+
+# --- Rehash no login ---
+def test_login_refaz_hash_com_custo_menor(cliente, monkeypatch):
+    monkeypatch.setattr(hasher, 'custo', 5)
+    usuario_id = _usuario(_hash('segredo', 4))
+    rehashes = hasher.rehashes
+    assert _login(cliente).status_code == 302
+    novo = db.session.get(Usuario, usuario_id).password_hash
+    assert custo_do_hash(novo) == 5 and bcrypt.checkpw(b'segredo', novo.encode('utf-8'))
+    assert hasher.rehashes == rehashes + 1
+
+
+def test_login_nao_rebaixa_hash_com_custo_maior(cliente, monkeypatch):
+    monkeypatch.setattr(hasher, 'custo', 4)
+    antigo = _hash('segredo', 5)
+    usuario_id = _usuario(antigo)
+    assert _login(cliente).status_code == 302
+    assert db.session.get(Usuario, usuario_id).password_hash == antigo
+
+
+def test_operador_pode_baixar_o_custo_de_proposito(cliente, monkeypatch):
+    monkeypatch.setattr(hasher, 'custo', 4)
+    monkeypatch.setattr(hasher, 'rebaixar', True)
+    usuario_id = _usuario(_hash('segredo', 5))
+    _login(cliente)
+    assert custo_do_hash(db.session.get(Usuario, usuario_id).password_hash) == 4
+
+
+def test_senha_errada_nao_refaz_o_hash(cliente, monkeypatch):
+    monkeypatch.setattr(hasher, 'custo', 5)
+    antigo = _hash('segredo', 4)
+    usuario_id = _usuario(antigo)
+    assert _login(cliente, 'errada').status_code == 200
+    assert db.session.get(Usuario, usuario_id).password_hash == antigo
+
+
+# --- Calibragem: uma vez, compartilhada pelos workers ---
+@pytest.fixture
+def calibragens(monkeypatch):
+    chamadas = []
+
+    def calibrar(alvo_ms, minimo, maximo):
+        chamadas.append(alvo_ms)
+        return 11
+    monkeypatch.setattr(senhas, 'calibrar', calibrar)
+    return chamadas
+
+
+def _iniciar(app, monkeypatch, caminho):
+    monkeypatch.setitem(app.config, 'SENHAS_CUSTO', None)
+    monkeypatch.setitem(app.config, 'SENHAS_CALIBRAGEM', str(caminho))
+    novo = HasherSenhas()
+    novo.init_app(app)
+    return novo
+
+
+def test_custo_calibrado_uma_vez_e_lido_pelos_outros_workers(app, monkeypatch, tmp_path, calibragens):
+    caminho = tmp_path / 'senhas_custo.txt'
+    assert _iniciar(app, monkeypatch, caminho).custo == 11
+    assert _iniciar(app, monkeypatch, caminho).custo == 11
+    assert calibragens == [app.config['SENHAS_TEMPO_ALVO_MS']]
+    assert caminho.read_text() == '11'
+
+
+def test_custo_gravado_por_outro_worker_prevalece(app, monkeypatch, tmp_path, calibragens):
+    caminho = tmp_path / 'senhas_custo.txt'
+    caminho.write_text('12')
+    assert _iniciar(app, monkeypatch, caminho).custo == 12
+    assert calibragens == []
+
+
+# --- /metrics ---
+def test_metricas_de_senhas_no_prometheus(cliente, monkeypatch):
+    monkeypatch.setitem(cliente.application.config, 'METRICAS_TOKEN', 'abc')
+    _usuario(hasher.gerar_hash('segredo'))
+    _login(cliente)
+    texto = cliente.get('/metrics', headers={'Authorization': 'Bearer abc'}).get_data(as_text=True)
+    assert '# TYPE receitas_senhas_operacoes_total counter' in texto
+    for serie in ('receitas_senhas_operacoes_total{tipo="hash"}', 'receitas_senhas_operacoes_total{tipo="verificacao"}',
+                  'receitas_senhas_cpu_segundos_total{tipo="verificacao"}', 'receitas_senhas_espera_segundos_total',
+                  'receitas_senhas_rehashes_total', 'receitas_senhas_em_andamento'):
+        assert serie + ' ' in texto
+    verificacoes = next(linha for linha in texto.splitlines()
+                        if linha.startswith('receitas_senhas_operacoes_total{tipo="verificacao"}'))
+    assert float(verificacoes.split()[-1]) >= 1
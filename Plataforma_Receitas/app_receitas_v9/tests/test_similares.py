@@ -0,0 +1,66 @@
+import random
+import pytest
+from sqlalchemy import select
+from database import db
+from models import Receita, Ingrediente, Categoria, ReceitaIngrediente, ReceitaSimilar
+import similares
+from conftest import criar_chef
+
+
+def _listas():
+    listas = {}
+    for receita_id, similar_id, pontuacao in db.session.execute(select(ReceitaSimilar.receita_id,
+                                                                       ReceitaSimilar.similar_id,
+                                                                       ReceitaSimilar.pontuacao)):
+        listas.setdefault(receita_id, {})[similar_id] = round(pontuacao, 9)
+    return listas
+
+
+def test_atualizacao_incremental_igual_ao_calculo_completo(app):
+    sorteio = random.Random(7)
+    chef = criar_chef()
+    ingredientes = [Ingrediente(nome=f'ingrediente {i}') for i in range(15)]
+    categorias = [Categoria(nome=f'Categoria {i}') for i in range(3)]
+    for i in range(40):
+        receita = Receita(titulo=f'Receita {i}', instrucoes='Misture.', chef=chef,
+                          categorias=[sorteio.choice(categorias)])
+        for ingrediente in sorteio.sample(ingredientes, 4):
+            receita.ingredientes_associados.append(ReceitaIngrediente(ingrediente=ingrediente, quantidade='1'))
+        db.session.add(receita)
+    db.session.commit()
+    similares.calcular_todas(db.engine, k=5, avisar=lambda mensagem: None)
+
+    editada = db.session.get(Receita, 7)
+    editada.ingredientes_associados.clear()
+    db.session.flush()
+    for ingrediente in ingredientes[:5]:
+        editada.ingredientes_associados.append(ReceitaIngrediente(ingrediente=ingrediente, quantidade='1'))
+    excluida = db.session.get(Receita, 12)
+    db.session.delete(excluida)
+    db.session.commit()
+    with db.engine.begin() as conexao:
+        similares.atualizar(conexao, [7], [12], k=5)
+    incremental = _listas()
+    similares.calcular_todas(db.engine, k=5, avisar=lambda mensagem: None)
+    completo = _listas()
+
+    assert incremental[7] == completo[7]
+    assert all(12 not in lista for lista in incremental.values()) and 12 not in incremental
+    # Nas outras listas, a receita editada aparece com a mesma nota do cálculo completo
+    for receita_id, lista in incremental.items():
+        if 7 in lista and 7 in completo[receita_id]:
+            assert lista[7] == completo[receita_id][7]
+
+
+@pytest.mark.skipif(not similares.VETORIZADO, reason='NumPy/SciPy não instalados')
+@pytest.mark.parametrize('metrica', similares.METRICAS)
+def test_bloco_vetorizado_igual_ao_python_puro(metrica):
+    sorteio = random.Random(3)
+    atributos = [sorted(sorteio.sample(range(30), sorteio.randint(1, 6))) for _ in range(300)]
+    pesos = [sorteio.choice([0.5, 1.0, 2.0]) for _ in range(30)] # Pesos repetidos: muitos empates
+    matriz = similares.Matriz(list(range(1, 301)), atributos, pesos, metrica)
+    vetorizado = similares._bloco_vetorizado(100, 200, matriz.esparsa, metrica, 5)
+    for posicao, lista in zip(range(100, 200), vetorizado):
+        esperada = matriz.melhores_posicoes(matriz.pontuacoes(posicao), 5)
+        assert [p for p, _ in lista] == [p for p, _ in esperada]
+        assert [v for _, v in lista] == pytest.approx([v for _, v in esperada])